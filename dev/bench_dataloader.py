@@ -0,0 +1,67 @@
+import os
+import argparse
+import time
+
+from torch.utils.data import DataLoader
+
+from oikit.torch_data import OakInkImageDataset, OakInkShapeDataset, collate_fn, worker_init_fn
+
+
+def build_dataset(arg):
+    if arg.dataset == "image":
+        from oikit.oi_image import OakInkImage
+        oi_image = OakInkImage(data_split=arg.data_split, mode_split="default", enable_handover=arg.with_handover)
+        return OakInkImageDataset(oi_image, fields=arg.fields, with_handover=arg.with_handover)
+    elif arg.dataset == "image_mv":
+        from oikit.oi_image.oi_image_mv import OakInkImageMV
+        return OakInkImageDataset(OakInkImageMV(data_split=arg.data_split, mode_split="default"), fields=arg.fields)
+    else:  # arg.dataset == "shape":
+        from oikit.oi_shape import OakInkShape
+        return OakInkShapeDataset(OakInkShape(data_split=arg.data_split, mano_assets_root=arg.mano_assets_root))
+
+
+def measure(dataset, num_workers, arg):
+    loader = DataLoader(dataset,
+                        batch_size=arg.batch_size,
+                        shuffle=True,
+                        num_workers=num_workers,
+                        collate_fn=collate_fn,
+                        worker_init_fn=worker_init_fn if num_workers > 0 else None,
+                        persistent_workers=False)
+    n_samples = 0
+    tic = time.perf_counter()
+    first_batch = None
+    for i, batch in enumerate(loader):
+        if first_batch is None:
+            first_batch = time.perf_counter() - tic
+        n_samples += len(next(iter(batch.values())))
+        if i + 1 >= arg.num_batches:
+            break
+    elapsed = time.perf_counter() - tic
+    return n_samples / elapsed, first_batch
+
+
+def main(arg):
+    dataset = build_dataset(arg)
+    print(f"Got # of samples: {len(dataset)}, fields: {arg.fields if arg.dataset != 'shape' else 'all'}")
+    print(f"{'workers':>8}{'samples/s':>12}{'first batch (s)':>17}")
+    for num_workers in arg.num_workers:
+        throughput, first_batch = measure(dataset, num_workers, arg)
+        print(f"{num_workers:>8}{throughput:>12.1f}{first_batch:>17.2f}")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="DataLoader throughput of the oikit torch adapters")
+    parser.add_argument("--data_dir", type=str, default="data", help="environment variable 'OAKINK_DIR'")
+    parser.add_argument("--dataset", type=str, default="image", choices=["image", "image_mv", "shape"])
+    parser.add_argument("--data_split", type=str, default="train", help="data split")
+    parser.add_argument("--fields", nargs="+", default=["image", "cam_intr", "joints_3d", "joints_2d", "obj_verts_3d"])
+    parser.add_argument("--with_handover", action="store_true", help="add the partner hand of handover samples")
+    parser.add_argument("--mano_assets_root", type=str, default="assets/mano_v1_2")
+    parser.add_argument("--num_workers", type=int, nargs="+", default=[0, 4, 16])
+    parser.add_argument("--batch_size", type=int, default=32)
+    parser.add_argument("--num_batches", type=int, default=100, help="batches timed per setting")
+    arg = parser.parse_args()
+    os.environ["OAKINK_DIR"] = arg.data_dir
+    main(arg)
@@ -0,0 +1,62 @@
+import argparse
+import subprocess
+import sys
+
+HEAVY_MODULES = ["torch", "pytorch3d", "trimesh", "manotorch", "imageio"]
+
+
+def import_time(module):
+    """Run ``python -X importtime -c 'import <module>'`` in a fresh interpreter.
+
+    Returns:
+        tuple: cumulative import time of ``module`` in us, and {top-level package: summed self time in us}.
+    """
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True,
+                          text=True,
+                          check=True)
+    total = 0
+    per_package = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cum_us, name = [x.strip() for x in line[len("import time:"):].split("|")]
+        package = name.split(".")[0]
+        per_package[package] = per_package.get(package, 0) + int(self_us)
+        if name == module:
+            total = int(cum_us)
+    return total, per_package
+
+
+def main(arg):
+    failed = False
+    for module in arg.modules:
+        runs = [import_time(module) for _ in range(arg.repeat)]
+        total, per_package = min(runs, key=lambda r: r[0])
+        heavy = sorted(set(per_package) & set(HEAVY_MODULES))
+        print(f"import {module}: {total / 1e3:.1f} ms (best of {arg.repeat})"
+              f"{', pulls in ' + ', '.join(heavy) if heavy else ''}")
+        for package, self_us in sorted(per_package.items(), key=lambda x: -x[1])[:arg.top]:
+            print(f"    {self_us / 1e3:8.1f} ms  {package}")
+
+        if module == "oikit.oak_base":
+            if heavy:
+                print(f"FAIL: oikit.oak_base must not import {', '.join(heavy)}")
+                failed = True
+            if total / 1e3 > arg.budget_ms:
+                print(f"FAIL: oikit.oak_base took {total / 1e3:.1f} ms, budget is {arg.budget_ms} ms")
+                failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="import time of the oikit modules (python -X importtime)")
+    parser.add_argument("--modules",
+                        nargs="+",
+                        default=["oikit", "oikit.oak_base", "oikit.common", "oikit.oi_image", "oikit.oi_shape"])
+    parser.add_argument("--budget_ms", type=float, default=50.0, help="import budget of oikit.oak_base")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per module, best one is reported")
+    parser.add_argument("--top", type=int, default=8, help="number of slowest packages to list")
+    arg = parser.parse_args()
+    main(arg)
@@ -0,0 +1,80 @@
+import os
+import argparse
+import gc
+import json
+import multiprocessing as mp
+
+from oikit.oi_image.utils import InfoIndex, InfoStrView
+
+
+def private_dirty_mb():
+    # memory this process no longer shares with its parent (copy-on-write pages + own allocations)
+    with open("/proc/self/smaps_rollup", "r") as f:
+        for line in f:
+            if line.startswith("Private_Dirty:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def make_info_list(num_samples):
+    info_list = []
+    n_frame = 200
+    for i in range(num_samples // (n_frame * 4)):
+        seq_id = f"A{i % 100:02d}{i:03d}_000{1 + i % 4}_0000/2021-09-26-19-{i // 60 % 60:02d}-{i % 60:02d}"
+        for frame_id in range(n_frame):
+            for view_id in range(4):
+                info_list.append([seq_id, 0, frame_id, view_id])
+    return info_list
+
+
+def worker(info_list, info_str_list, queue):
+    before = private_dirty_mb()
+    # what a DataLoader worker does: touch every sample's info
+    for idx in range(len(info_list)):
+        _ = info_list[idx][0]
+        _ = info_str_list[idx]
+    queue.put(private_dirty_mb() - before)
+
+
+def measure(info_list, info_str_list, num_workers):
+    ctx = mp.get_context("fork")
+    queue = ctx.Queue()
+    gc.freeze()  # keep the parent's gc from touching the pages we measure
+    procs = [ctx.Process(target=worker, args=(info_list, info_str_list, queue)) for _ in range(num_workers)]
+    for p in procs:
+        p.start()
+    growth = [queue.get() for _ in procs]
+    for p in procs:
+        p.join()
+    gc.unfreeze()
+    return sum(growth) / len(growth)
+
+
+def main(arg):
+    if arg.num_samples > 0:
+        raw_info_list = make_info_list(arg.num_samples)
+    else:
+        raw_info_list = json.load(open(os.path.join(arg.data_dir, "image", "anno", "seq_all.json")))
+    print("Got # of samples:", len(raw_info_list))
+
+    legacy_str_list = ["__".join([str(x) for x in info]).replace("/", "__") for info in raw_info_list]
+    mb = measure(raw_info_list, legacy_str_list, arg.num_workers)
+    print(f"list of lists  : +{mb:.1f} MB private memory per worker")
+    del legacy_str_list
+
+    info_index = InfoIndex.from_info_list(raw_info_list)
+    del raw_info_list
+    gc.collect()
+    mb = measure(info_index, InfoStrView(info_index), arg.num_workers)
+    print(f"InfoIndex      : +{mb:.1f} MB private memory per worker")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="per-worker memory growth of the OakInkImage sample index")
+    parser.add_argument("--data_dir", type=str, default="data", help="environment variable 'OAKINK_DIR'")
+    parser.add_argument("--num_samples", type=int, default=0, help="use a synthetic index of this size instead")
+    parser.add_argument("--num_workers", type=int, default=4, help="number of forked workers")
+    arg = parser.parse_args()
+    os.environ["OAKINK_DIR"] = arg.data_dir
+    main(arg)
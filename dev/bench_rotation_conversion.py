@@ -0,0 +1,80 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+import torch
+
+from oikit import common
+
+# name -> (input shape of one element, extra positional args)
+CONVERSIONS = {
+    "aa_to_rotmat": ((3,), ()),
+    "aa_to_quat": ((3,), ()),
+    "aa_to_rot6d": ((3,), ()),
+    "aa_to_ee": ((3,), ("xyz",)),
+    "rotmat_to_aa": ((3, 3), ()),
+    "rotmat_to_quat": ((3, 3), ()),
+    "rotmat_to_rot6d": ((3, 3), ()),
+    "rotmat_to_ee": ((3, 3), ("xyz",)),
+    "quat_to_aa": ((4,), ()),
+    "quat_to_rotmat": ((4,), ()),
+    "rot6d_to_rotmat": ((6,), ()),
+    "rot6d_to_aa": ((6,), ()),
+    "ee_to_rotmat": ((3,), ("xyz",)),
+    "ee_to_aa": ((3,), ("xyz",)),
+}
+
+
+def make_input(shape, batch_size, rng):
+    aa = rng.normal(size=(batch_size, 3))
+    if shape == (3, 3):
+        return common.aa_to_rotmat(aa)
+    if shape == (4,):
+        return common.aa_to_quat(aa)
+    if shape == (6,):
+        return common.aa_to_rot6d(aa)
+    return aa
+
+
+def timeit(fn, n_repeat):
+    best = float("inf")
+    for _ in range(n_repeat):
+        tic = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - tic)
+    return best
+
+
+def main(arg):
+    rng = np.random.default_rng(0)
+    batch_sizes = [10**i for i in range(arg.max_exp + 1)]
+    print(f"{'conversion':<16}{'batch':>9}{'numpy (ms)':>12}{'torch (ms)':>12}{'speedup':>9}{'max err':>10}")
+    failed = []
+    for name, (shape, args) in CONVERSIONS.items():
+        fn = getattr(common, name)
+        for batch_size in batch_sizes:
+            x = make_input(shape, batch_size, rng)
+            n_repeat = max(3, min(arg.repeat, 10**6 // batch_size))
+            # numpy path (float64) vs the previous behaviour: wrap as float32 tensor, convert, back to numpy
+            t_np = timeit(lambda: fn(x, *args), n_repeat)
+            t_th = timeit(lambda: fn(torch.FloatTensor(x), *args).numpy(), n_repeat)
+            err = np.abs(fn(x, *args) - fn(torch.from_numpy(x), *args).numpy()).max()
+            print(f"{name:<16}{batch_size:>9}{t_np * 1e3:>12.3f}{t_th * 1e3:>12.3f}{t_th / t_np:>8.1f}x{err:>10.1e}")
+            if not err <= arg.atol:
+                failed.append(f"{name} (batch {batch_size}): max err {err:.1e}")
+    if len(failed) > 0:
+        print(f"numpy and torch paths differ by more than atol={arg.atol:.0e}:")
+        print("\n".join(failed))
+        sys.exit(1)
+    print(f"OK: numpy and torch paths agree within atol={arg.atol:.0e}")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="numpy vs pytorch3d rotation conversion speed and agreement")
+    parser.add_argument("--max_exp", type=int, default=6, help="largest batch size is 10**max_exp")
+    parser.add_argument("--repeat", type=int, default=20, help="max timing repeats per batch size")
+    parser.add_argument("--atol", type=float, default=1e-6, help="max abs difference between the two paths")
+    arg = parser.parse_args()
+    main(arg)
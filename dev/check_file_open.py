@@ -0,0 +1,83 @@
+import os
+import sys
+import argparse
+import shutil
+import subprocess
+import tempfile
+
+DEV_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# (fields, files opened without / with the columnar store): every input file of a sample is opened at most once
+CASES = [
+    (["image"], 1, 1),
+    (["cam_intr"], 1, 0),
+    (["image", "cam_intr", "joints_3d", "joints_2d"], 3, 1),
+    (["joints_3d", "joints_2d", "verts_3d", "verts_2d"], 3, 0),
+    (["mano_pose", "mano_shape"], 1, 0),
+    (["obj_transf", "cam_intr"], 2, 0),
+    (["general_info", "mano_pose", "mano_shape"], 1, 1),
+]
+
+
+def run(script, *args):
+    subprocess.run([sys.executable, os.path.join(DEV_DIR, script), *args], check=True, stdout=subprocess.DEVNULL)
+
+
+def check(datasets, with_store):
+    n_fail = 0
+    for fields, n_pkl, n_store in CASES:
+        expected = n_store if with_store else n_pkl
+        for ds in datasets:
+            for idx in [0, len(ds) - 1]:
+                ds.n_file_open = 0
+                ds.get_sample(idx, fields)
+                if ds.n_file_open != expected:
+                    n_fail += 1
+                    print(f"FAIL {type(ds).__name__}.get_sample({idx}, {fields}): opened {ds.n_file_open} files, "
+                          f"expected {expected}")
+    return n_fail
+
+
+def main(arg):
+    data_dir = arg.data_dir or tempfile.mkdtemp(prefix="oakink_check_")
+    try:
+        if arg.data_dir is None:
+            run("make_synthetic_oakink.py", "--data_dir", data_dir, "--preset", "tiny", "--parts", "image")
+        os.environ["OAKINK_DIR"] = data_dir
+        from oikit.oi_image import OakInkImage
+        from oikit.oi_image.oi_image_mv import OakInkImageMV
+        from oikit.oi_image.utils import AnnoStore
+
+        n_fail = 0
+        for with_store in [False, True]:
+            if with_store and AnnoStore.open(data_dir) is None:
+                if arg.data_dir is not None:
+                    print(f"skip the columnar store, {AnnoStore.get_store_dir(data_dir)} is not packed")
+                    continue
+                run("pack_oakink_image_columnar.py", "--data_dir", data_dir, "--check", "0")
+            datasets = [OakInkImage(data_split="all", use_cache=False), OakInkImageMV(data_split="all")]
+            for ds in datasets:
+                if not with_store:
+                    ds._anno_store = None  # force the per-sample pickles
+                assert (ds._anno_store is not None) == with_store
+            n_fail += check(datasets, with_store)
+            print(f"{'columnar store' if with_store else 'pickles'}: checked {len(CASES)} field sets")
+    finally:
+        if arg.data_dir is None:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    if n_fail > 0:
+        print(f"{n_fail} regressions of the per-sample file opens")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="check the files opened by get_sample, exit non-zero on regression")
+    parser.add_argument("--data_dir",
+                        type=str,
+                        default=None,
+                        help="existing OAKINK_DIR, left untouched; defaults to a synthetic tree in a temp dir")
+    arg = parser.parse_args()
+    main(arg)
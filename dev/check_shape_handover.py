@@ -0,0 +1,86 @@
+import os
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from oikit.oi_shape import OakInkShape
+
+
+def pair_handover_reference(grasp_list, category_begin_idx):
+    # the pairwise scan OakInkShape used before the hash join, copies the partner arrays into each grasp
+    for i, g in enumerate(grasp_list):
+        if g["subject_alt_id"] is None:
+            continue
+        for bidx in category_begin_idx:
+            if bidx <= i:
+                cat_begin_idx = bidx
+            else:
+                break
+        for j, alt_g in enumerate(grasp_list[cat_begin_idx:]):
+            if (g["seq_ts"] == alt_g["seq_ts"] and g["obj_id"] == alt_g["obj_id"] and
+                    g["pass_stage"] == alt_g["pass_stage"] and g["source"] != alt_g["source"]):
+                assert g["subject_id"] == alt_g["subject_alt_id"] and g["subject_alt_id"] == alt_g["subject_id"]
+                g["alt_grasp_item"] = {
+                    "alt_joints": alt_g["joints"],
+                    "alt_verts": alt_g["verts"],
+                    "alt_hand_pose": alt_g["hand_pose"],
+                    "alt_hand_shape": alt_g["hand_shape"],
+                    "alt_hand_tsl": alt_g["hand_tsl"],
+                }
+                break
+    return list(filter(lambda x: x["action_id"] != "0004" or x.get("alt_grasp_item") is not None, grasp_list))
+
+
+def main(arg):
+    oi_shape_dir = os.path.join(arg.data_dir, "shape", "oakink_shape_v2")
+    if not os.path.isdir(oi_shape_dir):
+        sys.exit(f"{oi_shape_dir} not found, check OAKINK_DIR / --data_dir")
+    oi_shape = OakInkShape(data_split=arg.data_split,
+                           intent_mode=arg.intent_mode,
+                           category=arg.categories,
+                           mano_assets_root=arg.mano_assets_root)
+    grasp_list, category_begin_idx = oi_shape._scan_grasps()
+    if len(grasp_list) == 0:
+        sys.exit(f"no grasps found under {oi_shape.oi_shape_dir}, check OAKINK_DIR / --data_dir")
+    oi_shape._forward_mano(grasp_list)
+    print(f"Got # of grasps before pairing: {len(grasp_list)}")
+
+    tic = time.perf_counter()
+    reference = pair_handover_reference([dict(g) for g in grasp_list], category_begin_idx)
+    t_ref = time.perf_counter() - tic
+    tic = time.perf_counter()
+    paired = oi_shape._pair_handover([dict(g) for g in grasp_list], category_begin_idx)
+    t_new = time.perf_counter() - tic
+    print(f"pairwise scan: {t_ref:.3f} s, hash join: {t_new:.3f} s")
+
+    assert [g["file_path"] for g in paired] == [g["file_path"] for g in reference], "kept grasps differ"
+    n_handover = 0
+    for g, ref_g in zip(paired, reference):
+        if g["action_id"] != "0004":
+            assert g["alt_idx"] is None
+            continue
+        n_handover += 1
+        alt_g = paired[g["alt_idx"]]
+        for key in ["joints", "verts", "hand_pose", "hand_shape", "hand_tsl"]:
+            assert np.array_equal(alt_g[key], ref_g["alt_grasp_item"][f"alt_{key}"]), f"alt_{key} of {g['file_path']}"
+    print(f"OK: {len(paired)} grasps kept, {n_handover} handover grasps paired as before")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="check OakInkShape handover pairing against the pairwise scan")
+    parser.add_argument("--data_dir",
+                        type=str,
+                        default=os.environ.get("OAKINK_DIR"),
+                        help="environment variable 'OAKINK_DIR', defaults to its current value")
+    parser.add_argument("--data_split", type=str, default="all", help="data split")
+    parser.add_argument("--categories", nargs="+", default="all", help="list of object categories")
+    parser.add_argument("--intent_mode", nargs="+", default="all", help="list of intents, must include handover")
+    parser.add_argument("--mano_assets_root", type=str, default="assets/mano_v1_2")
+    arg = parser.parse_args()
+    if arg.data_dir is None:
+        parser.error("OAKINK_DIR is not set, pass --data_dir")
+    os.environ["OAKINK_DIR"] = arg.data_dir
+    main(arg)
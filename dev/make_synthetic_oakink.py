@@ -0,0 +1,459 @@
+import os
+import argparse
+import json
+import pickle
+from multiprocessing import Pool
+
+import numpy as np
+from PIL import Image
+from tqdm import tqdm
+
+from oikit.oak_base import ATTRIBUTE_PHRASES
+from oikit.oak_base import CATEGORIES as OAKBASE_CATEGORIES
+from oikit.oi_image.utils import IMAGE_SIZE
+from oikit.oi_shape.utils import ALL_CAT
+
+# sizes of the fake tree, any of them can be overridden on the command line
+PRESETS = {
+    "tiny": {
+        "n_objects": 2,
+        "n_seqs": 4,
+        "n_frames": 8,
+        "n_subjects": 4,
+        "mesh_res": 8,
+        "n_shape_cats": 2,
+        "n_shape_objs": 2,
+        "n_grasps": 4,
+        "n_virtual_objs": 2,
+        "n_oakbase_cats": 2,
+        "n_oakbase_objs": 2,
+    },
+    "small": {
+        "n_objects": 8,
+        "n_seqs": 24,
+        "n_frames": 30,
+        "n_subjects": 8,
+        "mesh_res": 32,
+        "n_shape_cats": 6,
+        "n_shape_objs": 4,
+        "n_grasps": 8,
+        "n_virtual_objs": 4,
+        "n_oakbase_cats": 6,
+        "n_oakbase_objs": 4,
+    },
+    "medium": {
+        "n_objects": 40,
+        "n_seqs": 160,
+        "n_frames": 60,
+        "n_subjects": 12,
+        "mesh_res": 64,
+        "n_shape_cats": len(ALL_CAT),
+        "n_shape_objs": 8,
+        "n_grasps": 16,
+        "n_virtual_objs": 8,
+        "n_oakbase_cats": len(OAKBASE_CATEGORIES),
+        "n_oakbase_objs": 8,
+    },
+}
+
+FRAMEDATA_COLOR_NAME = ["north_east_color", "south_east_color", "north_west_color", "south_west_color"]
+MODE_SPLIT_KEYS = ["split0", "split1", "split2", "split0_ho"]
+
+
+# region ===== geometry >>>>>
+def ellipsoid_mesh(radii, res):
+    """UV ellipsoid with ``res`` rings of ``2 * res`` vertices, plus the two poles."""
+    theta = np.linspace(0, np.pi, res + 2)[1:-1]
+    phi = np.linspace(0, 2 * np.pi, 2 * res, endpoint=False)
+    theta, phi = np.meshgrid(theta, phi, indexing="ij")
+    ring = np.stack([np.sin(theta) * np.cos(phi), np.sin(theta) * np.sin(phi), np.cos(theta)], axis=-1).reshape(-1, 3)
+    verts = np.concatenate([[[0, 0, 1]], ring, [[0, 0, -1]]]) * radii
+    n_phi = 2 * res
+    faces = []
+    for j in range(n_phi):
+        faces.append([0, 1 + j, 1 + (j + 1) % n_phi])
+        faces.append([len(verts) - 1, 1 + (res - 1) * n_phi + (j + 1) % n_phi, 1 + (res - 1) * n_phi + j])
+    for i in range(res - 1):
+        for j in range(n_phi):
+            a, b = 1 + i * n_phi + j, 1 + i * n_phi + (j + 1) % n_phi
+            faces.append([a, a + n_phi, b])
+            faces.append([b, a + n_phi, b + n_phi])
+    return verts.astype(np.float32), np.array(faces, dtype=np.int64)
+
+
+def write_obj(path, verts, faces):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.writelines(f"v {x:.6f} {y:.6f} {z:.6f}\n" for x, y, z in verts)
+        f.writelines(f"f {a + 1} {b + 1} {c + 1}\n" for a, b, c in faces)
+
+
+def write_ply_points(path, points):
+    with open(path, "w") as f:
+        f.write(f"ply\nformat ascii 1.0\nelement vertex {len(points)}\n"
+                "property float x\nproperty float y\nproperty float z\nend_header\n")
+        f.writelines(f"{x:.6f} {y:.6f} {z:.6f}\n" for x, y, z in points)
+
+
+def random_mesh(rng, res, scale=0.05):
+    return ellipsoid_mesh(scale * rng.uniform(0.5, 1.5, size=3), res)
+
+
+def look_at_extr(azimuth, elevation, distance):
+    # T_c_w of an opencv camera (x right, y down, z forward) looking at the world origin, world z up
+    center = distance * np.array(
+        [np.cos(elevation) * np.cos(azimuth),
+         np.cos(elevation) * np.sin(azimuth),
+         np.sin(elevation)])
+    z = -center / np.linalg.norm(center)
+    x = np.cross(z, [0.0, 0.0, 1.0])
+    x /= np.linalg.norm(x)
+    y = np.cross(z, x)
+    rot = np.stack([x, y, z])  # R_c_w
+    extr = np.eye(4)
+    extr[:3, :3] = rot
+    extr[:3, 3] = -rot @ center
+    return extr
+
+
+def rotz(angle):
+    c, s = np.cos(angle), np.sin(angle)
+    return np.array([[c, -s, 0], [s, c, 0], [0, 0, 1]])
+
+
+def random_quat(rng, n, spread=0.3):
+    # unit quaternions (w, x, y, z) near identity
+    quat = np.concatenate([np.ones((n, 1)), spread * rng.normal(size=(n, 3))], axis=1)
+    return quat / np.linalg.norm(quat, axis=1, keepdims=True)
+
+
+def transf(points, transf_mat):
+    return points @ transf_mat[:3, :3].T + transf_mat[:3, 3]
+
+
+# endregion <<<<<
+
+
+# region ===== OakInk-Image >>>>>
+def make_image_seqs(arg, rng):
+    obj_ids = [f"A{i // 20 + 1:02d}{i % 20 + 1:03d}" for i in range(arg.n_objects)]
+    seqs = []
+    for i in range(arg.n_seqs):
+        obj_id = obj_ids[i % len(obj_ids)]
+        is_handover = rng.random() < arg.handover_ratio
+        if is_handover:
+            subjects = sorted(rng.choice(arg.n_subjects, size=2, replace=False).tolist())
+            intent = "0004"
+        else:
+            subjects = [int(rng.integers(arg.n_subjects))]
+            intent = ["0001", "0002", "0003"][int(rng.integers(3))]
+        seq_cat = "_".join([obj_id, intent] + [f"{s:04d}" for s in subjects])
+        # distinct timestamps, one sequence every few minutes
+        minutes = 7 * i + int(rng.integers(5))
+        seq_ts = f"2021-10-{1 + minutes // 1440 % 28:02d}-{minutes // 60 % 24:02d}-{minutes % 60:02d}-{i % 60:02d}"
+        seqs.append({"seq_id": f"{seq_cat}/{seq_ts}", "obj_id": obj_id, "subjects": subjects})
+    return obj_ids, seqs
+
+
+def write_image_anno(arg, rng, obj_ids, seqs):
+    import torch  # general_info holds torch tensors, as in the released annotations
+
+    anno_dir = os.path.join(arg.data_dir, "image", "anno")
+    for field in ["cam_intr", "hand_j", "hand_v", "obj_transf", "general_info"]:
+        os.makedirs(os.path.join(anno_dir, field), exist_ok=True)
+
+    obj_dir = os.path.join(arg.data_dir, "image", "obj")
+    for obj_id in obj_ids:
+        write_obj(os.path.join(obj_dir, f"{obj_id}.obj"), *random_mesh(rng, arg.mesh_res))
+
+    img_w, img_h = IMAGE_SIZE
+    focal = 600.0
+    cam_intr = np.array([[focal, 0, img_w / 2], [0, focal, img_h / 2], [0, 0, 1]], dtype=np.float32)
+
+    seq_all = []
+    seq_status = {}
+    for seq in tqdm(seqs, desc="image anno"):
+        seq_status[seq["seq_id"]] = "ok"
+        # four cameras around the table, fixed per sequence
+        base_azimuth = rng.uniform(0, np.pi / 2)
+        cam_extrs = [look_at_extr(base_azimuth + v * np.pi / 2, rng.uniform(0.4, 0.7), 0.6) for v in range(4)]
+        hand_shape = 0.5 * rng.normal(size=(len(seq["subjects"]), 10))
+        joints_can = [0.04 * rng.normal(size=(21, 3)) for _ in seq["subjects"]]
+        verts_can = [j[rng.integers(21, size=778)] + 0.01 * rng.normal(size=(778, 3)) for j in joints_can]
+        for sub_id in range(len(seq["subjects"])):
+            side = np.array([0.08 * (1 - 2 * sub_id), 0.0, 0.03])
+            for frame_id in range(arg.n_frames):
+                obj_anno = np.eye(4)
+                obj_anno[:3, :3] = rotz(0.05 * frame_id)
+                obj_anno[:3, 3] = [0.002 * frame_id, 0.0, 0.05]
+                joints_w = transf(joints_can[sub_id] + side, obj_anno)
+                verts_w = transf(verts_can[sub_id] + side, obj_anno)
+                hand_pose = random_quat(rng, 16)
+                for view_id in range(4):
+                    info = [seq["seq_id"], sub_id, frame_id, view_id]
+                    seq_all.append(info)
+                    info_str = "__".join([str(x) for x in info]).replace("/", "__")
+                    extr = cam_extrs[view_id]
+                    anno = {
+                        "cam_intr": cam_intr,
+                        "hand_j": transf(joints_w, extr).astype(np.float32),
+                        "hand_v": transf(verts_w, extr).astype(np.float32),
+                        "obj_transf": (extr @ obj_anno).astype(np.float32),
+                        "general_info": {
+                            "hand_anno": {
+                                "hand_tsl": torch.from_numpy(joints_w[0].astype(np.float32)),
+                                "hand_shape": torch.from_numpy(hand_shape[sub_id].astype(np.float32)),
+                                "hand_pose": torch.from_numpy(hand_pose.astype(np.float32)),
+                            },
+                            "cam_extr": torch.from_numpy(extr.astype(np.float32)),
+                            "cam_intr": torch.from_numpy(cam_intr),
+                            "obj_anno": torch.from_numpy(obj_anno.astype(np.float32)),
+                        },
+                    }
+                    for field, value in anno.items():
+                        with open(os.path.join(anno_dir, field, f"{info_str}.pkl"), "wb") as f:
+                            pickle.dump(value, f)
+
+    with open(os.path.join(anno_dir, "seq_all.json"), "w") as f:
+        json.dump(seq_all, f)
+    with open(os.path.join(anno_dir, "seq_status.json"), "w") as f:
+        json.dump(seq_status, f)
+    return seq_all
+
+
+def write_image_splits(arg, rng, seqs, seq_all):
+    """split0 / split0_ho hold out one view per sequence, split1 a few subjects, split2 a quarter of the objects.
+
+    Each ``train+val`` set is further split into ``train`` and ``val``, and every split is also written for
+    ``OakInkImageMV`` under ``anno_mv``, with all four views of each frame, as ``dev/extend_split.py`` does.
+    """
+    seq_of = {seq["seq_id"]: seq for seq in seqs}
+    test_view = {seq["seq_id"]: int(rng.integers(4)) for seq in seqs}
+    subjects = sorted({s for seq in seqs for s in seq["subjects"]})
+    test_subjects = set(subjects[:max(1, len(subjects) // 5)])
+    # a val subject must have recorded alone, as its two-hand sequences with train subjects are dropped
+    solo_subjects = sorted({seq["subjects"][0] for seq in seqs if len(seq["subjects"]) == 1} - test_subjects)
+    val_subjects = set(solo_subjects[:1])
+    obj_ids = sorted({seq["obj_id"] for seq in seqs})
+    test_objs = set(obj_ids[:max(1, len(obj_ids) // 4)])
+    val_objs = set(obj_ids[len(test_objs):len(test_objs) + max(1, len(obj_ids) // 15)])
+    val_seqs = set(rng.choice([seq["seq_id"] for seq in seqs], size=max(1, len(seqs) // 10), replace=False).tolist())
+
+    def view_split(info):
+        seq_id = info[0]
+        if info[3] == test_view[seq_id]:
+            return "test"
+        return "val" if seq_id in val_seqs else "train"
+
+    def subject_split(info):
+        seq_subjects = set(seq_of[info[0]]["subjects"])
+        if seq_subjects & test_subjects:
+            # two-hand sequences between a test and a train/val subject are dropped
+            return "test" if seq_subjects <= test_subjects else None
+        if seq_subjects & val_subjects:
+            return "val" if seq_subjects <= val_subjects else None
+        return "train"
+
+    def object_split(info):
+        obj_id = seq_of[info[0]]["obj_id"]
+        return "test" if obj_id in test_objs else ("val" if obj_id in val_objs else "train")
+
+    split_fns = {"split0": view_split, "split1": subject_split, "split2": object_split, "split0_ho": view_split}
+    for split_key in MODE_SPLIT_KEYS:
+        sets = {"train": [], "val": [], "test": []}
+        for info in seq_all:
+            data_split = split_fns[split_key](info)
+            if data_split is not None:
+                sets[data_split].append(info)
+        files = {
+            os.path.join("split", split_key, "seq_train.json"): sets["train"] + sets["val"],
+            os.path.join("split", split_key, "seq_test.json"): sets["test"],
+            os.path.join("split_train_val", split_key, "example_split_train.json"): sets["train"],
+            os.path.join("split_train_val", split_key, "example_split_val.json"): sets["val"],
+        }
+        for rel_path, info_list in files.items():
+            frames = sorted({tuple(info[:3]) for info in info_list})
+            for anno_name, items in [("anno", info_list), ("anno_mv", [[*f, v] for f in frames for v in range(4)])]:
+                path = os.path.join(arg.data_dir, "image", anno_name, rel_path)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "w") as f:
+                    json.dump(items, f)
+
+
+_backgrounds = None  # per-view backgrounds of the PNG writer processes
+
+
+def _init_png_writer(backgrounds):
+    global _backgrounds
+    _backgrounds = backgrounds
+
+
+def _write_png(job):
+    image_path, view_id, seed, noise_amp = job
+    rng = np.random.default_rng(seed)
+    background = _backgrounds[view_id]
+    noise = rng.integers(-noise_amp, noise_amp + 1, size=background.shape, dtype=np.int16)
+    image = np.clip(background + noise, 0, 255).astype(np.uint8)
+    os.makedirs(os.path.dirname(image_path), exist_ok=True)
+    Image.fromarray(image).save(image_path)
+
+
+def write_image_streams(arg, rng, seq_all):
+    # smooth background plus per-frame noise, so that the PNGs neither compress to nothing nor are pure noise.
+    # PNG encoding dominates, so frames are written by a process pool, each with its own seeded rng.
+    img_w, img_h = IMAGE_SIZE  # the loaders expect the recorded resolution
+    stream_dir = os.path.join(arg.data_dir, "image", "stream_release_v2")
+    backgrounds = []
+    for _ in range(4):
+        coarse = rng.integers(0, 256, size=(img_h // 40 + 2, img_w // 40 + 2, 3)).astype(np.uint8)
+        backgrounds.append(np.asarray(Image.fromarray(coarse).resize((img_w, img_h), Image.BILINEAR), np.int16))
+    image_paths = {  # both subjects of a handover sequence share the frame
+        os.path.join(stream_dir, seq_id, f"{FRAMEDATA_COLOR_NAME[view_id]}_{frame_id}.png"): view_id
+        for seq_id, _, frame_id, view_id in seq_all
+    }
+    jobs = [(path, view_id, (arg.seed, i), arg.image_noise) for i, (path, view_id) in enumerate(image_paths.items())]
+    with Pool(arg.num_workers, initializer=_init_png_writer, initargs=(backgrounds,)) as pool:
+        for _ in tqdm(pool.imap_unordered(_write_png, jobs, chunksize=16), total=len(jobs), desc="image streams"):
+            pass
+
+
+# endregion <<<<<
+
+
+# region ===== OakInk-Shape >>>>>
+def write_shape(arg, rng):
+    shape_dir = os.path.join(arg.data_dir, "shape")
+    grasp_dir = os.path.join(shape_dir, "oakink_shape_v2")
+    real_meta, virtual_meta = {}, {}
+    categories = ALL_CAT[:arg.n_shape_cats]
+    n_grasps = 0
+    for cat_idx, cat in enumerate(tqdm(categories, desc="shape")):
+        virtual_ids = [f"s{cat_idx + 1:02d}{k + 1:03d}" for k in range(arg.n_virtual_objs)]
+        for k, virtual_id in enumerate(virtual_ids):
+            virtual_meta[virtual_id] = {"name": f"{cat}_{k}", "cate_id": cat}
+            for suffix, res in [("align", arg.mesh_res), ("align_ds", max(4, arg.mesh_res // 4))]:
+                verts, faces = random_mesh(rng, res)
+                write_obj(os.path.join(shape_dir, "OakInkVirtualObjectsV2", f"{cat}_{k}", suffix, f"{cat}_{k}.obj"),
+                          verts, faces)
+
+        for k in range(arg.n_shape_objs):
+            obj_id = f"S{cat_idx + 1:02d}{k + 1:03d}"
+            obj_name = f"{k:03d}_{cat}"
+            real_meta[obj_id] = {"name": obj_name, "cate_id": cat}
+            for suffix, res in [("align", arg.mesh_res), ("align_ds", max(4, arg.mesh_res // 4))]:
+                write_obj(os.path.join(shape_dir, "OakInkObjectsV2", obj_name, suffix, f"{obj_name}.obj"),
+                          *random_mesh(rng, res))
+
+            # each recorded grasp is transferred to every virtual object of the category
+            g = 0
+            while g < arg.n_grasps:
+                pass_stage = f"pass{int(rng.integers(1, 3))}"
+                seq_ts = f"2021-10-{int(rng.integers(1, 29)):02d}-{int(rng.integers(24)):02d}-" \
+                         f"{int(rng.integers(60)):02d}-{int(rng.integers(60)):02d}"
+                if rng.random() < arg.handover_ratio:
+                    # a handover is two grasps of the same recording, the receiver's source is marked "_alt"
+                    subjects = rng.choice(arg.n_subjects, size=2, replace=False)
+                    seq_cat = f"{obj_id}_0004_{subjects[0]:04d}_{subjects[1]:04d}"
+                    sources = [f"{pass_stage}/{seq_cat}/{seq_ts}", f"{pass_stage}/{seq_cat}/{seq_ts}_alt"]
+                else:
+                    intent = ["0001", "0002", "0003"][int(rng.integers(3))]
+                    seq_cat = f"{obj_id}_{intent}_{int(rng.integers(arg.n_subjects)):04d}"
+                    sources = [f"{pass_stage}/{seq_cat}/{seq_ts}"]
+                for source in sources:
+                    grasp_id = rng.bytes(5).hex()
+                    real_grasp_dir = os.path.join(grasp_dir, cat, obj_id, grasp_id)
+                    os.makedirs(real_grasp_dir, exist_ok=True)
+                    with open(os.path.join(real_grasp_dir, "source.txt"), "w") as f:
+                        f.write(source)
+                    for target_dir in [real_grasp_dir] + [os.path.join(real_grasp_dir, v) for v in virtual_ids]:
+                        os.makedirs(target_dir, exist_ok=True)
+                        hand_param = {
+                            "pose": (0.3 * rng.normal(size=48)).astype(np.float32),
+                            "shape": (0.5 * rng.normal(size=10)).astype(np.float32),
+                            "tsl": (0.05 * rng.normal(size=3)).astype(np.float32),
+                        }
+                        with open(os.path.join(target_dir, "hand_param.pkl"), "wb") as f:
+                            pickle.dump(hand_param, f)
+                        n_grasps += 1
+                g += len(sources)
+
+    meta_dir = os.path.join(shape_dir, "metaV2")
+    os.makedirs(meta_dir, exist_ok=True)
+    with open(os.path.join(meta_dir, "object_id.json"), "w") as f:
+        json.dump(real_meta, f, indent=2)
+    with open(os.path.join(meta_dir, "virtual_object_id.json"), "w") as f:
+        json.dump(virtual_meta, f, indent=2)
+    with open(os.path.join(meta_dir, "yodaobject_cat.json"), "w") as f:
+        json.dump({f"{i + 1:02d}": cat for i, cat in enumerate(categories)}, f, indent=2)
+    return n_grasps
+
+
+# endregion <<<<<
+
+
+def write_oakbase(arg, rng):
+    oakbase_dir = os.path.join(arg.data_dir, "OakBase")
+    for cate in OAKBASE_CATEGORIES[:arg.n_oakbase_cats]:
+        for k in range(arg.n_oakbase_objs):
+            obj_dir = os.path.join(oakbase_dir, cate, f"{cate}_{k}")
+            os.makedirs(obj_dir, exist_ok=True)
+            for p in range(int(rng.integers(1, 4))):
+                verts, _ = random_mesh(rng, max(4, arg.mesh_res // 2))
+                write_ply_points(os.path.join(obj_dir, f"part_{p:02d}.ply"), verts)
+                attrs = rng.choice(ATTRIBUTE_PHRASES, size=int(rng.integers(1, 3)), replace=False).tolist()
+                with open(os.path.join(obj_dir, f"part_{p:02d}.json"), "w") as f:
+                    json.dump({"name": f"part_{p}", "attr": attrs}, f)
+
+
+def main(arg):
+    rng = np.random.default_rng(arg.seed)
+    os.makedirs(arg.data_dir, exist_ok=True)
+    summary = {}
+    if "image" in arg.parts:
+        obj_ids, seqs = make_image_seqs(arg, rng)
+        seq_all = write_image_anno(arg, rng, obj_ids, seqs)
+        write_image_splits(arg, rng, seqs, seq_all)
+        if arg.image_noise >= 0:
+            write_image_streams(arg, rng, seq_all)
+        summary["image"] = {"n_seqs": len(seqs), "n_samples": len(seq_all)}
+    if "shape" in arg.parts:
+        summary["shape"] = {"n_grasps": write_shape(arg, rng)}
+    if "oakbase" in arg.parts:
+        write_oakbase(arg, rng)
+
+    # what this tree was generated with, so that benchmark numbers can be reproduced
+    with open(os.path.join(arg.data_dir, "synthetic.json"), "w") as f:
+        json.dump({"args": vars(arg), "summary": summary}, f, indent=2)
+    print(f"synthetic OAKINK_DIR written to {arg.data_dir}: {summary}")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="write a scaled-down synthetic OAKINK_DIR for benchmarks and tests")
+    parser.add_argument("--data_dir", type=str, required=True, help="output directory, use it as 'OAKINK_DIR'")
+    parser.add_argument("--preset", type=str, default="small", choices=list(PRESETS), help="default sizes")
+    parser.add_argument("--parts", nargs="+", default=["image", "shape", "oakbase"], 
+                        choices=["image", "shape", "oakbase"])
+    parser.add_argument("--seed", type=int, default=0)
+    # OakInk-Image
+    parser.add_argument("--n_objects", type=int, help="objects recorded in OakInk-Image")
+    parser.add_argument("--n_seqs", type=int, help="OakInk-Image sequences")
+    parser.add_argument("--n_frames", type=int, help="frames per subject of a sequence, each seen from 4 views")
+    parser.add_argument("--n_subjects", type=int, help="subject pool")
+    parser.add_argument("--handover_ratio", type=float, default=0.25, help="fraction of two-subject handovers")
+    parser.add_argument("--image_noise", type=int, default=8, help="per-pixel noise amplitude, -1 skips the PNGs")
+    parser.add_argument("--num_workers", type=int, default=os.cpu_count(), help="processes writing the PNGs")
+    parser.add_argument("--mesh_res", type=int, help="object meshes have about 2 * mesh_res ** 2 vertices")
+    # OakInk-Shape
+    parser.add_argument("--n_shape_cats", type=int, help="categories, first ones of oikit.oi_shape.utils.ALL_CAT")
+    parser.add_argument("--n_shape_objs", type=int, help="real objects per category")
+    parser.add_argument("--n_grasps", type=int, help="recorded grasps per real object")
+    parser.add_argument("--n_virtual_objs", type=int, help="virtual objects per category, every grasp transfers")
+    # OakBase
+    parser.add_argument("--n_oakbase_cats", type=int, help="categories, first ones of oikit.oak_base.CATEGORIES")
+    parser.add_argument("--n_oakbase_objs", type=int, help="objects per category")
+    arg = parser.parse_args()
+    for key, value in PRESETS[arg.preset].items():
+        if getattr(arg, key) is None:
+            setattr(arg, key, value)
+    main(arg)
@@ -0,0 +1,112 @@
+import os
+import argparse
+import json
+import pickle
+
+import numpy as np
+from oikit.oi_image.utils import (ANNO_STORE_FIELDS, ANNO_STORE_GENERAL_INFO_FIELDS, AnnoStore, batch_mano_pose,
+                                  mano_pose_from_general_info, mano_shape_from_general_info)
+from tqdm import tqdm
+
+
+def load_pkl(anno_dir, field, info):
+    info_str = "__".join([str(x) for x in info]).replace("/", "__")
+    with open(os.path.join(anno_dir, field, f"{info_str}.pkl"), "rb") as f:
+        return pickle.load(f)
+
+
+def pack_general_info(arg, anno_dir, info_list, save_prefix):
+    # mano_pose, mano_shape, cam_extr: read general_info chunk by chunk, every hand pose of a chunk is converted in
+    # one batched call
+    save_filepaths = {field: os.path.join(save_prefix, f"{field}.npy") for field in ANNO_STORE_GENERAL_INFO_FIELDS}
+    if all(os.path.exists(p) for p in save_filepaths.values()) and not arg.overwrite:
+        print(f"skip existing {', '.join(save_filepaths.values())}")
+        return
+    tmp_filepaths = {field: os.path.join(save_prefix, f"{field}.tmp.npy") for field in ANNO_STORE_GENERAL_INFO_FIELDS}
+    columns = {}
+    for field, shape in ANNO_STORE_GENERAL_INFO_FIELDS.items():
+        columns[field] = np.lib.format.open_memmap(tmp_filepaths[field],
+                                                   mode="w+",
+                                                   dtype=np.float32,
+                                                   shape=(len(info_list), *shape))
+    with tqdm(total=len(info_list), desc=", ".join(ANNO_STORE_GENERAL_INFO_FIELDS)) as bar:
+        for begin in range(0, len(info_list), arg.chunk_size):
+            end = min(begin + arg.chunk_size, len(info_list))
+            hand_pose = np.empty((end - begin, 16, 4), dtype=np.float32)
+            cam_extr = columns["cam_extr"][begin:end]
+            for i in range(begin, end):
+                general_info = load_pkl(anno_dir, "general_info", info_list[i])
+                hand_pose[i - begin] = np.asarray(general_info["hand_anno"]["hand_pose"]).reshape((16, 4))
+                cam_extr[i - begin] = np.asarray(general_info["cam_extr"])
+                columns["mano_shape"][i] = np.asarray(general_info["hand_anno"]["hand_shape"])
+                bar.update()
+            columns["mano_pose"][begin:end] = batch_mano_pose(hand_pose, cam_extr)
+    for column in columns.values():
+        column.flush()
+    del columns, column
+    for field in ANNO_STORE_GENERAL_INFO_FIELDS:
+        os.replace(tmp_filepaths[field], save_filepaths[field])
+
+
+def check_mano(arg, anno_dir, info_list, save_prefix):
+    # compare the packed columns with the per-sample conversion on a random subset
+    mano_pose = np.load(os.path.join(save_prefix, "mano_pose.npy"), mmap_mode="r")
+    mano_shape = np.load(os.path.join(save_prefix, "mano_shape.npy"), mmap_mode="r")
+    rng = np.random.default_rng(0)
+    sample_idxs = rng.choice(len(info_list), size=min(arg.check, len(info_list)), replace=False)
+    pose_err, shape_err = 0.0, 0.0
+    for i in tqdm(sample_idxs, desc="check mano"):
+        general_info = load_pkl(anno_dir, "general_info", info_list[i])
+        pose_err = max(pose_err, np.abs(mano_pose[i] - mano_pose_from_general_info(general_info)).max())
+        shape_err = max(shape_err, np.abs(mano_shape[i] - mano_shape_from_general_info(general_info)).max())
+    print(f"checked {len(sample_idxs)} samples: max |mano_pose diff| {pose_err:.2e}, "
+          f"max |mano_shape diff| {shape_err:.2e}")
+    assert pose_err < arg.atol and shape_err < arg.atol, "packed mano params differ from the per-sample path"
+
+
+def main(arg):
+    anno_dir = os.path.join(arg.data_dir, "image", "anno")
+    info_list = json.load(open(os.path.join(anno_dir, "seq_all.json")))
+    save_prefix = AnnoStore.get_store_dir(arg.data_dir)
+    os.makedirs(save_prefix, exist_ok=True)
+
+    print("Got # of samples:", len(info_list))
+    # columns are only reused if they were packed from this very seq_all.json
+    meta = AnnoStore.read_meta(arg.data_dir)
+    if meta != dict(AnnoStore.get_meta(arg.data_dir), n_rows=len(info_list)):
+        if not arg.overwrite and any(fn.endswith(".npy") for fn in os.listdir(save_prefix)):
+            print(f"{save_prefix} has no metadata or was packed from another seq_all.json, rebuild all columns")
+        arg.overwrite = True
+    meta_path = os.path.join(save_prefix, AnnoStore.META_FILE)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)  # readers ignore the store until it is complete again
+    for field, shape in ANNO_STORE_FIELDS.items():
+        save_filepath = os.path.join(save_prefix, f"{field}.npy")
+        if os.path.exists(save_filepath) and not arg.overwrite:
+            print(f"skip existing {save_filepath}")
+            continue
+        tmp_filepath = os.path.join(save_prefix, f"{field}.tmp.npy")
+        column = np.lib.format.open_memmap(tmp_filepath, mode="w+", dtype=np.float32, shape=(len(info_list), *shape))
+        for i, info in enumerate(tqdm(info_list, desc=field)):
+            column[i] = np.asarray(load_pkl(anno_dir, field, info), dtype=np.float32)
+        column.flush()
+        del column
+        os.replace(tmp_filepath, save_filepath)  # atomic, readers never see a partial column
+
+    pack_general_info(arg, anno_dir, info_list, save_prefix)
+    if arg.check > 0:
+        check_mano(arg, anno_dir, info_list, save_prefix)
+    AnnoStore.write_meta(arg.data_dir, len(info_list))
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="pack OakInkImage annotations into columnar .npy arrays")
+    parser.add_argument("--data_dir", type=str, default="data", help="environment variable 'OAKINK_DIR'")
+    parser.add_argument("--overwrite", action="store_true", help="rebuild columns that already exist")
+    parser.add_argument("--chunk_size", type=int, default=4096, help="samples per batched mano pose conversion")
+    parser.add_argument("--check", type=int, default=1000, help="samples checked against the per-sample path")
+    parser.add_argument("--atol", type=float, default=1e-4, help="tolerance of the check")
+    arg = parser.parse_args()
+    os.environ["OAKINK_DIR"] = arg.data_dir
+    main(arg)
@@ -1,19 +1,185 @@
+from __future__ import annotations
+
+import inspect
 import logging
-from typing import Union
+import os
+import shutil
+from typing import TYPE_CHECKING, Union
 
 import numpy as np
-import torch
-from pytorch3d.transforms import (
-    axis_angle_to_matrix,
-    axis_angle_to_quaternion,
-    euler_angles_to_matrix,
-    matrix_to_euler_angles,
-    matrix_to_quaternion,
-    matrix_to_rotation_6d,
-    quaternion_to_axis_angle,
-    quaternion_to_matrix,
-    rotation_6d_to_matrix,
-)
+from oikit import __version__ as oikit_version
+
+if TYPE_CHECKING:
+    import torch
+
+
+def _np_sqrt_positive_part(x):
+    ret = np.zeros_like(x)
+    positive_mask = x > 0
+    ret[positive_mask] = np.sqrt(x[positive_mask])
+    return ret
+
+
+def _np_normalize(x, eps=1e-12):
+    return x / np.maximum(np.linalg.norm(x, axis=-1, keepdims=True), eps)
+
+
+def _np_axis_angle_rotation(axis, angle):
+    cos = np.cos(angle)
+    sin = np.sin(angle)
+    one = np.ones_like(angle)
+    zero = np.zeros_like(angle)
+    if axis == "X":
+        r_flat = (one, zero, zero, zero, cos, -sin, zero, sin, cos)
+    elif axis == "Y":
+        r_flat = (cos, zero, sin, zero, one, zero, -sin, zero, cos)
+    else:  # axis == "Z"
+        r_flat = (cos, -sin, zero, sin, cos, zero, zero, zero, one)
+    return np.stack(r_flat, -1).reshape(angle.shape + (3, 3))
+
+
+def _np_angle_from_tan(axis, other_axis, data, horizontal, tait_bryan):
+    i1, i2 = {"X": (2, 1), "Y": (0, 2), "Z": (1, 0)}[axis]
+    if horizontal:
+        i2, i1 = i1, i2
+    even = (axis + other_axis) in ["XY", "YZ", "ZX"]
+    if horizontal == even:
+        return np.arctan2(data[..., i1], data[..., i2])
+    if tait_bryan:
+        return np.arctan2(-data[..., i2], data[..., i1])
+    return np.arctan2(data[..., i2], -data[..., i1])
+
+
+def _np_sin_half_over_angle(angles, half_angles):
+    # sin(angle / 2) / angle, with its taylor expansion near zero
+    eps = 1e-6
+    small_angles = np.abs(angles) < eps
+    safe_angles = np.where(small_angles, 1.0, angles)
+    return np.where(small_angles, 0.5 - (angles * angles) / 48, np.sin(half_angles) / safe_angles)
+
+
+def _np_quaternion_to_matrix(quaternions):
+    r, i, j, k = np.moveaxis(quaternions, -1, 0)
+    two_s = 2.0 / (quaternions * quaternions).sum(-1)
+    o = np.stack(
+        (
+            1 - two_s * (j * j + k * k),
+            two_s * (i * j - k * r),
+            two_s * (i * k + j * r),
+            two_s * (i * j + k * r),
+            1 - two_s * (i * i + k * k),
+            two_s * (j * k - i * r),
+            two_s * (i * k - j * r),
+            two_s * (j * k + i * r),
+            1 - two_s * (i * i + j * j),
+        ),
+        -1,
+    )
+    return o.reshape(quaternions.shape[:-1] + (3, 3))
+
+
+def _np_matrix_to_quaternion(matrix):
+    batch_dim = matrix.shape[:-2]
+    m00, m01, m02, m10, m11, m12, m20, m21, m22 = np.moveaxis(matrix.reshape(batch_dim + (9,)), -1, 0)
+    q_abs = _np_sqrt_positive_part(
+        np.stack(
+            [
+                1.0 + m00 + m11 + m22,
+                1.0 + m00 - m11 - m22,
+                1.0 - m00 + m11 - m22,
+                1.0 - m00 - m11 + m22,
+            ],
+            -1,
+        ))
+    quat_by_rijk = np.stack(
+        [
+            np.stack([q_abs[..., 0]**2, m21 - m12, m02 - m20, m10 - m01], -1),
+            np.stack([m21 - m12, q_abs[..., 1]**2, m10 + m01, m02 + m20], -1),
+            np.stack([m02 - m20, m10 + m01, q_abs[..., 2]**2, m12 + m21], -1),
+            np.stack([m10 - m01, m20 + m02, m21 + m12, q_abs[..., 3]**2], -1),
+        ],
+        -2,
+    )
+    quat_candidates = quat_by_rijk / (2.0 * np.maximum(q_abs[..., None], 0.1))
+    best = np.argmax(q_abs, axis=-1)[..., None, None]
+    return np.take_along_axis(quat_candidates, best, axis=-2)[..., 0, :]
+
+
+def _np_quaternion_to_axis_angle(quaternions):
+    norms = np.linalg.norm(quaternions[..., 1:], axis=-1, keepdims=True)
+    half_angles = np.arctan2(norms, quaternions[..., :1])
+    angles = 2 * half_angles
+    return quaternions[..., 1:] / _np_sin_half_over_angle(angles, half_angles)
+
+
+def _np_axis_angle_to_quaternion(axis_angle):
+    angles = np.linalg.norm(axis_angle, axis=-1, keepdims=True)
+    half_angles = angles * 0.5
+    sin_half_angles_over_angles = _np_sin_half_over_angle(angles, half_angles)
+    return np.concatenate([np.cos(half_angles), axis_angle * sin_half_angles_over_angles], axis=-1)
+
+
+def _np_axis_angle_to_matrix(axis_angle):
+    return _np_quaternion_to_matrix(_np_axis_angle_to_quaternion(axis_angle))
+
+
+def _np_euler_angles_to_matrix(euler_angles, convention):
+    matrices = [_np_axis_angle_rotation(c, e) for c, e in zip(convention, np.moveaxis(euler_angles, -1, 0))]
+    return matrices[0] @ matrices[1] @ matrices[2]
+
+
+def _np_matrix_to_euler_angles(matrix, convention):
+    i0 = "XYZ".index(convention[0])
+    i2 = "XYZ".index(convention[2])
+    # Compose only accepts permutations of xyz: always Tait-Bryan angles
+    central_angle = np.arcsin(matrix[..., i0, i2] * (-1.0 if i0 - i2 in [-1, 2] else 1.0))
+    o = (
+        _np_angle_from_tan(convention[0], convention[1], matrix[..., i2], False, True),
+        central_angle,
+        _np_angle_from_tan(convention[2], convention[1], matrix[..., i0, :], True, True),
+    )
+    return np.stack(o, -1)
+
+
+def _np_matrix_to_rotation_6d(matrix):
+    batch_dim = matrix.shape[:-2]
+    return matrix[..., :2, :].reshape(batch_dim + (6,))
+
+
+def _np_rotation_6d_to_matrix(d6):
+    a1, a2 = d6[..., :3], d6[..., 3:]
+    b1 = _np_normalize(a1)
+    b2 = a2 - (b1 * a2).sum(-1, keepdims=True) * b1
+    b2 = _np_normalize(b2)
+    b3 = np.cross(b1, b2)
+    return np.stack((b1, b2, b3), axis=-2)
+
+
+# NumPy counterparts of the pytorch3d transforms, same math, used for np.ndarray inputs
+NP_TRANSFORMS = {
+    "axis_angle_to_matrix": _np_axis_angle_to_matrix,
+    "axis_angle_to_quaternion": _np_axis_angle_to_quaternion,
+    "euler_angles_to_matrix": _np_euler_angles_to_matrix,
+    "matrix_to_euler_angles": _np_matrix_to_euler_angles,
+    "matrix_to_quaternion": _np_matrix_to_quaternion,
+    "matrix_to_rotation_6d": _np_matrix_to_rotation_6d,
+    "quaternion_to_axis_angle": _np_quaternion_to_axis_angle,
+    "quaternion_to_matrix": _np_quaternion_to_matrix,
+    "rotation_6d_to_matrix": _np_rotation_6d_to_matrix,
+}
+
+
+def _torch_transform(name):
+    # pytorch3d (and torch) are only imported once a tensor is actually converted
+    from pytorch3d import transforms
+    return getattr(transforms, name)
+
+
+def _takes_convention(fn):
+    try:
+        return 'convention' in inspect.signature(fn).parameters
+    except (TypeError, ValueError):  # no introspectable signature, e.g. some builtins
+        return False
 
 
 class Compose:
@@ -22,32 +188,76 @@ class Compose:
         """Composes several transforms together. This transform does not
         support torchscript.
 
+        np.ndarray inputs go through the NumPy implementations in
+        ``NP_TRANSFORMS`` and keep their floating dtype; torch.Tensor inputs
+        go through pytorch3d, which is imported on first use. A callable
+        whose name is not in ``NP_TRANSFORMS`` is called as is, for both.
+
         Args:
-            transforms (list): (list of transform functions)
+            transforms (list): names of pytorch3d.transforms functions, or
+                callables
         """
-        self.transforms = transforms
+        self.entries = list(transforms)
+        self.names = [t if isinstance(t, str) else getattr(t, '__name__', None) for t in self.entries]
+        self.np_transforms = [
+            NP_TRANSFORMS[name] if name in NP_TRANSFORMS else t for t, name in zip(self.entries, self.names)
+        ]
+        self.np_takes_convention = [_takes_convention(t) for t in self.np_transforms]
+        self._transforms = None
+        self._takes_convention = None
+
+    @property
+    def transforms(self):
+        # resolved on the first tensor input, then reused
+        if self._transforms is None:
+            self._transforms = [_torch_transform(t) if isinstance(t, str) else t for t in self.entries]
+            self._takes_convention = [_takes_convention(t) for t in self._transforms]
+        return self._transforms
 
     def __call__(self, rotation: Union[torch.Tensor, np.ndarray], convention: str = 'xyz', **kwargs):
         convention = convention.lower()
         if not (set(convention) == set('xyz') and len(convention) == 3):
             raise ValueError(f'Invalid convention {convention}.')
         if isinstance(rotation, np.ndarray):
-            data_type = 'np'
-            rotation = torch.FloatTensor(rotation)
-        elif isinstance(rotation, torch.Tensor):
-            data_type = 'tensor'
+            transforms, takes_convention = self.np_transforms, self.np_takes_convention
+            if not np.issubdtype(rotation.dtype, np.floating):
+                rotation = rotation.astype(np.float32)
         else:
-            raise TypeError('Type of rotation should be torch.Tensor or np.ndarray')
-        for t in self.transforms:
-            if 'convention' in t.__code__.co_varnames:
+            import torch
+            if not isinstance(rotation, torch.Tensor):
+                raise TypeError('Type of rotation should be torch.Tensor or np.ndarray')
+            transforms, takes_convention = self.transforms, self._takes_convention
+        for t, with_convention in zip(transforms, takes_convention):
+            if with_convention:
                 rotation = t(rotation, convention.upper(), **kwargs)
             else:
                 rotation = t(rotation, **kwargs)
-        if data_type == 'np':
-            rotation = rotation.detach().cpu().numpy()
         return rotation
 
 
+# built once, the conversions below only call them
+_AA_TO_ROTMAT = Compose(['axis_angle_to_matrix'])
+_AA_TO_QUAT = Compose(['axis_angle_to_quaternion'])
+_EE_TO_ROTMAT = Compose(['euler_angles_to_matrix'])
+_ROTMAT_TO_EE = Compose(['matrix_to_euler_angles'])
+_ROTMAT_TO_QUAT = Compose(['matrix_to_quaternion'])
+_ROTMAT_TO_ROT6D = Compose(['matrix_to_rotation_6d'])
+_QUAT_TO_AA = Compose(['quaternion_to_axis_angle'])
+_QUAT_TO_ROTMAT = Compose(['quaternion_to_matrix'])
+_ROT6D_TO_ROTMAT = Compose(['rotation_6d_to_matrix'])
+_AA_TO_EE = Compose(['axis_angle_to_matrix', 'matrix_to_euler_angles'])
+_AA_TO_ROT6D = Compose(['axis_angle_to_matrix', 'matrix_to_rotation_6d'])
+_EE_TO_AA = Compose(['euler_angles_to_matrix', 'matrix_to_quaternion', 'quaternion_to_axis_angle'])
+_EE_TO_QUAT = Compose(['euler_angles_to_matrix', 'matrix_to_quaternion'])
+_EE_TO_ROT6D = Compose(['euler_angles_to_matrix', 'matrix_to_rotation_6d'])
+_ROTMAT_TO_AA = Compose(['matrix_to_quaternion', 'quaternion_to_axis_angle'])
+_QUAT_TO_EE = Compose(['quaternion_to_matrix', 'matrix_to_euler_angles'])
+_QUAT_TO_ROT6D = Compose(['quaternion_to_matrix', 'matrix_to_rotation_6d'])
+_ROT6D_TO_AA = Compose(['rotation_6d_to_matrix', 'matrix_to_quaternion', 'quaternion_to_axis_angle'])
+_ROT6D_TO_EE = Compose(['rotation_6d_to_matrix', 'matrix_to_euler_angles'])
+_ROT6D_TO_QUAT = Compose(['rotation_6d_to_matrix', 'matrix_to_quaternion'])
+
+
 def aa_to_rotmat(axis_angle: Union[torch.Tensor, np.ndarray]) -> Union[torch.Tensor, np.ndarray]:
     """
     Convert axis_angle to rotation matrixs.
@@ -60,8 +270,7 @@ def aa_to_rotmat(axis_angle: Union[torch.Tensor, np.ndarray]) -> Union[torch.Ten
     """
     if axis_angle.shape[-1] != 3:
         raise ValueError(f'Invalid input axis angles shape f{axis_angle.shape}.')
-    t = Compose([axis_angle_to_matrix])
-    return t(axis_angle)
+    return _AA_TO_ROTMAT(axis_angle)
 
 
 def aa_to_quat(axis_angle: Union[torch.Tensor, np.ndarray]) -> Union[torch.Tensor, np.ndarray]:
@@ -76,8 +285,7 @@ def aa_to_quat(axis_angle: Union[torch.Tensor, np.ndarray]) -> Union[torch.Tenso
     """
     if axis_angle.shape[-1] != 3:
         raise ValueError(f'Invalid input axis angles f{axis_angle.shape}.')
-    t = Compose([axis_angle_to_quaternion])
-    return t(axis_angle)
+    return _AA_TO_QUAT(axis_angle)
 
 
 def ee_to_rotmat(euler_angle: Union[torch.Tensor, np.ndarray], convention='xyz') -> Union[torch.Tensor, np.ndarray]:
@@ -93,8 +301,7 @@ def ee_to_rotmat(euler_angle: Union[torch.Tensor, np.ndarray], convention='xyz')
     """
     if euler_angle.shape[-1] != 3:
         raise ValueError(f'Invalid input euler angles shape f{euler_angle.shape}.')
-    t = Compose([euler_angles_to_matrix])
-    return t(euler_angle, convention.upper())
+    return _EE_TO_ROTMAT(euler_angle, convention.upper())
 
 
 def rotmat_to_ee(matrix: Union[torch.Tensor, np.ndarray], convention: str = 'xyz') -> Union[torch.Tensor, np.ndarray]:
@@ -110,8 +317,7 @@ def rotmat_to_ee(matrix: Union[torch.Tensor, np.ndarray], convention: str = 'xyz
     """
     if matrix.shape[-1] != 3 or matrix.shape[-2] != 3:
         raise ValueError(f'Invalid rotation matrix shape f{matrix.shape}.')
-    t = Compose([matrix_to_euler_angles])
-    return t(matrix, convention.upper())
+    return _ROTMAT_TO_EE(matrix, convention.upper())
 
 
 def rotmat_to_quat(matrix: Union[torch.Tensor, np.ndarray]) -> Union[torch.Tensor, np.ndarray]:
@@ -125,8 +331,7 @@ def rotmat_to_quat(matrix: Union[torch.Tensor, np.ndarray]) -> Union[torch.Tenso
     """
     if matrix.shape[-1] != 3 or matrix.shape[-2] != 3:
         raise ValueError(f'Invalid rotation matrix  shape f{matrix.shape}.')
-    t = Compose([matrix_to_quaternion])
-    return t(matrix)
+    return _ROTMAT_TO_QUAT(matrix)
 
 
 def rotmat_to_rot6d(matrix: Union[torch.Tensor, np.ndarray]) -> Union[torch.Tensor, np.ndarray]:
@@ -145,8 +350,7 @@ def rotmat_to_rot6d(matrix: Union[torch.Tensor, np.ndarray]) -> Union[torch.Tens
     """
     if matrix.shape[-1] != 3 or matrix.shape[-2] != 3:
         raise ValueError(f'Invalid rotation matrix  shape f{matrix.shape}.')
-    t = Compose([matrix_to_rotation_6d])
-    return t(matrix)
+    return _ROTMAT_TO_ROT6D(matrix)
 
 
 def quat_to_aa(quaternions: Union[torch.Tensor, np.ndarray]) -> Union[torch.Tensor, np.ndarray]:
@@ -160,8 +364,7 @@ def quat_to_aa(quaternions: Union[torch.Tensor, np.ndarray]) -> Union[torch.Tens
     """
     if quaternions.shape[-1] != 4:
         raise ValueError(f'Invalid input quaternions f{quaternions.shape}.')
-    t = Compose([quaternion_to_axis_angle])
-    return t(quaternions)
+    return _QUAT_TO_AA(quaternions)
 
 
 def quat_to_rotmat(quaternions: Union[torch.Tensor, np.ndarray]) -> Union[torch.Tensor, np.ndarray]:
@@ -175,8 +378,7 @@ def quat_to_rotmat(quaternions: Union[torch.Tensor, np.ndarray]) -> Union[torch.
     """
     if quaternions.shape[-1] != 4:
         raise ValueError(f'Invalid input quaternions shape f{quaternions.shape}.')
-    t = Compose([quaternion_to_matrix])
-    return t(quaternions)
+    return _QUAT_TO_ROTMAT(quaternions)
 
 
 def rot6d_to_rotmat(rotation_6d: Union[torch.Tensor, np.ndarray]) -> Union[torch.Tensor, np.ndarray]:
@@ -195,8 +397,7 @@ def rot6d_to_rotmat(rotation_6d: Union[torch.Tensor, np.ndarray]) -> Union[torch
     """
     if rotation_6d.shape[-1] != 6:
         raise ValueError(f'Invalid input rotation_6d f{rotation_6d.shape}.')
-    t = Compose([rotation_6d_to_matrix])
-    return t(rotation_6d)
+    return _ROT6D_TO_ROTMAT(rotation_6d)
 
 
 def aa_to_ee(axis_angle: Union[torch.Tensor, np.ndarray], convention: str = 'xyz') -> Union[torch.Tensor, np.ndarray]:
@@ -213,8 +414,7 @@ def aa_to_ee(axis_angle: Union[torch.Tensor, np.ndarray], convention: str = 'xyz
     """
     if axis_angle.shape[-1] != 3:
         raise ValueError(f'Invalid input axis_angle shape f{axis_angle.shape}.')
-    t = Compose([axis_angle_to_matrix, matrix_to_euler_angles])
-    return t(axis_angle, convention)
+    return _AA_TO_EE(axis_angle, convention)
 
 
 def aa_to_rot6d(axis_angle: Union[torch.Tensor, np.ndarray]) -> Union[torch.Tensor, np.ndarray]:
@@ -234,8 +434,7 @@ def aa_to_rot6d(axis_angle: Union[torch.Tensor, np.ndarray]) -> Union[torch.Tens
     """
     if axis_angle.shape[-1] != 3:
         raise ValueError(f'Invalid input axis_angle f{axis_angle.shape}.')
-    t = Compose([axis_angle_to_matrix, matrix_to_rotation_6d])
-    return t(axis_angle)
+    return _AA_TO_ROT6D(axis_angle)
 
 
 def ee_to_aa(euler_angle: Union[torch.Tensor, np.ndarray], convention: str = 'xyz') -> Union[torch.Tensor, np.ndarray]:
@@ -252,8 +451,7 @@ def ee_to_aa(euler_angle: Union[torch.Tensor, np.ndarray], convention: str = 'xy
     """
     if euler_angle.shape[-1] != 3:
         raise ValueError(f'Invalid input euler_angle f{euler_angle.shape}.')
-    t = Compose([euler_angles_to_matrix, matrix_to_quaternion, quaternion_to_axis_angle])
-    return t(euler_angle, convention)
+    return _EE_TO_AA(euler_angle, convention)
 
 
 def ee_to_quat(euler_angle: Union[torch.Tensor, np.ndarray], convention='xyz') -> Union[torch.Tensor, np.ndarray]:
@@ -270,8 +468,7 @@ def ee_to_quat(euler_angle: Union[torch.Tensor, np.ndarray], convention='xyz') -
     """
     if euler_angle.shape[-1] != 3:
         raise ValueError(f'Invalid input euler_angle f{euler_angle.shape}.')
-    t = Compose([euler_angles_to_matrix, matrix_to_quaternion])
-    return t(euler_angle, convention)
+    return _EE_TO_QUAT(euler_angle, convention)
 
 
 def ee_to_rot6d(euler_angle: Union[torch.Tensor, np.ndarray], convention='xyz') -> Union[torch.Tensor, np.ndarray]:
@@ -293,8 +490,7 @@ def ee_to_rot6d(euler_angle: Union[torch.Tensor, np.ndarray], convention='xyz')
     """
     if euler_angle.shape[-1] != 3:
         raise ValueError(f'Invalid input euler_angle f{euler_angle.shape}.')
-    t = Compose([euler_angles_to_matrix, matrix_to_rotation_6d])
-    return t(euler_angle, convention)
+    return _EE_TO_ROT6D(euler_angle, convention)
 
 
 def rotmat_to_aa(matrix: Union[torch.Tensor, np.ndarray]) -> Union[torch.Tensor, np.ndarray]:
@@ -311,8 +507,7 @@ def rotmat_to_aa(matrix: Union[torch.Tensor, np.ndarray]) -> Union[torch.Tensor,
     """
     if matrix.shape[-1] != 3 or matrix.shape[-2] != 3:
         raise ValueError(f'Invalid rotation matrix  shape f{matrix.shape}.')
-    t = Compose([matrix_to_quaternion, quaternion_to_axis_angle])
-    return t(matrix)
+    return _ROTMAT_TO_AA(matrix)
 
 
 def quat_to_ee(quaternions: Union[torch.Tensor, np.ndarray],
@@ -330,8 +525,7 @@ def quat_to_ee(quaternions: Union[torch.Tensor, np.ndarray],
     """
     if quaternions.shape[-1] != 4:
         raise ValueError(f'Invalid input quaternions f{quaternions.shape}.')
-    t = Compose([quaternion_to_matrix, matrix_to_euler_angles])
-    return t(quaternions, convention)
+    return _QUAT_TO_EE(quaternions, convention)
 
 
 def quat_to_rot6d(quaternions: Union[torch.Tensor, np.ndarray]) -> Union[torch.Tensor, np.ndarray]:
@@ -351,8 +545,7 @@ def quat_to_rot6d(quaternions: Union[torch.Tensor, np.ndarray]) -> Union[torch.T
     """
     if quaternions.shape[-1] != 4:
         raise ValueError(f'Invalid input quaternions f{quaternions.shape}.')
-    t = Compose([quaternion_to_matrix, matrix_to_rotation_6d])
-    return t(quaternions)
+    return _QUAT_TO_ROT6D(quaternions)
 
 
 def rot6d_to_aa(rotation_6d: Union[torch.Tensor, np.ndarray]) -> Union[torch.Tensor, np.ndarray]:
@@ -372,8 +565,7 @@ def rot6d_to_aa(rotation_6d: Union[torch.Tensor, np.ndarray]) -> Union[torch.Ten
     """
     if rotation_6d.shape[-1] != 6:
         raise ValueError(f'Invalid input rotation_6d f{rotation_6d.shape}.')
-    t = Compose([rotation_6d_to_matrix, matrix_to_quaternion, quaternion_to_axis_angle])
-    return t(rotation_6d)
+    return _ROT6D_TO_AA(rotation_6d)
 
 
 def rot6d_to_ee(rotation_6d: Union[torch.Tensor, np.ndarray],
@@ -394,8 +586,7 @@ def rot6d_to_ee(rotation_6d: Union[torch.Tensor, np.ndarray],
     """
     if rotation_6d.shape[-1] != 6:
         raise ValueError(f'Invalid input rotation_6d f{rotation_6d.shape}.')
-    t = Compose([rotation_6d_to_matrix, matrix_to_euler_angles])
-    return t(rotation_6d, convention)
+    return _ROT6D_TO_EE(rotation_6d, convention)
 
 
 def rot6d_to_quat(rotation_6d: Union[torch.Tensor, np.ndarray]) -> Union[torch.Tensor, np.ndarray]:
@@ -415,10 +606,39 @@ def rot6d_to_quat(rotation_6d: Union[torch.Tensor, np.ndarray]) -> Union[torch.T
     """
     if rotation_6d.shape[-1] != 6:
         raise ValueError(f'Invalid input rotation_6d shape f{rotation_6d.shape}.')
-    t = Compose([rotation_6d_to_matrix, matrix_to_quaternion])
-    return t(rotation_6d)
+    return _ROT6D_TO_QUAT(rotation_6d)
 
 
 def suppress_trimesh_logging():
     logger = logging.getLogger("trimesh")
     logger.setLevel(logging.ERROR)
+
+
+def get_cache_dir(name):
+    return os.path.join(os.path.expanduser("~"), ".cache", name, oikit_version)
+
+
+def file_fingerprint(path):
+    stat = os.stat(path)
+    return np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+
+def save_array_dir(cache_dir, **arrays):
+    """Write one ``<name>.npy`` per array into ``cache_dir``, atomically: the directory appears complete or not at
+    all, and a concurrent writer that loses the race discards its copy."""
+    tmp_dir = f"{cache_dir}.{os.getpid()}.tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+    for name, arr in arrays.items():
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), arr)
+    try:
+        os.rename(tmp_dir, cache_dir)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def load_array_dir(cache_dir):
+    return {
+        os.path.splitext(fn)[0]: np.load(os.path.join(cache_dir, fn), mmap_mode="r")
+        for fn in os.listdir(cache_dir)
+        if fn.endswith(".npy")
+    }
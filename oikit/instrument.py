@@ -0,0 +1,228 @@
+"""Opt-in timing and I/O instrumentation of the oikit datasets.
+
+Enable it with ``OIKIT_INSTRUMENT=1`` in the environment, or call ``enable()`` before the DataLoader workers are
+started. Every method of an ``@instrumented`` class (``__init__``, ``__getitem__``, ``get_*`` and the file readers)
+then records its call count, inclusive wall time, and the bytes read and files opened beneath it. At exit every
+process writes its records to ``OIKIT_INSTRUMENT_DIR``; the main process merges them, prints a summary table to
+stderr, and writes ``OIKIT_INSTRUMENT_JSON`` if set. A run directory created by oikit (i.e. when
+``OIKIT_INSTRUMENT_DIR`` is not set) is removed afterwards.
+
+When disabled, classes are left untouched and ``record_file`` returns immediately.
+"""
+import atexit
+import contextlib
+import functools
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import types
+
+INSTRUMENTED_METHODS = ("__init__", "__getitem__", "_load_pkl", "_read_image", "_prepare_data")
+
+_enabled = False
+_own_run_dir = None  # run directory created by this process, removed once reported
+_classes = []
+_stats = {}  # name -> [calls, seconds, bytes, files]
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def is_enabled():
+    return _enabled
+
+
+def _add(name, seconds, nbytes=0, n_files=0, calls=1):
+    with _lock:
+        rec = _stats.get(name)
+        if rec is None:
+            rec = _stats[name] = [0, 0.0, 0, 0]
+        rec[0] += calls
+        rec[1] += seconds
+        rec[2] += nbytes
+        rec[3] += n_files
+
+
+def _wrap(name, fn):
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        frame = [0, 0]  # bytes, files read beneath this call
+        stack.append(frame)
+        tic = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - tic
+            stack.pop()
+            _add(name, elapsed, frame[0], frame[1])
+
+    wrapper._oikit_instrumented = True
+    return wrapper
+
+
+def _wrap_class(cls):
+    for attr, fn in list(vars(cls).items()):
+        if not isinstance(fn, types.FunctionType) or getattr(fn, "_oikit_instrumented", False):
+            continue
+        if attr.startswith("get_") or attr in INSTRUMENTED_METHODS:
+            setattr(cls, attr, _wrap(f"{cls.__name__}.{attr}", fn))
+
+
+def instrumented(cls):
+    """Class decorator: register ``cls``, its methods are wrapped once instrumentation is enabled."""
+    _classes.append(cls)
+    if _enabled:
+        _wrap_class(cls)
+    return cls
+
+
+def record_file(path):
+    """Count one file opened and its size as read, for every instrumented call in progress."""
+    if not _enabled:
+        return
+    try:
+        nbytes = os.path.getsize(path)
+    except OSError:
+        nbytes = 0
+    stack = getattr(_local, "stack", None)
+    if not stack:
+        _add("<untracked>", 0.0, nbytes, 1, calls=0)
+        return
+    for frame in stack:
+        frame[0] += nbytes
+        frame[1] += 1
+
+
+@contextlib.contextmanager
+def timed(name):
+    """Record a block that is not a method call, e.g. one category of a directory scan, like a wrapped method."""
+    if not _enabled:
+        yield
+        return
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    frame = [0, 0]
+    stack.append(frame)
+    tic = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - tic
+        stack.pop()
+        _add(name, elapsed, frame[0], frame[1])
+
+
+def _reset_after_fork():
+    global _local
+    with _lock:
+        _stats.clear()  # the parent's records are reported by the parent
+    _local = threading.local()
+
+
+def _dump_process():
+    # one file per process, rewritten on every call
+    run_dir = os.environ["OIKIT_INSTRUMENT_DIR"]
+    with _lock:
+        records = {name: list(rec) for name, rec in _stats.items()}
+    tmp_path = os.path.join(run_dir, f"{os.getpid()}.json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(records, f)
+    os.replace(tmp_path, os.path.join(run_dir, f"{os.getpid()}.json"))
+
+
+def summary():
+    """Records of this process and of every worker that has exited, merged by name.
+
+    Returns:
+        dict: name -> {"calls", "seconds", "bytes", "files"}.
+    """
+    merged = {}
+    _dump_process()
+    run_dir = os.environ["OIKIT_INSTRUMENT_DIR"]
+    for fn in os.listdir(run_dir):
+        if not fn.endswith(".json"):
+            continue
+        with open(os.path.join(run_dir, fn), "r") as f:
+            records = json.load(f)
+        for name, rec in records.items():
+            acc = merged.setdefault(name, [0, 0.0, 0, 0])
+            for i, value in enumerate(rec):
+                acc[i] += value
+    return {
+        name: dict(zip(("calls", "seconds", "bytes", "files"), rec))
+        for name, rec in sorted(merged.items(), key=lambda x: -x[1][1])
+    }
+
+
+def format_table(records):
+    lines = [f"{'name':<40}{'calls':>10}{'total (s)':>12}{'mean (ms)':>12}{'read (MB)':>12}{'files':>10}"]
+    for name, rec in records.items():
+        mean_ms = rec["seconds"] / rec["calls"] * 1e3 if rec["calls"] else 0.0
+        lines.append(f"{name:<40}{rec['calls']:>10}{rec['seconds']:>12.3f}{mean_ms:>12.3f}"
+                     f"{rec['bytes'] / 2**20:>12.1f}{rec['files']:>10}")
+    return "\n".join(lines)
+
+
+def report(file=sys.stderr, json_path=None):
+    records = summary()
+    print("oikit instrumentation, all processes:", file=file)
+    print(format_table(records), file=file)
+    if json_path is not None:
+        with open(json_path, "w") as f:
+            json.dump(records, f, indent=2)
+
+
+def _at_exit():
+    if str(os.getpid()) == os.environ.get("OIKIT_INSTRUMENT_ROOT_PID"):
+        report(json_path=os.environ.get("OIKIT_INSTRUMENT_JSON"))
+        if _own_run_dir is not None:
+            shutil.rmtree(_own_run_dir, ignore_errors=True)
+    else:
+        _dump_process()
+
+
+def enable():
+    """Turn instrumentation on for this process and for the worker processes it starts from now on."""
+    global _enabled, _own_run_dir
+    if _enabled:
+        return
+    _enabled = True
+    # inherited by spawned workers; forked workers share the module state and reset their records
+    os.environ["OIKIT_INSTRUMENT"] = "1"
+    if "OIKIT_INSTRUMENT_DIR" not in os.environ:
+        _own_run_dir = tempfile.mkdtemp(prefix="oikit_instrument_")
+        os.environ["OIKIT_INSTRUMENT_DIR"] = _own_run_dir
+    if "OIKIT_INSTRUMENT_ROOT_PID" not in os.environ:
+        os.environ["OIKIT_INSTRUMENT_ROOT_PID"] = str(os.getpid())
+    for cls in _classes:
+        _wrap_class(cls)
+    os.register_at_fork(after_in_child=_reset_after_fork)
+    atexit.register(_at_exit)
+    # multiprocessing workers leave through os._exit, skipping atexit, but run the finalizers registered after
+    # their start (the registry is cleared when a worker starts, after os.register_at_fork hooks have run)
+    from multiprocessing import util as mp_util
+    mp_util.register_after_fork(_after_fork_sentinel, _register_worker_exit)
+
+
+class _Sentinel:
+    pass
+
+
+_after_fork_sentinel = _Sentinel()  # multiprocessing keeps after-fork hooks in a weak registry
+
+
+def _register_worker_exit(_):
+    from multiprocessing.util import Finalize
+    Finalize(None, _at_exit, exitpriority=0)
+
+
+if os.environ.get("OIKIT_INSTRUMENT") == "1":
+    enable()
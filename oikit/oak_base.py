@@ -1,6 +1,8 @@
 import os
 import json
 
+from oikit.instrument import instrumented, record_file
+
 CATEGORIES = [
     'pincer',
     'hammer',
@@ -67,6 +69,7 @@ ATTRIBUTE_PHRASES = [
 ]
 
 
+@instrumented
 class ObjectAffordanceKnowledge:
 
     def __init__(self, category, obj_id, n_parts, obj_dir, part_files):
@@ -84,6 +87,7 @@ class ObjectAffordanceKnowledge:
             assert pf.endswith(".ply") and pf.startswith("part_"), f"part file {pf} is not valid"
             pif = os.path.join(obj_dir, pf[:-4] + ".json")
             assert os.path.exists(pif), f"part info file {pif} does not exist"
+            record_file(pif)
             with open(pif, "r") as f:
                 part_info = json.load(f)
             part_name = part_info["name"]  # str
@@ -120,6 +124,7 @@ class ObjectAffordanceKnowledge:
         return f"cate:{self.category}--id:{self.obj_id}"
 
 
+@instrumented
 class OakBase:
 
     def __init__(self):
@@ -1,3 +1,3 @@
-from .oi_image import OakInkImage, OakInkImageSequence
+from .oi_image import ClipSampler, OakInkImage, OakInkImageSequence
 
-__all__ = ["OakInkImage", "OakInkImageSequence"]
\ No newline at end of file
+__all__ = ["OakInkImage", "OakInkImageSequence", "ClipSampler"]
\ No newline at end of file
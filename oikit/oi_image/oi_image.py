@@ -1,14 +1,18 @@
+import hashlib
 import json
 import os
 import pickle
+import warnings
 
-import imageio
 import numpy as np
-import trimesh
-from oikit.common import quat_to_aa, quat_to_rotmat, rotmat_to_aa
-from oikit.common import suppress_trimesh_logging
+from oikit.common import file_fingerprint, get_cache_dir, load_array_dir, save_array_dir, suppress_trimesh_logging
+from oikit.instrument import instrumented, record_file
 
-from .utils import load_object, load_object_by_id, persp_project
+from .prefetch import ImagePrefetcher
+from .utils import (IMAGE_SIZE, AnnoStore, InfoIndex, InfoStrView, ObjectMeshMapping, ObjectRegistry, SeqViewIndex,
+                    handover_info_map, handover_partner_index, info_positions, load_cached_arrays,
+                    mano_pose_from_general_info, mano_shape_from_general_info, persp_project, read_image,
+                    resolve_batch_fields, resolve_sample_fields, save_cached_arrays, square_box, transf_points)
 
 ALL_INTENT = {
     "use": "0001",
@@ -18,6 +22,16 @@ ALL_INTENT = {
 }
 ALL_INTENT_REV = {_v: _k for _k, _v in ALL_INTENT.items()}
 
+MODE_SPLIT_KEY = {
+    "default": "split0",
+    "subject": "split1",
+    "object": "split2",
+    "handobject": "split0_ho",
+}
+
+INDEX_CACHE_FORMAT = 1  # bump when the layout of the binary index cache changes
+HANDOVER_CACHE_FORMAT = 1  # bump when the handover pairing rule changes
+
 
 def decode_seq_cat(seq_cat):
     field_list = seq_cat.split("_")
@@ -30,21 +44,23 @@ def decode_seq_cat(seq_cat):
     return obj_id, action_id, subject_id
 
 
+@instrumented
 class OakInkImage:
 
     @staticmethod
     def _get_info_list(data_dir, split_key, data_split):
+        return json.load(open(OakInkImage._get_info_list_path(data_dir, split_key, data_split)))
+
+    @staticmethod
+    def _get_info_list_path(data_dir, split_key, data_split):
         if data_split == "train+val":
-            info_list = json.load(open(os.path.join(data_dir, "image", "anno", "split", split_key, "seq_train.json")))
+            return os.path.join(data_dir, "image", "anno", "split", split_key, "seq_train.json")
         elif data_split == "train":
-            info_list = json.load(
-                open(os.path.join(data_dir, "image", "anno", "split_train_val", split_key, "example_split_train.json")))
+            return os.path.join(data_dir, "image", "anno", "split_train_val", split_key, "example_split_train.json")
         elif data_split == "val":
-            info_list = json.load(
-                open(os.path.join(data_dir, "image", "anno", "split_train_val", split_key, "example_split_val.json")))
+            return os.path.join(data_dir, "image", "anno", "split_train_val", split_key, "example_split_val.json")
         else:  # data_split == "test":
-            info_list = json.load(open(os.path.join(data_dir, "image", "anno", "split", split_key, "seq_test.json")))
-        return info_list
+            return os.path.join(data_dir, "image", "anno", "split", split_key, "seq_test.json")
 
     @staticmethod
     def _get_info_str(info_item):
@@ -53,27 +69,102 @@ class OakInkImage:
         return info_str
 
     @staticmethod
-    def _get_handover_info(info_list):
-        hand_over_map = {}
-        hand_over_index_list = []
-        for idx, info_item in enumerate(info_list):
-            info = info_item[0]
-            seq_cat, _ = info.split("/")
-            _, action_id, _ = decode_seq_cat(seq_cat)
-            if action_id != "0004":
-                continue
-            sub_id = info_item[1]
-            alt_sub_id = 1 if sub_id == 0 else 0  # flip sub_id to get alt_sub_id
-            alt_info_item = (info_item[0], alt_sub_id, info_item[2], info_item[3])
-            hand_over_map[tuple(info_item)] = alt_info_item
-            hand_over_index_list.append(idx)
-        # sanity check: all alt_info_item should be in hand_over_map
-        for alt_info_item in hand_over_map.values():
-            assert alt_info_item in hand_over_map, str(alt_info_item)
+    def _get_handover_partner(info_list):
         # TODO: extra filter, like to limit for subject_id 0/1
-        return hand_over_map, hand_over_index_list
-
-    def __init__(self, data_split="all", mode_split="default", enable_handover=False) -> None:
+        return handover_partner_index(info_list)
+
+    def _load_handover_partner(self):
+        # seq_all.json only: handover needs to be enabled in all split
+        # cached under ~/.cache/OakInkImage/<version>/handover/<md5 of its path>, keyed on format, size and mtime
+        seq_all_path = os.path.join(self._data_dir, "image", "anno", "seq_all.json")
+        fingerprint = np.concatenate([[HANDOVER_CACHE_FORMAT], file_fingerprint(seq_all_path)])
+        root_hash = hashlib.md5(os.path.realpath(seq_all_path).encode("utf-8")).hexdigest()
+        cache_paths = [os.path.join(get_cache_dir(self._name), "handover", root_hash, "handover_partner.npz")]
+        cached = load_cached_arrays(cache_paths, fingerprint)
+        if cached is not None:
+            return cached["partner_idx"]
+        partner_idx = self._get_handover_partner(self.info_list)
+        save_cached_arrays(cache_paths, fingerprint, partner_idx=partner_idx)
+        return partner_idx
+
+    def _load_index(self, use_cache, with_pos):
+        """Parse the split's sample index, the seq status table, and each sample's row in seq_all.json.
+
+        The rows are only looked up with ``with_pos`` (i.e. when a columnar store will be read), otherwise a split
+        other than "all" gets None instead, see ``_get_anno_pos``. With ``use_cache``, the parsed result is kept as
+        a versioned binary cache (one memory-mapped ``.npy`` per array) keyed on data split, mode split, ``with_pos``
+        and the size + mtime of every source JSON. The cache is skipped with a warning if it cannot be written.
+        """
+        anno_dir = os.path.join(self._data_dir, "image", "anno")
+        seq_all_path = os.path.join(anno_dir, "seq_all.json")
+        status_path = os.path.join(anno_dir, "seq_status.json")
+        if self._data_split == "all":
+            info_path = seq_all_path
+        else:
+            split_key = MODE_SPLIT_KEY.get(self._mode_split, "split0_ho")
+            info_path = self._get_info_list_path(self._data_dir, split_key, self._data_split)
+
+        cache_dir = None
+        if use_cache:
+            cache_identifier_dict = {
+                "format": INDEX_CACHE_FORMAT,
+                "data_split": self._data_split,
+                "mode_split": self._mode_split,
+                "with_pos": with_pos,
+                "sources": [[p, *file_fingerprint(p).tolist()] for p in sorted({seq_all_path, info_path, status_path})],
+            }
+            cache_identifier_raw = json.dumps(cache_identifier_dict, sort_keys=True)
+            cache_identifier = hashlib.md5(cache_identifier_raw.encode("utf-8")).hexdigest()
+            cache_dir = os.path.join(get_cache_dir(self._name), "index", cache_identifier)
+            if os.path.isdir(cache_dir):
+                cache = load_array_dir(cache_dir)
+                seq_status = {
+                    k: json.loads(v) for k, v in zip(cache["status_keys"].tolist(), cache["status_values"].tolist())
+                }
+                info_index = InfoIndex(cache["seq_names"], cache["seq_codes"], cache["sub_ids"], cache["frame_ids"],
+                                       cache["view_ids"])
+                return info_index, seq_status, cache.get("anno_pos")
+
+        info_index = InfoIndex.from_info_list(json.load(open(info_path)))
+        with open(status_path, "r") as f:
+            seq_status = json.load(f)
+        if self._data_split == "all":
+            anno_pos = np.arange(len(info_index), dtype=np.int64)
+        elif with_pos:
+            anno_pos = info_positions(info_index, InfoIndex.from_info_list(json.load(open(seq_all_path))))
+        else:
+            anno_pos = None
+
+        if cache_dir is not None:
+            arrays = dict(seq_names=info_index.seq_names,
+                          seq_codes=info_index.seq_codes,
+                          sub_ids=info_index.sub_ids,
+                          frame_ids=info_index.frame_ids,
+                          view_ids=info_index.view_ids,
+                          status_keys=np.array(list(seq_status.keys()), dtype=str),
+                          status_values=np.array([json.dumps(v) for v in seq_status.values()], dtype=str))
+            if anno_pos is not None:
+                arrays["anno_pos"] = anno_pos
+            try:
+                os.makedirs(os.path.dirname(cache_dir), exist_ok=True)
+                save_array_dir(cache_dir, **arrays)
+            except OSError as e:
+                warnings.warn(f"{self._name} index cache not saved to {cache_dir}: {e}")
+        return info_index, seq_status, anno_pos
+
+    def _get_anno_pos(self):
+        # row of each sample in seq_all.json, looked up on first use when no columnar store asked for it
+        if self._anno_pos is None:
+            seq_all_path = os.path.join(self._data_dir, "image", "anno", "seq_all.json")
+            self._anno_pos = info_positions(self.info_list, InfoIndex.from_info_list(json.load(open(seq_all_path))))
+        return self._anno_pos
+
+    def __init__(self,
+                 data_split="all",
+                 mode_split="default",
+                 enable_handover=False,
+                 obj_cache_size=None,
+                 use_cache=True) -> None:
         self._name = "OakInkImage"
         self._data_split = data_split
         self._mode_split = mode_split
@@ -83,33 +174,18 @@ class OakInkImage:
             assert self._data_split == "all", "handover need to be enabled in all split"
 
         self._data_dir = os.environ["OAKINK_DIR"]
-        if self._data_split == "all":
-            self.info_list = json.load(open(os.path.join(self._data_dir, "image", "anno", "seq_all.json")))
-        elif self._mode_split == "default":
-            self.info_list = self._get_info_list(self._data_dir, "split0", self._data_split)
-        elif self._mode_split == "subject":
-            self.info_list = self._get_info_list(self._data_dir, "split1", self._data_split)
-        elif self._mode_split == "object":
-            self.info_list = self._get_info_list(self._data_dir, "split2", self._data_split)
-        else:  # self._mode_split == "handobject":
-            self.info_list = self._get_info_list(self._data_dir, "split0_ho", self._data_split)
-
-        self.info_str_list = []
-        for info in self.info_list:
-            info_str = "__".join([str(x) for x in info])
-            info_str = info_str.replace("/", "__")
-            self.info_str_list.append(info_str)
-
-        # load obj
-        suppress_trimesh_logging()
+        # columnar annotation store, if packed
+        self.n_file_open = 0
+        self._prefetcher = None
+        self._anno_store = AnnoStore.open(self._data_dir)
+
+        # array-backed, info_list[idx] and info_str_list[idx] are derived on access
+        self.info_list, self.seq_status, self._anno_pos = self._load_index(use_cache, self._anno_store is not None)
+        self.info_str_list = InfoStrView(self.info_list)
 
-        self.obj_mapping = {}
-        obj_root = os.path.join(self._data_dir, "image", "obj")
-        all_obj_fn = sorted(os.listdir(obj_root))
-        for obj_fn in all_obj_fn:
-            obj_id = os.path.splitext(obj_fn)[0]
-            obj_model = load_object(obj_root, obj_fn)
-            self.obj_mapping[obj_id] = obj_model
+        # obj meshes are loaded on first access
+        suppress_trimesh_logging()
+        self.obj_registry = ObjectRegistry.from_data_dir(self._data_dir, max_size=obj_cache_size, use_cache=use_cache)
 
         self.framedata_color_name = [
             "north_east_color",
@@ -118,24 +194,145 @@ class OakInkImage:
             "south_west_color",
         ]
 
-        self._image_size = (848, 480)  # (W, H)
+        self._image_size = IMAGE_SIZE  # (W, H)
         self._hand_side = "right"
 
-        # seq status
-        with open(os.path.join(self._data_dir, "image", "anno", "seq_status.json"), "r") as f:
-            self.seq_status = json.load(f)
+        self._clip_index = None  # built by the first clip query
 
         # handover
         if self._enable_handover:
-            self.handover_info, self.handover_sample_index_list = self._get_handover_info(self.info_list)
-            self.handover_info_list = list(self.handover_info.keys())
+            self.handover_partner_idx = self._load_handover_partner()
+            self.handover_sample_index_list = np.flatnonzero(self.handover_partner_idx >= 0).tolist()
         else:
-            self.handover_info, self.handover_sample_index_list = None, None
-            self.handover_info_list = None
+            self.handover_partner_idx, self.handover_sample_index_list = None, None
 
     def __len__(self):
         return len(self.info_list)
 
+    # region ===== deprecated attributes >>>>>
+    def _compat_obj_ids(self):
+        return None  # every mesh under image/obj
+
+    @property
+    def obj_mapping(self):
+        """Deprecated, use ``obj_registry`` or ``get_obj_verts_can`` / ``get_obj_faces``.
+
+        Read-only ``obj_id -> trimesh.Trimesh`` view of the object registry, meshes are built on access.
+        """
+        warnings.warn("obj_mapping is deprecated, use obj_registry", DeprecationWarning, stacklevel=2)
+        return ObjectMeshMapping(self.obj_registry, self._compat_obj_ids())
+
+    @property
+    def handover_info(self):
+        """Deprecated, use ``handover_partner_idx`` or ``get_hand_over``.
+
+        ``(seq_id, sub_id, frame_id, view_id) -> partner tuple`` of every handover sample, None unless
+        ``enable_handover``. Built from ``handover_partner_idx`` on first access.
+        """
+        warnings.warn("handover_info is deprecated, use handover_partner_idx", DeprecationWarning, stacklevel=2)
+        if self.handover_partner_idx is None:
+            return None
+        if getattr(self, "_handover_info", None) is None:
+            self._handover_info = handover_info_map(self.info_list, self.handover_partner_idx)
+        return self._handover_info
+
+    @property
+    def handover_info_list(self):
+        """Deprecated, use ``handover_sample_index_list``. The keys of ``handover_info``."""
+        warnings.warn("handover_info_list is deprecated, use handover_sample_index_list",
+                      DeprecationWarning,
+                      stacklevel=2)
+        if self.handover_partner_idx is None:
+            return None
+        return [tuple(self.info_list[i]) for i in self.handover_sample_index_list]
+
+    # endregion <<<<<
+
+    def get_sample(self, idx, fields=("image", "cam_intr", "joints_3d", "joints_2d")):
+        """Fetch several fields of one sample in a single call.
+
+        Shared inputs are read once: e.g. ``mano_pose`` and ``mano_shape`` unpickle one ``general_info`` file and
+        all ``*_2d`` fields share one ``cam_intr``. ``self.n_file_open`` counts the files opened so far.
+
+        Args:
+            idx (int): sample index.
+            fields (list): field names, see ``oikit.oi_image.utils.SAMPLE_FIELDS``.
+
+        Returns:
+            dict: field name -> value.
+        """
+        return resolve_sample_fields(self, idx, fields)
+
+    def get_batch(self, indices, fields=("cam_intr", "joints_3d", "joints_2d")):
+        """Fetch several fields of a batch of samples as stacked arrays.
+
+        Fixed-size fields are stacked along a leading batch dim, e.g. ``joints_3d`` (B, 21, 3), ``verts_3d``
+        (B, 778, 3), ``cam_intr`` (B, 3, 3), ``obj_transf`` (B, 4, 4). Object transforms and projections are done
+        as one einsum over the batch. Variable-size ``obj_verts_*`` / ``obj_faces`` come back packed along dim 0;
+        sample b owns rows ``offsets[b]:offsets[b + 1]`` of ``obj_verts_offsets`` / ``obj_faces_offsets``.
+
+        Args:
+            indices (list): sample indices.
+            fields (list): field names, see ``oikit.oi_image.utils.BATCH_FIELDS``.
+
+        Returns:
+            dict: field name -> batched value.
+        """
+        return resolve_batch_fields(self, np.asarray(indices, dtype=np.int64), fields)
+
+    def _get_clip_index(self):
+        # (sequence index, seq_all row -> sample index in this dataset or -1 when the row is not in the split)
+        if self._clip_index is None:
+            seq_index = SeqViewIndex.load(self._data_dir)
+            idx_of_pos = np.full(len(seq_index.positions), -1, dtype=np.int64)
+            anno_pos = self._get_anno_pos()
+            idx_of_pos[anno_pos] = np.arange(len(anno_pos), dtype=np.int64)
+            self._clip_index = (seq_index, idx_of_pos)
+        return self._clip_index
+
+    def get_clip_indices(self, seq_id, view_id, start, length, stride=1):
+        """Sample indices of a clip, see ``get_clip``."""
+        seq_index, idx_of_pos = self._get_clip_index()
+        positions, sub_ids, _ = seq_index.get(seq_id, view_id)
+        end = start + (length - 1) * stride + 1
+        if start < 0 or end > len(positions):
+            raise IndexError(f"clip [{start}:{end}:{stride}] out of range for {seq_id} view {view_id} "
+                             f"with {len(positions)} frames")
+        rows = slice(start, end, stride)
+        if np.any(sub_ids[rows] != sub_ids[start]):
+            raise ValueError(f"clip [{start}:{end}:{stride}] of {seq_id} spans two subjects")
+        indices = idx_of_pos[positions[rows]]
+        if np.any(indices < 0):
+            raise ValueError(f"clip [{start}:{end}:{stride}] of {seq_id} is not in the {self._data_split} split")
+        return indices
+
+    def get_clip(self, seq_id, view_id, start, length, stride=1, fields=("cam_intr", "joints_3d", "joints_2d")):
+        """Fetch ``length`` frames of one sequence in one view, ``stride`` frames apart, as stacked arrays.
+
+        Frames are counted in the order of the sequence index, i.e. sorted by (sub_id, frame_id); a clip may not
+        cross from one subject to the other in two-hand sequences. Consecutive frames are consecutive rows of the
+        columnar store, so each field is read with one (strided) slice. Enumerate valid clips with ``ClipSampler``.
+
+        Args:
+            seq_id (str): e.g. "A01001_0001_0000/2021-09-26-19-59-58".
+            view_id (int): camera view, 0 to 3.
+            start (int): first frame of the clip.
+            length (int): number of frames T.
+            stride (int, optional): frame step. Defaults to 1.
+            fields (list): field names, see ``oikit.oi_image.utils.BATCH_FIELDS``.
+
+        Returns:
+            dict: field name -> (T, ...) value, as ``get_batch``.
+        """
+        return self.get_batch(self.get_clip_indices(seq_id, view_id, start, length, stride), fields)
+
+    def _load_pkl(self, field, idx):
+        pkl_path = os.path.join(self._data_dir, "image", "anno", field, f"{self.info_str_list[idx]}.pkl")
+        with open(pkl_path, "rb") as f:
+            self.n_file_open += 1
+            record_file(pkl_path)
+            return pickle.load(f)
+
     def get_image_path(self, idx):
         info = self.info_list[idx]
         # compute image path
@@ -143,28 +340,92 @@ class OakInkImage:
         image_path = os.path.join(self._data_dir, "image", "stream_release_v2", offset)
         return image_path
 
-    def get_image(self, idx):
+    def _read_image(self, idx, roi=None, out_size=None, scale=None):
+        # every image decode goes through here, see read_image for roi / out_size / scale
         path = self.get_image_path(idx)
+        self.n_file_open += 1
+        if roi is not None or out_size is not None or scale is not None:
+            return read_image(path, roi=roi, out_size=out_size, scale=scale)
+        record_file(path)
+        import imageio
         image = np.array(imageio.imread(path, pilmode="RGB"), dtype=np.uint8)
         return image
 
+    def get_image(self, idx, scale=None, roi=None):
+        """Load the RGB image of sample ``idx``.
+
+        Args:
+            idx (int): sample index.
+            scale (float, optional): resize factor of the returned image (relative to ``roi`` if given).
+            roi (tuple, optional): (x0, y0, x1, y1) crop in full-resolution pixels, zero padded past the border.
+
+        Returns:
+            np.ndarray: (H, W, 3) uint8.
+        """
+        if scale is None and roi is None:
+            if self._prefetcher is not None:
+                return self._prefetcher.get(idx)
+            return self._read_image(idx)
+
+        return self._read_image(idx, roi=roi, scale=scale)
+
+    def get_hand_crop(self, idx, size=256, margin=0.2):
+        """Decode only a square hand crop, boxed around the projected joints.
+
+        Args:
+            idx (int): sample index.
+            size (int, optional): side of the returned crop. Defaults to 256.
+            margin (float, optional): box enlargement on each side, relative to the joints' extent. Defaults to 0.2.
+
+        Returns:
+            tuple: crop (size, size, 3) uint8, and its box (x0, y0, x1, y1) in full-resolution pixels.
+        """
+        box = square_box(self.get_joints_2d(idx), margin)
+        return self._read_image(idx, roi=box, out_size=(size, size)), box
+
+    def enable_prefetch(self, order, num_workers=4, max_in_flight=16, max_bytes=256 << 20):
+        """Decode images of the upcoming ``order`` (e.g. ``list(sampler)``) ahead of ``get_image`` calls.
+
+        See ``oikit.oi_image.prefetch.ImagePrefetcher``; ``prefetch_stats()`` reports hits, misses and queue depth.
+        """
+        self.disable_prefetch()
+        self._prefetcher = ImagePrefetcher(self._read_image,
+                                           order,
+                                           num_workers=num_workers,
+                                           max_in_flight=max_in_flight,
+                                           max_bytes=max_bytes,
+                                           image_nbytes=self._image_size[0] * self._image_size[1] * 3)
+
+    def disable_prefetch(self):
+        if self._prefetcher is not None:
+            self._prefetcher.close()
+            self._prefetcher = None
+
+    def prefetch_stats(self):
+        if self._prefetcher is None:
+            return None
+        return self._prefetcher.stats()
+
     def get_cam_intr(self, idx):
-        cam_path = os.path.join(self._data_dir, "image", "anno", "cam_intr", f"{self.info_str_list[idx]}.pkl")
-        with open(cam_path, "rb") as f:
-            cam_intr = pickle.load(f)
-        return cam_intr
+        if self._anno_store is not None:
+            return self._anno_store.get("cam_intr", self._anno_pos[idx])
+        return self._load_pkl("cam_intr", idx)
+
+    def get_cam_extr(self, idx):
+        # world -> camera
+        if self._anno_store is not None and self._anno_store.has("cam_extr"):
+            return self._anno_store.get("cam_extr", self._anno_pos[idx])
+        return np.asarray(self._load_pkl("general_info", idx)["cam_extr"], dtype=np.float32)
 
     def get_joints_3d(self, idx):
-        joints_path = os.path.join(self._data_dir, "image", "anno", "hand_j", f"{self.info_str_list[idx]}.pkl")
-        with open(joints_path, "rb") as f:
-            joints_3d = pickle.load(f)
-        return joints_3d
+        if self._anno_store is not None:
+            return self._anno_store.get("hand_j", self._anno_pos[idx])
+        return self._load_pkl("hand_j", idx)
 
     def get_verts_3d(self, idx):
-        verts_path = os.path.join(self._data_dir, "image", "anno", "hand_v", f"{self.info_str_list[idx]}.pkl")
-        with open(verts_path, "rb") as f:
-            verts_3d = pickle.load(f)
-        return verts_3d
+        if self._anno_store is not None:
+            return self._anno_store.get("hand_v", self._anno_pos[idx])
+        return self._load_pkl("hand_v", idx)
 
     def get_joints_2d(self, idx):
         cam_intr = self.get_cam_intr(idx)
@@ -177,32 +438,14 @@ class OakInkImage:
         return persp_project(verts_3d, cam_intr)
 
     def get_mano_pose(self, idx):
-        general_info_path = os.path.join(self._data_dir, "image", "anno", "general_info",
-                                         f"{self.info_str_list[idx]}.pkl")
-        with open(general_info_path, "rb") as f:
-            general_info = pickle.load(f)
-        raw_hand_anno = general_info["hand_anno"]
-
-        raw_hand_pose = (raw_hand_anno["hand_pose"]).reshape((16, 4))  # quat (16, 4)
-        _wrist, _remain = raw_hand_pose[0, :], raw_hand_pose[1:, :]
-        cam_extr = general_info["cam_extr"]  # SE3 (4, 4))
-        extr_R = cam_extr[:3, :3]  # (3, 3)
-
-        wrist_R = extr_R.matmul(quat_to_rotmat(_wrist))  # (3, 3)
-        wrist = rotmat_to_aa(wrist_R).unsqueeze(0).numpy()  # (1, 3)
-        remain = quat_to_aa(_remain).numpy()  # (15, 3)
-        hand_pose = np.concatenate([wrist, remain], axis=0)  # (16, 3)
-
-        return hand_pose.astype(np.float32)
+        if self._anno_store is not None and self._anno_store.has("mano_pose"):
+            return self._anno_store.get("mano_pose", self._anno_pos[idx])
+        return mano_pose_from_general_info(self._load_pkl("general_info", idx))
 
     def get_mano_shape(self, idx):
-        general_info_path = os.path.join(self._data_dir, "image", "anno", "general_info",
-                                         f"{self.info_str_list[idx]}.pkl")
-        with open(general_info_path, "rb") as f:
-            general_info = pickle.load(f)
-        raw_hand_anno = general_info["hand_anno"]
-        hand_shape = raw_hand_anno["hand_shape"].numpy().astype(np.float32)
-        return hand_shape
+        if self._anno_store is not None and self._anno_store.has("mano_shape"):
+            return self._anno_store.get("mano_shape", self._anno_pos[idx])
+        return mano_shape_from_general_info(self._load_pkl("general_info", idx))
 
     def get_obj_idx(self, idx):
         info = self.info_list[idx][0]
@@ -211,22 +454,19 @@ class OakInkImage:
         return obj_id
 
     def get_obj_faces(self, idx):
+        # the registry's arrays are shared and read-only, callers get their own copy
         obj_id = self.get_obj_idx(idx)
-        return np.asarray(self.obj_mapping[obj_id].faces).astype(np.int32)
+        return self.obj_registry.get_faces(obj_id).copy()
 
     def get_obj_transf(self, idx):
-        obj_transf_path = os.path.join(self._data_dir, "image", "anno", "obj_transf", f"{self.info_str_list[idx]}.pkl")
-        with open(obj_transf_path, "rb") as f:
-            obj_transf = pickle.load(f)
-        return obj_transf.astype(np.float32)
+        if self._anno_store is not None:
+            return self._anno_store.get("obj_transf", self._anno_pos[idx])
+        return self._load_pkl("obj_transf", idx).astype(np.float32)
 
     def get_obj_verts_3d(self, idx):
-        obj_verts = self.get_obj_verts_can(idx)
+        obj_verts = self.obj_registry.get_verts(self.get_obj_idx(idx))
         obj_transf = self.get_obj_transf(idx)
-        obj_rot = obj_transf[:3, :3]
-        obj_tsl = obj_transf[:3, 3]
-        obj_verts_transf = (obj_rot @ obj_verts.transpose(1, 0)).transpose(1, 0) + obj_tsl
-        return obj_verts_transf
+        return transf_points(obj_verts, obj_transf)
 
     def get_obj_verts_2d(self, idx):
         obj_verts_3d = self.get_obj_verts_3d(idx)
@@ -235,16 +475,12 @@ class OakInkImage:
 
     def get_obj_verts_can(self, idx):
         obj_id = self.get_obj_idx(idx)
-        obj_verts = np.asarray(self.obj_mapping[obj_id].vertices).astype(np.float32)
-        return obj_verts
+        return self.obj_registry.get_verts(obj_id).copy()
 
     def get_corners_3d(self, idx):
-        obj_corners = self.get_corners_can(idx)
+        obj_corners = self.obj_registry.get_corners(self.get_obj_idx(idx))
         obj_transf = self.get_obj_transf(idx)
-        obj_rot = obj_transf[:3, :3]
-        obj_tsl = obj_transf[:3, 3]
-        obj_corners_transf = (obj_rot @ obj_corners.transpose(1, 0)).transpose(1, 0) + obj_tsl
-        return obj_corners_transf
+        return transf_points(obj_corners, obj_transf)
 
     def get_corners_2d(self, idx):
         obj_corners = self.get_corners_3d(idx)
@@ -253,9 +489,7 @@ class OakInkImage:
 
     def get_corners_can(self, idx):
         obj_id = self.get_obj_idx(idx)
-        obj_mesh = self.obj_mapping[obj_id]
-        obj_corners = trimesh.bounds.corners(obj_mesh.bounds)
-        return obj_corners
+        return self.obj_registry.get_corners(obj_id).copy()
 
     def get_sample_status(self, idx):
         info = self.info_list[idx][0]
@@ -271,29 +505,21 @@ class OakInkImage:
         return intent_mode
 
     def get_hand_over(self, idx):
-        if self.handover_info is None:
+        if self.handover_partner_idx is None:
             return None
-        info_item = tuple(self.info_list[idx])
-        if info_item not in self.handover_info:
+        alt_idx = self.handover_partner_idx[idx]
+        if alt_idx < 0:
             return None
 
-        info = info_item[0]
-        status = self.seq_status[info]
-        seq_cat, _ = info.split("/")
-        _, action_id, _ = decode_seq_cat(seq_cat)
-        intent_mode = ALL_INTENT_REV[action_id]
-
-        alt_info_item = self.handover_info[info_item]
-        # load by alt_info
-        alt_res = self.load_by_info(alt_info_item)
-        # rename to alt
-        res = {
-            "sample_status": status,
-            "intent_mode": intent_mode,
+        # alt sample is read from the same storage as the primary one, renamed to alt
+        return {
+            "sample_status": self.get_sample_status(idx),
+            "intent_mode": self.get_intent_mode(idx),
+            "alt_sample_status": self.get_sample_status(alt_idx),
+            "alt_intent_mode": self.get_intent_mode(alt_idx),
+            "alt_joints": self.get_joints_3d(alt_idx),
+            "alt_verts": self.get_verts_3d(alt_idx),
         }
-        for _k, _v in alt_res.items():
-            res[f"alt_{_k}"] = _v
-        return res
 
     def load_by_info(self, info_item):
         info = info_item[0]
@@ -317,9 +543,21 @@ class OakInkImage:
         }
 
 
+@instrumented
 class OakInkImageSequence(OakInkImage):
 
-    def __init__(self, seq_id, view_id, enable_handover=False) -> None:
+    def __init__(self,
+                 seq_id,
+                 view_id,
+                 enable_handover=False,
+                 obj_cache_size=None,
+                 seq_index=None,
+                 seq_status=None,
+                 obj_registry=None) -> None:
+        """One sequence seen from one view.
+
+        ``seq_index``, ``seq_status`` and ``obj_registry`` can be shared between sequences, see ``create_many``.
+        """
 
         self.framedata_color_name = [
             "north_east_color",
@@ -332,40 +570,137 @@ class OakInkImageSequence(OakInkImage):
 
         assert "OAKINK_DIR" in os.environ, "environment variable 'OAKINK_DIR' is not set"
         self._data_dir = os.environ["OAKINK_DIR"]
-        info_list_all = json.load(open(os.path.join(self._data_dir, "image", "anno", "seq_all.json")))
+        if seq_index is None:
+            seq_index = SeqViewIndex.load(self._data_dir)
 
         seq_cat, seq_timestamp = seq_id.split("/")
-        self.info_list = [info for info in info_list_all if (info[0] == seq_id and info[3] == view_id)]
+        seq_pos, sub_ids, frame_ids = seq_index.get(seq_id, view_id)
+        self.info_list = InfoIndex(seq_names=np.array([seq_id]),
+                                   seq_codes=np.zeros(len(seq_pos), dtype=np.int32),
+                                   sub_ids=sub_ids.astype(np.int32),
+                                   frame_ids=frame_ids.astype(np.int32),
+                                   view_ids=np.full(len(seq_pos), view_id, dtype=np.int32))
 
-        # deal with two hand cases.
-        self.info_list.sort(key=lambda x: x[1] * 1000 + x[2])
+        # columnar annotation store, if packed
+        self.n_file_open = 0
+        self._prefetcher = None
+        self._anno_store = AnnoStore.open(self._data_dir)
+        self._anno_pos = seq_pos
 
-        self.info_str_list = []
-        for info in self.info_list:
-            info_str = "__".join([str(x) for x in info])
-            info_str = info_str.replace("/", "__")
-            self.info_str_list.append(info_str)
+        self.info_str_list = InfoStrView(self.info_list)
 
         self.obj_id, self.intent_id, self.subject_id = decode_seq_cat(seq_cat)
-        # load obj
-        self.obj_mapping = {}
+        # obj mesh is loaded on first access
         suppress_trimesh_logging()
-        obj_root = os.path.join(self._data_dir, "image", "obj")
-        self.obj_model = load_object_by_id(self.obj_id, obj_root)
-        self.obj_mapping[self.obj_id] = self.obj_model
+        if obj_registry is None:
+            obj_registry = ObjectRegistry.from_data_dir(self._data_dir, max_size=obj_cache_size)
+        self.obj_registry = obj_registry
 
-        self._image_size = (848, 480)  # (W, H)
+        self._image_size = IMAGE_SIZE  # (W, H)
         self._hand_side = "right"
+        self._clip_index = None
 
         self._enable_handover = enable_handover
         # seq status
-        with open(os.path.join(self._data_dir, "image", "anno", "seq_status.json"), "r") as f:
-            self.seq_status = json.load(f)
+        if seq_status is None:
+            with open(os.path.join(self._data_dir, "image", "anno", "seq_status.json"), "r") as f:
+                seq_status = json.load(f)
+        self.seq_status = seq_status
 
         # handover
         if self._enable_handover:
-            self.handover_info, self.handover_sample_index_list = self._get_handover_info(self.info_list)
-            self.handover_info_list = list(self.handover_info.keys())
+            self.handover_partner_idx = self._get_handover_partner(self.info_list)
+            self.handover_sample_index_list = np.flatnonzero(self.handover_partner_idx >= 0).tolist()
         else:
-            self.handover_info, self.handover_sample_index_list = None, None
-            self.handover_info_list = None
+            self.handover_partner_idx, self.handover_sample_index_list = None, None
+
+    def _compat_obj_ids(self):
+        return [self.obj_id]
+
+    @property
+    def obj_model(self):
+        """Deprecated, use ``obj_registry.get(self.obj_id)``. The ``trimesh.Trimesh`` of the sequence's object."""
+        warnings.warn("obj_model is deprecated, use obj_registry", DeprecationWarning, stacklevel=2)
+        return ObjectMeshMapping(self.obj_registry, [self.obj_id])[self.obj_id]
+
+    @classmethod
+    def create_many(cls, seq_view_list=None, enable_handover=False, obj_cache_size=None):
+        """Create sequences sharing one sequence index, one status table and one object mesh registry.
+
+        Args:
+            seq_view_list (list, optional): (seq_id, view_id) pairs. Defaults to every sequence in every view.
+            enable_handover (bool, optional): Defaults to False.
+            obj_cache_size (int, optional): size of the shared mesh LRU. Defaults to None (unbounded).
+
+        Returns:
+            list: OakInkImageSequence, one per pair.
+        """
+        assert "OAKINK_DIR" in os.environ, "environment variable 'OAKINK_DIR' is not set"
+        data_dir = os.environ["OAKINK_DIR"]
+        seq_index = SeqViewIndex.load(data_dir)
+        with open(os.path.join(data_dir, "image", "anno", "seq_status.json"), "r") as f:
+            seq_status = json.load(f)
+        obj_registry = ObjectRegistry.from_data_dir(data_dir, max_size=obj_cache_size)
+        if seq_view_list is None:
+            seq_view_list = seq_index.keys()
+        return [
+            cls(seq_id,
+                view_id,
+                enable_handover=enable_handover,
+                seq_index=seq_index,
+                seq_status=seq_status,
+                obj_registry=obj_registry) for seq_id, view_id in seq_view_list
+        ]
+
+
+class ClipSampler:
+    """Every valid clip of an ``OakInkImage`` split, as the (seq_id, view_id, start) arguments of ``get_clip``.
+
+    A clip is valid when its ``length`` frames, ``stride`` apart, belong to one subject of one sequence and view,
+    and all are samples of the dataset's split. Within a sequence and view, every ``step``-th valid start is kept.
+
+    Args:
+        oi_image (OakInkImage): the dataset.
+        length (int): number of frames T.
+        stride (int, optional): frame step inside a clip. Defaults to 1.
+        step (int, optional): keep every step-th clip start. Defaults to 1.
+        shuffle (bool, optional): iterate in a new random order each time. Defaults to False.
+        seed (int, optional): seed of the shuffling. Defaults to 0.
+    """
+
+    def __init__(self, oi_image, length, stride=1, step=1, shuffle=False, seed=0):
+        self.length = length
+        self.stride = stride
+        self.shuffle = shuffle
+        self._rng = np.random.default_rng(seed)
+
+        seq_index, idx_of_pos = oi_image._get_clip_index()
+        span = (length - 1) * stride
+        self._keys = seq_index.keys()
+        key_ids, starts = [], []
+        for k, (seq_id, view_id) in enumerate(self._keys):
+            positions, sub_ids, _ = seq_index.get(seq_id, view_id)
+            n_start = len(positions) - span
+            if n_start <= 0:
+                continue
+            in_split = idx_of_pos[positions] >= 0
+            valid = np.ones(n_start, dtype=bool)
+            for offset in range(0, span + 1, stride):
+                valid &= in_split[offset:offset + n_start] & (sub_ids[offset:offset + n_start] == sub_ids[:n_start])
+            key_starts = np.flatnonzero(valid)[::step]
+            key_ids.append(np.full(len(key_starts), k, dtype=np.int64))
+            starts.append(key_starts)
+        self._key_ids = np.concatenate(key_ids) if key_ids else np.zeros(0, dtype=np.int64)
+        self._starts = np.concatenate(starts) if starts else np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self._starts)
+
+    def __getitem__(self, i):
+        seq_id, view_id = self._keys[self._key_ids[i]]
+        return seq_id, view_id, int(self._starts[i])
+
+    def __iter__(self):
+        order = self._rng.permutation(len(self)) if self.shuffle else range(len(self))
+        for i in order:
+            yield self[i]
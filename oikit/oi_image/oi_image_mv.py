@@ -1,14 +1,16 @@
 import json
 import os
 import pickle
+import warnings
+from concurrent.futures import ThreadPoolExecutor
 
-import imageio
 import numpy as np
-import trimesh
-from oikit.common import quat_to_aa, quat_to_rotmat, rotmat_to_aa
 from oikit.common import suppress_trimesh_logging
+from oikit.instrument import instrumented, record_file
 
-from .utils import load_object, load_object_by_id, persp_project
+from .utils import (IMAGE_SIZE, AnnoStore, InfoIndex, InfoStrView, ObjectMeshMapping, ObjectRegistry,
+                    batch_transf_points, gather_anno, mano_pose_from_general_info, mano_shape_from_general_info,
+                    persp_project, resolve_sample_fields, transf_points)
 
 
 def decode_seq_cat(seq_cat):
@@ -22,7 +24,10 @@ def decode_seq_cat(seq_cat):
     return obj_id, action_id, subject_id
 
 
+@instrumented
 class OakInkImageMV:
+    N_VIEWS = 4
+
     @staticmethod
     def _get_info_list(data_dir, split_key, data_split):
         if data_split == "train+val":
@@ -39,7 +44,7 @@ class OakInkImageMV:
             info_list = json.load(open(os.path.join(data_dir, "image", "anno_mv", "split", split_key, "seq_test.json")))
         return info_list
 
-    def __init__(self, data_split="all", mode_split="default") -> None:
+    def __init__(self, data_split="all", mode_split="default", obj_cache_size=None) -> None:
         self._name = "OakInkImage"
         self._data_split = data_split
         self._mode_split = mode_split
@@ -57,22 +62,22 @@ class OakInkImageMV:
         else: # self._mode_split == "handobject":
             self.info_list = self._get_info_list(self._data_dir, "split0_ho", self._data_split)
 
-        self.info_str_list = []
-        for info in self.info_list:
-            info_str = "__".join([str(x) for x in info])
-            info_str = info_str.replace("/", "__")
-            self.info_str_list.append(info_str)
+        # array-backed, info_list[idx] and info_str_list[idx] are derived on access
+        self.info_list = InfoIndex.from_info_list(self.info_list)
+        self.info_str_list = InfoStrView(self.info_list)
 
-        # load obj
-        suppress_trimesh_logging()
+        # columnar annotation store, if packed
+        self.n_file_open = 0
+        self._anno_store = AnnoStore.open(self._data_dir)
+        if self._anno_store is not None:
+            if self._data_split == "all":
+                self._anno_pos = np.arange(len(self.info_list), dtype=np.int64)
+            else:
+                self._anno_pos = self._anno_store.positions(self._data_dir, self.info_list)
 
-        self.obj_mapping = {}
-        obj_root = os.path.join(self._data_dir, "image", "obj")
-        all_obj_fn = sorted(os.listdir(obj_root))
-        for obj_fn in all_obj_fn:
-            obj_id = os.path.splitext(obj_fn)[0]
-            obj_model = load_object(obj_root, obj_fn)
-            self.obj_mapping[obj_id] = obj_model
+        # obj meshes are loaded on first access
+        suppress_trimesh_logging()
+        self.obj_registry = ObjectRegistry.from_data_dir(self._data_dir, max_size=obj_cache_size)
 
         self.framedata_color_name = [
             "north_east_color",
@@ -81,16 +86,114 @@ class OakInkImageMV:
             "south_west_color",
         ]
 
-        self._image_size = (848, 480)  # (W, H)
+        self._image_size = IMAGE_SIZE  # (W, H)
         self._hand_side = "right"
 
         # seq status
         with open(os.path.join(self._data_dir, "image", "anno", "seq_status.json"), "r") as f:
             self.seq_status = json.load(f)
 
+        self._decode_pool = None  # (pid, executor), created by the first get_frame of each process
+
     def __len__(self):
         return len(self.info_list)
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_decode_pool"] = None
+        return state
+
+    @property
+    def obj_mapping(self):
+        """Deprecated, use ``obj_registry`` or ``get_obj_verts_can`` / ``get_obj_faces``.
+
+        Read-only ``obj_id -> trimesh.Trimesh`` view of the object registry, meshes are built on access.
+        """
+        warnings.warn("obj_mapping is deprecated, use obj_registry", DeprecationWarning, stacklevel=2)
+        return ObjectMeshMapping(self.obj_registry)
+
+    @property
+    def num_frames(self):
+        return len(self.info_list) // self.N_VIEWS
+
+    def get_frame_indices(self, frame_idx):
+        # info_list holds N_VIEWS consecutive view entries per frame, see dev/extend_split.py
+        indices = np.arange(frame_idx * self.N_VIEWS, (frame_idx + 1) * self.N_VIEWS)
+        infos = [self.info_list[idx] for idx in indices]
+        assert ([info[3] for info in infos] == list(range(self.N_VIEWS)) and
+                len({tuple(info[:3]) for info in infos}) == 1), f"entries of frame {frame_idx} are not its 4 views"
+        return indices
+
+    def _get_decode_pool(self):
+        # a pool inherited through fork has no threads, each process creates its own
+        if self._decode_pool is None or self._decode_pool[0] != os.getpid():
+            self._decode_pool = (os.getpid(),
+                                 ThreadPoolExecutor(max_workers=self.N_VIEWS, thread_name_prefix="oikit_decode"))
+        return self._decode_pool[1]
+
+    def get_frame(self, frame_idx, with_image=True):
+        """Fetch the four views of one frame in a single call.
+
+        Per-view values are stacked along a leading view dim: ``image`` (4, H, W, 3), decoded in parallel,
+        ``cam_intr`` (4, 3, 3), ``cam_extr`` (4, 4, 4) world -> camera, and ``joints_2d`` (4, 21, 2). The 3D
+        annotations are read once, from the first view, and returned in world space: ``joints_3d`` (21, 3),
+        ``verts_3d`` (778, 3) and ``obj_transf`` (4, 4). Camera-space points of view v are
+        ``transf_points(points, cam_extr[v])``.
+
+        Args:
+            frame_idx (int): frame index, in [0, num_frames).
+            with_image (bool, optional): decode the images. Defaults to True.
+
+        Returns:
+            dict: field name -> value.
+        """
+        indices = self.get_frame_indices(frame_idx)
+        ref_idx = indices[0]
+        cam_intr = gather_anno(self, "cam_intr", self.get_cam_intr, indices)
+        cam_extr = gather_anno(self, "cam_extr", self.get_cam_extr, indices)
+
+        cam_to_world = np.linalg.inv(cam_extr[0])
+        joints_3d = transf_points(self.get_joints_3d(ref_idx), cam_to_world)
+        verts_3d = transf_points(self.get_verts_3d(ref_idx), cam_to_world)
+        obj_transf = cam_to_world @ self.get_obj_transf(ref_idx)
+        joints_cam = batch_transf_points(np.broadcast_to(joints_3d, (self.N_VIEWS, *joints_3d.shape)), cam_extr)
+
+        frame = {
+            "cam_intr": cam_intr,
+            "cam_extr": cam_extr,
+            "joints_3d": joints_3d,
+            "verts_3d": verts_3d,
+            "obj_transf": obj_transf,
+            "joints_2d": persp_project(joints_cam, cam_intr),
+            "obj_id": self.get_obj_idx(ref_idx),
+            "sample_status": self.get_sample_status(ref_idx),
+        }
+        if with_image:
+            frame["image"] = np.stack(list(self._get_decode_pool().map(self.get_image, indices)))
+        return frame
+
+    def get_sample(self, idx, fields=("image", "cam_intr", "joints_3d", "joints_2d")):
+        """Fetch several fields of one sample in a single call.
+
+        Shared inputs are read once: e.g. ``mano_pose`` and ``mano_shape`` unpickle one ``general_info`` file and
+        all ``*_2d`` fields share one ``cam_intr``. ``self.n_file_open`` counts the files opened so far.
+
+        Args:
+            idx (int): sample index.
+            fields (list): field names, see ``oikit.oi_image.utils.SAMPLE_FIELDS``.
+
+        Returns:
+            dict: field name -> value.
+        """
+        return resolve_sample_fields(self, idx, fields)
+
+    def _load_pkl(self, field, idx):
+        pkl_path = os.path.join(self._data_dir, "image", "anno", field, f"{self.info_str_list[idx]}.pkl")
+        with open(pkl_path, "rb") as f:
+            self.n_file_open += 1
+            record_file(pkl_path)
+            return pickle.load(f)
+
     def get_image_path(self, idx):
         info = self.info_list[idx]
         # compute image path
@@ -100,26 +203,32 @@ class OakInkImageMV:
 
     def get_image(self, idx):
         path = self.get_image_path(idx)
+        self.n_file_open += 1
+        record_file(path)
+        import imageio
         image = np.array(imageio.imread(path, pilmode="RGB"), dtype=np.uint8)
         return image
 
     def get_cam_intr(self, idx):
-        cam_path = os.path.join(self._data_dir, "image", "anno", "cam_intr", f"{self.info_str_list[idx]}.pkl")
-        with open(cam_path, "rb") as f:
-            cam_intr = pickle.load(f)
-        return cam_intr
+        if self._anno_store is not None:
+            return self._anno_store.get("cam_intr", self._anno_pos[idx])
+        return self._load_pkl("cam_intr", idx)
+
+    def get_cam_extr(self, idx):
+        # world -> camera
+        if self._anno_store is not None and self._anno_store.has("cam_extr"):
+            return self._anno_store.get("cam_extr", self._anno_pos[idx])
+        return np.asarray(self._load_pkl("general_info", idx)["cam_extr"], dtype=np.float32)
 
     def get_joints_3d(self, idx):
-        joints_path = os.path.join(self._data_dir, "image", "anno", "hand_j", f"{self.info_str_list[idx]}.pkl")
-        with open(joints_path, "rb") as f:
-            joints_3d = pickle.load(f)
-        return joints_3d
+        if self._anno_store is not None:
+            return self._anno_store.get("hand_j", self._anno_pos[idx])
+        return self._load_pkl("hand_j", idx)
 
     def get_verts_3d(self, idx):
-        verts_path = os.path.join(self._data_dir, "image", "anno", "hand_v", f"{self.info_str_list[idx]}.pkl")
-        with open(verts_path, "rb") as f:
-            verts_3d = pickle.load(f)
-        return verts_3d
+        if self._anno_store is not None:
+            return self._anno_store.get("hand_v", self._anno_pos[idx])
+        return self._load_pkl("hand_v", idx)
 
     def get_joints_2d(self, idx):
         cam_intr = self.get_cam_intr(idx)
@@ -132,34 +241,14 @@ class OakInkImageMV:
         return persp_project(verts_3d, cam_intr)
 
     def get_mano_pose(self, idx):
-        general_info_path = os.path.join(
-            self._data_dir, "image", "anno", "general_info", f"{self.info_str_list[idx]}.pkl"
-        )
-        with open(general_info_path, "rb") as f:
-            general_info = pickle.load(f)
-        raw_hand_anno = general_info["hand_anno"]
-
-        raw_hand_pose = (raw_hand_anno["hand_pose"]).reshape((16, 4))  # quat (16, 4)
-        _wrist, _remain = raw_hand_pose[0, :], raw_hand_pose[1:, :]
-        cam_extr = general_info["cam_extr"]  # SE3 (4, 4))
-        extr_R = cam_extr[:3, :3]  # (3, 3)
-
-        wrist_R = extr_R.matmul(quat_to_rotmat(_wrist))  # (3, 3)
-        wrist = rotmat_to_aa(wrist_R).unsqueeze(0).numpy()  # (1, 3)
-        remain = quat_to_aa(_remain).numpy()  # (15, 3)
-        hand_pose = np.concatenate([wrist, remain], axis=0)  # (16, 3)
-
-        return hand_pose.astype(np.float32)
+        if self._anno_store is not None and self._anno_store.has("mano_pose"):
+            return self._anno_store.get("mano_pose", self._anno_pos[idx])
+        return mano_pose_from_general_info(self._load_pkl("general_info", idx))
 
     def get_mano_shape(self, idx):
-        general_info_path = os.path.join(
-            self._data_dir, "image", "anno", "general_info", f"{self.info_str_list[idx]}.pkl"
-        )
-        with open(general_info_path, "rb") as f:
-            general_info = pickle.load(f)
-        raw_hand_anno = general_info["hand_anno"]
-        hand_shape = raw_hand_anno["hand_shape"].numpy().astype(np.float32)
-        return hand_shape
+        if self._anno_store is not None and self._anno_store.has("mano_shape"):
+            return self._anno_store.get("mano_shape", self._anno_pos[idx])
+        return mano_shape_from_general_info(self._load_pkl("general_info", idx))
 
     def get_obj_idx(self, idx):
         info = self.info_list[idx][0]
@@ -168,22 +257,19 @@ class OakInkImageMV:
         return obj_id
 
     def get_obj_faces(self, idx):
+        # the registry's arrays are shared and read-only, callers get their own copy
         obj_id = self.get_obj_idx(idx)
-        return np.asarray(self.obj_mapping[obj_id].faces).astype(np.int32)
+        return self.obj_registry.get_faces(obj_id).copy()
 
     def get_obj_transf(self, idx):
-        obj_transf_path = os.path.join(self._data_dir, "image", "anno", "obj_transf", f"{self.info_str_list[idx]}.pkl")
-        with open(obj_transf_path, "rb") as f:
-            obj_transf = pickle.load(f)
-        return obj_transf.astype(np.float32)
+        if self._anno_store is not None:
+            return self._anno_store.get("obj_transf", self._anno_pos[idx])
+        return self._load_pkl("obj_transf", idx).astype(np.float32)
 
     def get_obj_verts_3d(self, idx):
-        obj_verts = self.get_obj_verts_can(idx)
+        obj_verts = self.obj_registry.get_verts(self.get_obj_idx(idx))
         obj_transf = self.get_obj_transf(idx)
-        obj_rot = obj_transf[:3, :3]
-        obj_tsl = obj_transf[:3, 3]
-        obj_verts_transf = (obj_rot @ obj_verts.transpose(1, 0)).transpose(1, 0) + obj_tsl
-        return obj_verts_transf
+        return transf_points(obj_verts, obj_transf)
 
     def get_obj_verts_2d(self, idx):
         obj_verts_3d = self.get_obj_verts_3d(idx)
@@ -192,16 +278,12 @@ class OakInkImageMV:
 
     def get_obj_verts_can(self, idx):
         obj_id = self.get_obj_idx(idx)
-        obj_verts = np.asarray(self.obj_mapping[obj_id].vertices).astype(np.float32)
-        return obj_verts
+        return self.obj_registry.get_verts(obj_id).copy()
 
     def get_corners_3d(self, idx):
-        obj_corners = self.get_corners_can(idx)
+        obj_corners = self.obj_registry.get_corners(self.get_obj_idx(idx))
         obj_transf = self.get_obj_transf(idx)
-        obj_rot = obj_transf[:3, :3]
-        obj_tsl = obj_transf[:3, 3]
-        obj_corners_transf = (obj_rot @ obj_corners.transpose(1, 0)).transpose(1, 0) + obj_tsl
-        return obj_corners_transf
+        return transf_points(obj_corners, obj_transf)
 
     def get_corners_2d(self, idx):
         obj_corners = self.get_corners_3d(idx)
@@ -210,9 +292,7 @@ class OakInkImageMV:
 
     def get_corners_can(self, idx):
         obj_id = self.get_obj_idx(idx)
-        obj_mesh = self.obj_mapping[obj_id]
-        obj_corners = trimesh.bounds.corners(obj_mesh.bounds)
-        return obj_corners
+        return self.obj_registry.get_corners(obj_id).copy()
 
     def get_sample_status(self, idx):
         info = self.info_list[idx][0]
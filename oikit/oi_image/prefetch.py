@@ -0,0 +1,113 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from .utils import IMAGE_SIZE
+
+
+class ImagePrefetcher:
+    """Decode images ahead of consumption in a thread pool.
+
+    Indices are submitted following ``order`` (e.g. the sampler's index order). At most ``max_in_flight`` decodes
+    are pending at once, and decoded-but-unconsumed images are kept within ``max_bytes``. An index requested
+    before it was prefetched is decoded synchronously and counted as a miss, its upcoming entry in ``order`` is then
+    not submitted.
+
+    Args:
+        load_fn (callable): idx -> np.ndarray, the blocking image reader.
+        order (list): upcoming index order.
+        num_workers (int, optional): decode threads. Defaults to 4.
+        max_in_flight (int, optional): max pending decodes. Defaults to 16.
+        max_bytes (int, optional): byte budget of pending + ready images. Defaults to 256 MiB.
+        image_nbytes (int, optional): size estimate of one decoded image, refined after the first decode.
+    """
+
+    def __init__(self,
+                 load_fn,
+                 order,
+                 num_workers=4,
+                 max_in_flight=16,
+                 max_bytes=256 << 20,
+                 image_nbytes=IMAGE_SIZE[0] * IMAGE_SIZE[1] * 3):
+        self.load_fn = load_fn
+        self.max_in_flight = max_in_flight
+        self.max_bytes = max_bytes
+        self._order = list(order)
+        self._cursor = 0
+        self._image_nbytes = image_nbytes
+        self._executor = ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix="oikit_prefetch")
+        self._futures = OrderedDict()  # idx -> future, in submission order
+        self._served = set()  # indices of order beyond the cursor already decoded by a miss
+        self._lock = threading.Lock()
+
+        self.n_hit = 0
+        self.n_miss = 0
+        self.n_dropped = 0
+        self.max_queue_depth = 0
+        self._fill()
+
+    def _n_pending(self):
+        return sum(1 for fut in self._futures.values() if not fut.done())
+
+    def _fill(self):
+        with self._lock:
+            n_pending = self._n_pending()
+            while (self._cursor < len(self._order) and n_pending < self.max_in_flight and
+                   (len(self._futures) + 1) * self._image_nbytes <= self.max_bytes):
+                idx = self._order[self._cursor]
+                self._cursor += 1
+                if idx in self._served:
+                    self._served.discard(idx)
+                    continue
+                if idx in self._futures:
+                    continue
+                self._futures[idx] = self._executor.submit(self.load_fn, idx)
+                n_pending += 1
+            self.max_queue_depth = max(self.max_queue_depth, n_pending)
+
+    def get(self, idx):
+        fut = None
+        with self._lock:
+            if idx in self._futures:
+                # indices submitted before idx were skipped by the consumer, release their budget
+                while True:
+                    key, fut = self._futures.popitem(last=False)
+                    if key == idx:
+                        break
+                    fut.cancel()
+                    self.n_dropped += 1
+        if fut is not None:
+            image = fut.result()
+            self.n_hit += 1
+        else:
+            with self._lock:
+                # the pool has not reached idx yet, it must not decode it again
+                if self._cursor < len(self._order) and self._order[self._cursor] == idx:
+                    self._cursor += 1
+                else:
+                    self._served.add(idx)
+            image = self.load_fn(idx)
+            self.n_miss += 1
+        self._image_nbytes = image.nbytes
+        self._fill()
+        return image
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hit": self.n_hit,
+                "miss": self.n_miss,
+                "dropped": self.n_dropped,
+                "queue_depth": self._n_pending(),
+                "max_queue_depth": self.max_queue_depth,
+                "buffered": len(self._futures),
+                "buffered_bytes": len(self._futures) * self._image_nbytes,
+            }
+
+    def close(self):
+        with self._lock:
+            for fut in self._futures.values():
+                fut.cancel()
+            self._futures.clear()
+            self._served.clear()
+        self._executor.shutdown(wait=False)
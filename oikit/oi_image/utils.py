@@ -1,27 +1,157 @@
+import hashlib
 import json
-import logging
 import os
-import pickle
+import warnings
+from collections import OrderedDict
+from collections.abc import Mapping
 
-import imageio
 import numpy as np
-import trimesh
+from PIL import Image
+from oikit.common import file_fingerprint, get_cache_dir, quat_to_aa, quat_to_rotmat, rotmat_to_aa
+from oikit.instrument import record_file
 
 
-def persp_project(points3d, cam_intr):
-    hom_2d = np.array(cam_intr).dot(points3d.transpose()).transpose()
-    points2d = (hom_2d / (hom_2d[:, 2:] + 1e-6))[:, :2]
-    return points2d.astype(np.float32)
+IMAGE_SIZE = (848, 480)  # (W, H) of every OakInk-Image stream
+
+
+def persp_project(points3d, cam_intr, out=None, return_depth=False, image_size=None):
+    """Perspective projection of camera-space points, batched and broadcasting.
+
+    Float32 inputs are projected in float32 without intermediate float64 copies.
+
+    Args:
+        points3d (np.ndarray): (..., N, 3) points.
+        cam_intr (np.ndarray): (3, 3) shared intrinsics, or (..., 3, 3) per point set. Leading dims broadcast.
+        out (np.ndarray, optional): float32 (..., N, 2) buffer the projected points are written into.
+        return_depth (bool, optional): also return the (..., N) depth. Defaults to False.
+        image_size (tuple, optional): (W, H). If given, also return a (..., N) bool mask of the points with
+                positive depth that project inside the image.
+
+    Returns:
+        np.ndarray | tuple: points2d (..., N, 2) float32, followed by depth and mask when requested.
+    """
+    cam_intr = np.asarray(cam_intr)
+    hom_2d = np.matmul(points3d, np.swapaxes(cam_intr, -1, -2))  # (..., N, 3)
+    depth = hom_2d[..., 2]
+    if out is None:
+        out = np.empty(hom_2d.shape[:-1] + (2,), dtype=np.float32)
+    np.divide(hom_2d[..., :2], depth[..., None] + 1e-6, out=out, casting="same_kind")
+    if not return_depth and image_size is None:
+        return out
+
+    res = (out,)
+    if return_depth:
+        res += (depth,)
+    if image_size is not None:
+        mask = (depth > 0) & (out[..., 0] >= 0) & (out[..., 0] < image_size[0]) & \
+               (out[..., 1] >= 0) & (out[..., 1] < image_size[1])
+        res += (mask,)
+    return res
+
+
+def read_image(path, roi=None, out_size=None, scale=None):
+    """Decode an RGB image, optionally cropped to ``roi`` and resized to ``out_size`` or by ``scale``.
+
+    Codecs with reduced-size decoding (JPEG) are drafted at the smallest scale that still covers the output size.
+    PNG has no such path, so the frame is decoded once and cropped / box-reduced before the array is created.
+
+    Args:
+        path (str): image file.
+        roi (tuple, optional): (x0, y0, x1, y1) in full-resolution pixels; may extend past the border, which is
+                zero padded.
+        out_size (tuple, optional): (W, H) of the returned image.
+        scale (float, optional): resize factor relative to ``roi``, or to the image's own size; ignored if
+                ``out_size`` is given.
+
+    Returns:
+        np.ndarray: (H, W, 3) uint8.
+    """
+    record_file(path)
+    with Image.open(path) as img:
+        full_w, full_h = img.size
+        roi_w, roi_h = (full_w, full_h) if roi is None else (roi[2] - roi[0], roi[3] - roi[1])
+        if out_size is None and scale is not None:
+            out_size = (max(1, int(round(roi_w * scale))), max(1, int(round(roi_h * scale))))
+        if out_size is not None and out_size[0] < roi_w:
+            ratio = out_size[0] / roi_w
+            img.draft("RGB", (max(1, int(full_w * ratio)), max(1, int(full_h * ratio))))
+        if roi is not None:
+            draft_ratio = img.size[0] / full_w
+            img = img.crop(tuple(int(round(c * draft_ratio)) for c in roi))
+        img = img.convert("RGB")
+        if out_size is not None and img.size != tuple(out_size):
+            img = img.resize(tuple(out_size), Image.BILINEAR, reducing_gap=2.0)
+        return np.asarray(img, dtype=np.uint8)
+
+
+def square_box(points2d, margin=0.2):
+    # square (x0, y0, x1, y1) around the points, enlarged by margin on each side
+    center = (points2d.min(0) + points2d.max(0)) / 2
+    side = (points2d.max(0) - points2d.min(0)).max() * (1 + 2 * margin)
+    x0, y0 = np.round(center - side / 2).astype(np.int64)
+    side = max(int(np.round(side)), 1)
+    return (int(x0), int(y0), int(x0) + side, int(y0) + side)
+
+
+def transf_points(points3d, transf):
+    rot = transf[:3, :3]
+    tsl = transf[:3, 3]
+    return (rot @ points3d.transpose(1, 0)).transpose(1, 0) + tsl
+
+
+def mano_pose_from_general_info(general_info):
+    raw_hand_anno = general_info["hand_anno"]
+
+    raw_hand_pose = (raw_hand_anno["hand_pose"]).reshape((16, 4))  # quat (16, 4)
+    _wrist, _remain = raw_hand_pose[0, :], raw_hand_pose[1:, :]
+    cam_extr = general_info["cam_extr"]  # SE3 (4, 4))
+    extr_R = cam_extr[:3, :3]  # (3, 3)
+
+    wrist_R = extr_R.matmul(quat_to_rotmat(_wrist))  # (3, 3)
+    wrist = rotmat_to_aa(wrist_R).unsqueeze(0).numpy()  # (1, 3)
+    remain = quat_to_aa(_remain).numpy()  # (15, 3)
+    hand_pose = np.concatenate([wrist, remain], axis=0)  # (16, 3)
+
+    return hand_pose.astype(np.float32)
+
+
+def mano_shape_from_general_info(general_info):
+    raw_hand_anno = general_info["hand_anno"]
+    hand_shape = raw_hand_anno["hand_shape"].numpy().astype(np.float32)
+    return hand_shape
+
+
+def batch_mano_pose(hand_pose, cam_extr):
+    """Vectorized ``mano_pose_from_general_info`` over a batch of samples.
+
+    Args:
+        hand_pose (np.ndarray): (B, 16, 4) quaternions, general_info["hand_anno"]["hand_pose"] reshaped.
+        cam_extr (np.ndarray): (B, 4, 4) general_info["cam_extr"].
+
+    Returns:
+        np.ndarray: (B, 16, 3) float32 axis-angle, with the wrist rotated into the camera frame.
+    """
+    wrist_R = np.matmul(cam_extr[:, :3, :3], quat_to_rotmat(hand_pose[:, 0]))  # (B, 3, 3)
+    mano_pose = quat_to_aa(hand_pose)  # (B, 16, 3)
+    mano_pose[:, 0] = rotmat_to_aa(wrist_R)
+    return mano_pose.astype(np.float32)
+
+
+def get_object_path(obj_id, obj_root):
+    mesh_file = os.path.join(obj_root, f"{obj_id}.obj")
+    if not os.path.exists(mesh_file):
+        mesh_file = os.path.join(obj_root, f"{obj_id}.ply")
+    if not os.path.exists(mesh_file):
+        raise FileNotFoundError(f"Cannot found valid object mesh [ .obj | .ply] at {obj_root} for {obj_id}")
+    return mesh_file
 
 
 def load_object_by_id(obj_id, obj_root):
     # load object mesh
+    import trimesh  # deferred: trimesh is slow to import and only needed for mesh files
     try:
-        mesh_file = os.path.join(obj_root, f"{obj_id}.obj")
-        if not os.path.exists(mesh_file):
-            mesh_file = os.path.join(obj_root, f"{obj_id}.ply")
-        if not os.path.exists(mesh_file):
-            raise FileNotFoundError(f"Cannot found valid object mesh [ .obj | .ply] at {obj_root} for {obj_id}")
+        mesh_file = get_object_path(obj_id, obj_root)
+        record_file(mesh_file)
         obj = trimesh.load(mesh_file, process=False, skip_materials=True, force="mesh")
         bbox_center = (obj.vertices.min(0) + obj.vertices.max(0)) / 2
         obj.vertices = obj.vertices - bbox_center
@@ -32,10 +162,12 @@ def load_object_by_id(obj_id, obj_root):
 
 def load_object(obj_root, filename):
     # load object mesh
+    import trimesh
     try:
         mesh_file = os.path.join(obj_root, filename)
         if not os.path.exists(mesh_file):
             raise FileNotFoundError(f"Cannot found valid object mesh file at {obj_root} for {filename}")
+        record_file(mesh_file)
         obj = trimesh.load(mesh_file, process=False, skip_materials=True, force="mesh")
         bbox_center = (obj.vertices.min(0) + obj.vertices.max(0)) / 2
         obj.vertices = obj.vertices - bbox_center
@@ -44,3 +176,742 @@ def load_object(obj_root, filename):
     return obj
 
 
+def bounds_corners(verts):
+    # same corner order as trimesh.bounds.corners
+    bounds = np.stack([verts.min(0), verts.max(0)])
+    return np.stack([
+        bounds[[0, 1, 1, 0, 0, 1, 1, 0], 0],
+        bounds[[0, 0, 1, 1, 0, 0, 1, 1], 1],
+        bounds[[0, 0, 0, 0, 1, 1, 1, 1], 2],
+    ], axis=1)
+
+
+class ObjectRegistry:
+    """Lazily loaded, LRU-bounded object meshes, and a per-object geometry table.
+
+    A mesh is loaded from ``obj_root`` on first access and kept as plain arrays: vertices as float32 (V, 3) and
+    faces as int32 (F, 3). At most ``max_size`` meshes are kept in memory; ``None`` keeps every mesh once loaded.
+
+    When a mesh is registered, its canonical bounding box corners (8, 3), center (3,), extent (3,) and vertex / face
+    counts are stored as one row of a small table that outlives LRU eviction, so ``get_corners`` and
+    ``gather_corners`` never touch the mesh again. With ``cache_dir``, meshes (``meshes/<obj_id>.npz``) and the
+    table (``geometry.npz``) are persisted, keyed on the size and mtime of the mesh file. The table is only written
+    by the constructor, which completes it for every mesh under ``obj_root`` (in the main process, before any
+    DataLoader worker exists); rows registered later, e.g. of a mesh file that changed, stay in memory.
+    """
+
+    GEOMETRY_FIELDS = ("corners", "center", "extent", "n_verts", "n_faces")
+    GEOMETRY_FORMAT = 1
+
+    def __init__(self, obj_root, max_size=None, cache_dir=None):
+        self.obj_root = obj_root
+        self.max_size = max_size
+        self.cache_dir = cache_dir
+        self._meshes = OrderedDict()
+
+        # geometry table: obj_id -> row
+        self._rows = {}
+        self._fingerprints = np.zeros((0, 2), dtype=np.int64)
+        self._geometry = {
+            "corners": np.zeros((0, 8, 3), dtype=np.float32),
+            "center": np.zeros((0, 3), dtype=np.float32),
+            "extent": np.zeros((0, 3), dtype=np.float32),
+            "n_verts": np.zeros((0,), dtype=np.int64),
+            "n_faces": np.zeros((0,), dtype=np.int64),
+        }
+        self._checked = set()  # obj_ids whose table row was validated against the mesh file in this process
+        if cache_dir is not None:
+            self._load_geometry()
+            if not set(self.list_obj_ids()).issubset(self._rows):
+                self._build_geometry()
+
+    @classmethod
+    def from_data_dir(cls, data_dir, max_size=None, use_cache=True):
+        # meshes of image/obj, cached under ~/.cache/OakInkImage/<version>/obj/<md5 of the obj root>
+        obj_root = os.path.join(data_dir, "image", "obj")
+        cache_dir = None
+        if use_cache:
+            root_hash = hashlib.md5(os.path.abspath(obj_root).encode("utf-8")).hexdigest()
+            cache_dir = os.path.join(get_cache_dir("OakInkImage"), "obj", root_hash)
+        return cls(obj_root, max_size=max_size, cache_dir=cache_dir)
+
+    def list_obj_ids(self):
+        return [os.path.splitext(fn)[0] for fn in sorted(os.listdir(self.obj_root))]
+
+    def __len__(self):
+        return len(self._meshes)
+
+    def __contains__(self, obj_id):
+        return obj_id in self._meshes
+
+    def _load_mesh(self, obj_id, fingerprint):
+        mesh_cache = [os.path.join(self.cache_dir, "meshes", f"{obj_id}.npz")] if self.cache_dir is not None else []
+        cached = load_cached_arrays(mesh_cache, fingerprint)
+        if cached is not None:
+            return cached["verts"], cached["faces"]
+        obj = load_object_by_id(obj_id, self.obj_root)
+        verts = np.ascontiguousarray(obj.vertices, dtype=np.float32)
+        faces = np.ascontiguousarray(obj.faces, dtype=np.int32)
+        save_cached_arrays(mesh_cache, fingerprint, verts=verts, faces=faces)
+        return verts, faces
+
+    def get(self, obj_id):
+        mesh = self._meshes.get(obj_id)
+        if mesh is not None:
+            self._meshes.move_to_end(obj_id)
+            return mesh
+        fingerprint = file_fingerprint(get_object_path(obj_id, self.obj_root))
+        mesh = self._load_mesh(obj_id, fingerprint)
+        for arr in mesh:
+            arr.flags.writeable = False  # shared by every caller, copy before modifying
+        self._meshes[obj_id] = mesh
+        if self.max_size is not None and len(self._meshes) > self.max_size:
+            self._meshes.popitem(last=False)
+        self._register_geometry(obj_id, fingerprint, *mesh)
+        return mesh
+
+    def get_verts(self, obj_id):
+        return self.get(obj_id)[0]
+
+    def get_faces(self, obj_id):
+        return self.get(obj_id)[1]
+
+    # region ===== geometry table >>>>>
+    def _register_geometry(self, obj_id, fingerprint, verts, faces):
+        row = self._rows.get(obj_id)
+        if row is not None and np.array_equal(self._fingerprints[row], fingerprint):
+            self._checked.add(obj_id)
+            return row
+        bounds = np.stack([verts.min(0), verts.max(0)])
+        values = {
+            "corners": bounds_corners(verts),
+            "center": bounds.mean(0),
+            "extent": bounds[1] - bounds[0],
+            "n_verts": len(verts),
+            "n_faces": len(faces),
+        }
+        if row is None:
+            row = len(self._fingerprints)
+            self._rows[obj_id] = row
+            self._fingerprints = np.concatenate([self._fingerprints, fingerprint[None]])
+            for field in self.GEOMETRY_FIELDS:
+                arr = self._geometry[field]
+                self._geometry[field] = np.concatenate([arr, np.asarray(values[field], dtype=arr.dtype)[None]])
+        else:
+            self._fingerprints = self._fingerprints.copy()
+            self._fingerprints[row] = fingerprint
+            for field in self.GEOMETRY_FIELDS:
+                self._geometry[field] = self._geometry[field].copy()
+                self._geometry[field][row] = values[field]
+        for arr in self._geometry.values():
+            arr.flags.writeable = False  # rows are handed out as views
+        self._checked.add(obj_id)
+        return row
+
+    def _geometry_path(self):
+        return os.path.join(self.cache_dir, "geometry.npz")
+
+    def _load_geometry(self):
+        cached = load_cached_arrays([self._geometry_path()], np.array([self.GEOMETRY_FORMAT]))
+        if cached is None:
+            return
+        self._rows = {obj_id: row for row, obj_id in enumerate(cached["obj_ids"].tolist())}
+        self._fingerprints = cached["fingerprints"]
+        for field in self.GEOMETRY_FIELDS:
+            self._geometry[field] = cached[field]
+            self._geometry[field].flags.writeable = False
+
+    def _build_geometry(self):
+        # rows of the meshes missing from the table, then one atomic write of the full table; meshes are read (from
+        # their cache when possible) without entering the LRU
+        for obj_id in self.list_obj_ids():
+            if obj_id in self._rows:
+                continue
+            fingerprint = file_fingerprint(get_object_path(obj_id, self.obj_root))
+            self._register_geometry(obj_id, fingerprint, *self._load_mesh(obj_id, fingerprint))
+        self._save_geometry()
+
+    def _save_geometry(self):
+        if self.cache_dir is None:
+            return
+        obj_ids = np.array(sorted(self._rows, key=self._rows.get), dtype=str)
+        save_cached_arrays([self._geometry_path()],
+                           np.array([self.GEOMETRY_FORMAT]),
+                           obj_ids=obj_ids,
+                           fingerprints=self._fingerprints,
+                           **self._geometry)
+
+    def geometry_row(self, obj_id):
+        # table row of obj_id; the mesh is only loaded when the object is unknown or its file changed
+        row = self._rows.get(obj_id)
+        if row is not None and obj_id in self._checked:
+            return row
+        if row is not None:
+            fingerprint = file_fingerprint(get_object_path(obj_id, self.obj_root))
+            if np.array_equal(self._fingerprints[row], fingerprint):
+                self._checked.add(obj_id)
+                return row
+        self._meshes.pop(obj_id, None)
+        self.get(obj_id)
+        return self._rows[obj_id]
+
+    def get_geometry(self, obj_id):
+        row = self.geometry_row(obj_id)
+        return {field: arr[row] for field, arr in self._geometry.items()}
+
+    def get_corners(self, obj_id):
+        return self._geometry["corners"][self.geometry_row(obj_id)]
+
+    def gather_corners(self, obj_ids):
+        # (B, 8, 3) canonical corners of a batch, one fancy-indexed read of the table
+        rows = np.array([self.geometry_row(obj_id) for obj_id in obj_ids], dtype=np.int64)
+        return self._geometry["corners"][rows]
+
+    # endregion <<<<<
+
+
+class ObjectMeshMapping(Mapping):
+    """Read-only ``obj_id -> trimesh.Trimesh`` view of an ``ObjectRegistry``, the former ``obj_mapping`` dict.
+
+    Meshes are built on access from the registry's arrays, so they follow its LRU bound instead of all being held;
+    modifying a returned mesh does not change the registry. ``obj_ids`` defaults to every mesh under ``obj_root``.
+    """
+
+    def __init__(self, registry, obj_ids=None):
+        self.registry = registry
+        if obj_ids is None:
+            obj_ids = registry.list_obj_ids()
+        self.obj_ids = list(obj_ids)
+        self._obj_id_set = set(self.obj_ids)
+
+    def __getitem__(self, obj_id):
+        if obj_id not in self._obj_id_set:
+            raise KeyError(obj_id)
+        import trimesh
+        verts, faces = self.registry.get(obj_id)
+        return trimesh.Trimesh(vertices=verts.copy(), faces=faces.copy(), process=False)
+
+    def __contains__(self, obj_id):
+        return obj_id in self._obj_id_set
+
+    def __iter__(self):
+        return iter(self.obj_ids)
+
+    def __len__(self):
+        return len(self.obj_ids)
+
+
+def handover_info_map(info_index, partner_idx):
+    # the former handover_info dict: (seq_id, sub_id, frame_id, view_id) -> the partner's tuple, from partner_idx
+    return {tuple(info_index[i]): tuple(info_index[int(partner_idx[i])]) for i in np.flatnonzero(partner_idx >= 0)}
+
+
+ANNO_STORE_FIELDS = {
+    "cam_intr": (3, 3),
+    "hand_j": (21, 3),
+    "hand_v": (778, 3),
+    "obj_transf": (4, 4),
+}
+
+# columns derived from general_info rather than copied from a per-sample pickle
+ANNO_STORE_GENERAL_INFO_FIELDS = {
+    "mano_pose": (16, 3),
+    "mano_shape": (10,),
+    "cam_extr": (4, 4),
+}
+
+
+class AnnoStore:
+    """Columnar annotation store.
+
+    Each field is a single contiguous ``<field>.npy`` array under ``image/anno_columnar``, whose rows are aligned
+    with the sample order of ``image/anno/seq_all.json``. Arrays are opened lazily with ``mmap_mode="r"``, so a
+    per-sample read is a zero-copy slice instead of an open + unpickle of a tiny file.
+    Build it once with ``dev/pack_oakink_image_columnar.py``. Columns may be missing from a store packed by an older
+    version (e.g. ``mano_pose``), check with ``has`` before relying on an optional one.
+
+    ``meta.json`` records the row count and the fingerprint of the ``seq_all.json`` the store was packed from; it is
+    written last, so a store whose packing was interrupted has none. ``open`` only returns a store whose metadata
+    matches the current ``seq_all.json`` and which holds every column of ``ANNO_STORE_FIELDS``, otherwise the
+    loaders fall back to the per-sample pickles.
+    """
+
+    META_FILE = "meta.json"
+
+    def __init__(self, store_dir, n_rows):
+        self.store_dir = store_dir
+        self.n_rows = n_rows
+        self._columns = {}
+        self._present = {}
+
+    @staticmethod
+    def get_store_dir(data_dir):
+        return os.path.join(data_dir, "image", "anno_columnar")
+
+    @staticmethod
+    def get_meta(data_dir):
+        # metadata of a store packed from the current seq_all.json
+        seq_all_path = os.path.join(data_dir, "image", "anno", "seq_all.json")
+        return {"seq_all": file_fingerprint(seq_all_path).tolist()}
+
+    @classmethod
+    def write_meta(cls, data_dir, n_rows):
+        store_dir = cls.get_store_dir(data_dir)
+        meta = dict(cls.get_meta(data_dir), n_rows=n_rows)
+        tmp_path = os.path.join(store_dir, f"{cls.META_FILE}.{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(store_dir, cls.META_FILE))
+
+    @classmethod
+    def read_meta(cls, data_dir):
+        meta_path = os.path.join(cls.get_store_dir(data_dir), cls.META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, "r") as f:
+            return json.load(f)
+
+    @classmethod
+    def open(cls, data_dir):
+        store_dir = cls.get_store_dir(data_dir)
+        if not os.path.isdir(store_dir):
+            return None
+        meta = cls.read_meta(data_dir)
+        if meta is None:
+            warnings.warn(f"ignoring {store_dir}: no {cls.META_FILE}, the store is incomplete or was packed by an "
+                          "older version, rerun dev/pack_oakink_image_columnar.py")
+            return None
+        if any(meta.get(k) != v for k, v in cls.get_meta(data_dir).items()):
+            warnings.warn(f"ignoring {store_dir}: packed from another seq_all.json, "
+                          "rerun dev/pack_oakink_image_columnar.py")
+            return None
+        store = cls(store_dir, meta["n_rows"])
+        missing = [field for field in ANNO_STORE_FIELDS if not store.has(field)]
+        if len(missing) > 0:
+            warnings.warn(f"ignoring {store_dir}: missing or truncated columns {', '.join(missing)}")
+            return None
+        return store
+
+    def has(self, field):
+        # a column counts as present only if it holds one row per sample
+        present = self._present.get(field)
+        if present is None:
+            col_path = os.path.join(self.store_dir, f"{field}.npy")
+            try:
+                present = os.path.exists(col_path) and len(np.load(col_path, mmap_mode="r")) == self.n_rows
+            except (OSError, ValueError):
+                present = False
+            self._present[field] = present
+        return present
+
+    def column(self, field):
+        col = self._columns.get(field)
+        if col is None:
+            col = np.load(os.path.join(self.store_dir, f"{field}.npy"), mmap_mode="r")
+            self._columns[field] = col
+        return col
+
+    def get(self, field, pos):
+        return self.column(field)[pos]
+
+    def positions(self, data_dir, info_index):
+        # map each sample to its row in seq_all.json
+        seq_all = InfoIndex.from_info_list(json.load(open(os.path.join(data_dir, "image", "anno", "seq_all.json"))))
+        return info_positions(info_index, seq_all)
+
+    def reopen(self):
+        # drop maps inherited from another process, columns are reopened on next access
+        self._columns = {}
+        self._present = {}
+
+    def __getstate__(self):
+        # memory maps are not carried across pickling (e.g. into DataLoader workers), they are reopened on demand
+        state = self.__dict__.copy()
+        state["_columns"] = {}
+        return state
+
+
+def load_cached_arrays(cache_paths, fingerprint):
+    # first .npz among cache_paths whose stored fingerprint matches, as a dict of arrays
+    for cache_path in cache_paths:
+        if not os.path.exists(cache_path):
+            continue
+        record_file(cache_path)
+        with np.load(cache_path) as cache_file:
+            if np.array_equal(cache_file["fingerprint"], fingerprint):
+                return {k: cache_file[k] for k in cache_file.files if k != "fingerprint"}
+    return None
+
+
+def save_cached_arrays(cache_paths, fingerprint, **arrays):
+    # atomically write to the first writable location among cache_paths
+    for cache_path in cache_paths:
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp.npz"
+            np.savez(tmp_path, fingerprint=fingerprint, **arrays)
+            os.replace(tmp_path, cache_path)
+            return cache_path
+        except OSError:
+            continue
+    return None
+
+
+class InfoIndex:
+    """Compact, array-backed sample index.
+
+    Stands in for the list of ``[seq_id, sub_id, frame_id, view_id]`` items: seq ids are interned as int codes
+    into one fixed-width string array and the other fields are int arrays. Holding no per-sample Python objects,
+    its pages are never touched by refcounting, so forked DataLoader workers keep sharing them instead of copying.
+    ``info_list[idx]`` still returns ``[seq_id, sub_id, frame_id, view_id]``.
+    """
+
+    def __init__(self, seq_names, seq_codes, sub_ids, frame_ids, view_ids):
+        self.seq_names = seq_names
+        self.seq_codes = seq_codes
+        self.sub_ids = sub_ids
+        self.frame_ids = frame_ids
+        self.view_ids = view_ids
+
+    @classmethod
+    def from_info_list(cls, info_list):
+        code_of = {}
+        seq_codes = np.array([code_of.setdefault(info[0], len(code_of)) for info in info_list], dtype=np.int32)
+        return cls(
+            seq_names=np.array(list(code_of), dtype=str),
+            seq_codes=seq_codes,
+            sub_ids=np.array([info[1] for info in info_list], dtype=np.int32),
+            frame_ids=np.array([info[2] for info in info_list], dtype=np.int32),
+            view_ids=np.array([info[3] for info in info_list], dtype=np.int32),
+        )
+
+    def __len__(self):
+        return len(self.seq_codes)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        return [
+            str(self.seq_names[self.seq_codes[idx]]),
+            int(self.sub_ids[idx]),
+            int(self.frame_ids[idx]),
+            int(self.view_ids[idx]),
+        ]
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def tolist(self):
+        return list(self)
+
+    def get_seq_id(self, idx):
+        return str(self.seq_names[self.seq_codes[idx]])
+
+    def get_info_str(self, idx):
+        return "__".join([str(x) for x in self[idx]]).replace("/", "__")
+
+
+class InfoStrView:
+    """Lazy ``info_str_list``: info strings are derived from an ``InfoIndex`` on access."""
+
+    def __init__(self, info_index):
+        self.info_index = info_index
+
+    def __len__(self):
+        return len(self.info_index)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        return self.info_index.get_info_str(idx)
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+
+def info_positions(info_index, ref_index):
+    """Row of each sample of ``info_index`` in ``ref_index`` (e.g. seq_all.json), vectorized over samples."""
+    ref_code_of = {str(seq_id): code for code, seq_id in enumerate(ref_index.seq_names)}
+    seq_map = np.array([ref_code_of[str(seq_id)] for seq_id in info_index.seq_names], dtype=np.int64)
+    n_sub = int(max(ref_index.sub_ids.max(initial=0), info_index.sub_ids.max(initial=0))) + 1
+    n_frame = int(max(ref_index.frame_ids.max(initial=0), info_index.frame_ids.max(initial=0))) + 1
+
+    def _key(seq_codes, index):
+        return ((seq_codes * n_sub + index.sub_ids) * n_frame + index.frame_ids) * 4 + index.view_ids
+
+    ref_keys = _key(ref_index.seq_codes.astype(np.int64), ref_index)
+    keys = _key(seq_map[info_index.seq_codes], info_index)
+    order = np.argsort(ref_keys, kind="stable")
+    found = np.minimum(np.searchsorted(ref_keys[order], keys), max(len(ref_keys) - 1, 0))
+    assert np.array_equal(ref_keys[order][found], keys), "sample not found in reference index"
+    return order[found].astype(np.int64)
+
+
+def handover_partner_index(info_index):
+    """Index of the other subject's sample in the same handover frame and view, -1 when there is none.
+
+    Args:
+        info_index (InfoIndex): samples to pair.
+
+    Returns:
+        np.ndarray: (N,) int64 partner_idx.
+    """
+    seq_is_handover = np.array([seq_id.split("/")[0].split("_")[1] == "0004" for seq_id in info_index.seq_names],
+                               dtype=bool)
+    is_handover = seq_is_handover[info_index.seq_codes]
+    sub_ids = info_index.sub_ids.astype(np.int64)
+    frame_ids = info_index.frame_ids.astype(np.int64)
+    view_ids = info_index.view_ids.astype(np.int64)
+
+    n_frame = int(frame_ids.max()) + 1 if len(frame_ids) > 0 else 1
+
+    def _key(sub):
+        return ((info_index.seq_codes.astype(np.int64) * 2 + sub) * n_frame + frame_ids) * 4 + view_ids
+
+    keys = _key(sub_ids)
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    alt_keys = _key(1 - sub_ids)  # flip sub_id to get alt_sub_id
+    found = np.minimum(np.searchsorted(sorted_keys, alt_keys), max(len(keys) - 1, 0))
+    partner_idx = np.where(is_handover & (sorted_keys[found] == alt_keys), order[found], -1).astype(np.int64)
+    # sanity check: every handover sample has its alt sample
+    missing = np.flatnonzero(is_handover & (partner_idx < 0))
+    assert len(missing) == 0, f"handover sample {missing[0]} has no alt sample"
+    return partner_idx
+
+
+class SeqViewIndex:
+    """Inverted index of ``seq_all.json``: (seq_id, view_id) -> sample rows sorted by (sub_id, frame_id).
+
+    Built once and persisted as ``image/anno/seq_view_index.npz`` (or in ``~/.cache`` when the dataset is
+    read-only); it is rebuilt when ``seq_all.json`` changes.
+    """
+
+    FILENAME = "seq_view_index.npz"
+
+    def __init__(self, seq_ids, view_ids, offsets, positions, sub_ids, frame_ids):
+        self.seq_ids = seq_ids
+        self.view_ids = view_ids
+        self.offsets = offsets  # key k owns rows offsets[k]:offsets[k + 1] of the arrays below
+        self.positions = positions
+        self.sub_ids = sub_ids
+        self.frame_ids = frame_ids
+        self._key_of = {(str(seq_id), int(view_id)): k for k, (seq_id, view_id) in enumerate(zip(seq_ids, view_ids))}
+
+    def __len__(self):
+        return len(self._key_of)
+
+    def keys(self):
+        return list(self._key_of.keys())
+
+    def get(self, seq_id, view_id):
+        """Returns: (positions, sub_ids, frame_ids) of the samples of one sequence in one view."""
+        k = self._key_of[(seq_id, view_id)]
+        rows = slice(self.offsets[k], self.offsets[k + 1])
+        return self.positions[rows], self.sub_ids[rows], self.frame_ids[rows]
+
+    @classmethod
+    def build(cls, info_list_all):
+        rows = {}
+        for pos, info in enumerate(info_list_all):
+            rows.setdefault((info[0], info[3]), []).append(pos)
+        keys = sorted(rows.keys())
+        offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        positions = []
+        for k, key in enumerate(keys):
+            # deal with two hand cases.
+            key_pos = sorted(rows[key], key=lambda pos: info_list_all[pos][1] * 1000 + info_list_all[pos][2])
+            positions.extend(key_pos)
+            offsets[k + 1] = len(positions)
+        positions = np.array(positions, dtype=np.int64)
+        return cls(
+            seq_ids=np.array([key[0] for key in keys]),
+            view_ids=np.array([key[1] for key in keys], dtype=np.int64),
+            offsets=offsets,
+            positions=positions,
+            sub_ids=np.array([info_list_all[pos][1] for pos in positions], dtype=np.int64),
+            frame_ids=np.array([info_list_all[pos][2] for pos in positions], dtype=np.int64),
+        )
+
+    @classmethod
+    def load(cls, data_dir):
+        seq_all_path = os.path.join(data_dir, "image", "anno", "seq_all.json")
+        fingerprint = file_fingerprint(seq_all_path)
+        cache_paths = [
+            os.path.join(data_dir, "image", "anno", cls.FILENAME),
+            os.path.join(get_cache_dir("OakInkImage"), cls.FILENAME),
+        ]
+        arrays = load_cached_arrays(cache_paths, fingerprint)
+        if arrays is not None:
+            return cls(**arrays)
+
+        index = cls.build(json.load(open(seq_all_path)))
+        save_cached_arrays(cache_paths,
+                           fingerprint,
+                           seq_ids=index.seq_ids,
+                           view_ids=index.view_ids,
+                           offsets=index.offsets,
+                           positions=index.positions,
+                           sub_ids=index.sub_ids,
+                           frame_ids=index.frame_ids)
+        return index
+
+
+def _has_mano_columns(ds):
+    store = ds._anno_store
+    return store is not None and store.has("mano_pose") and store.has("mano_shape")
+
+
+def _mano_params_deps(ds):
+    # the columnar store path reads no pickle, the pickle path shares the general_info read with other fields
+    return () if _has_mano_columns(ds) else ("general_info",)
+
+
+def _get_mano_params(ds, idx, general_info=None):
+    # (mano_pose, mano_shape): two slices of the columnar store, or converted from the given general_info
+    if general_info is None:
+        pos = ds._anno_pos[idx]
+        return ds._anno_store.get("mano_pose", pos), ds._anno_store.get("mano_shape", pos)
+    return mano_pose_from_general_info(general_info), mano_shape_from_general_info(general_info)
+
+
+# field: (dependencies, compute(dataset, idx, *dependencies)), dependencies may be a function of the dataset
+SAMPLE_FIELDS = {
+    "image": ((), lambda ds, idx: ds.get_image(idx)),
+    "cam_intr": ((), lambda ds, idx: ds.get_cam_intr(idx)),
+    "cam_extr": ((), lambda ds, idx: ds.get_cam_extr(idx)),
+    "joints_3d": ((), lambda ds, idx: ds.get_joints_3d(idx)),
+    "verts_3d": ((), lambda ds, idx: ds.get_verts_3d(idx)),
+    "joints_2d": (("joints_3d", "cam_intr"), lambda ds, idx, joints_3d, cam_intr: persp_project(joints_3d, cam_intr)),
+    "verts_2d": (("verts_3d", "cam_intr"), lambda ds, idx, verts_3d, cam_intr: persp_project(verts_3d, cam_intr)),
+    "general_info": ((), lambda ds, idx: ds._load_pkl("general_info", idx)),
+    "mano_params": (_mano_params_deps, _get_mano_params),
+    "mano_pose": (("mano_params",), lambda ds, idx, mano_params: mano_params[0]),
+    "mano_shape": (("mano_params",), lambda ds, idx, mano_params: mano_params[1]),
+    "obj_id": ((), lambda ds, idx: ds.get_obj_idx(idx)),
+    "obj_transf": ((), lambda ds, idx: ds.get_obj_transf(idx)),
+    "obj_mesh": (("obj_id",), lambda ds, idx, obj_id: ds.obj_registry.get(obj_id)),  # shared, read-only
+    "obj_verts_can": (("obj_mesh",), lambda ds, idx, mesh: mesh[0].copy()),
+    "obj_faces": (("obj_mesh",), lambda ds, idx, mesh: mesh[1].copy()),
+    "obj_verts_3d": (("obj_mesh", "obj_transf"), lambda ds, idx, mesh, transf: transf_points(mesh[0], transf)),
+    "obj_verts_2d": (("obj_verts_3d", "cam_intr"), lambda ds, idx, verts_3d, intr: persp_project(verts_3d, intr)),
+    "corners_can": (("obj_id",), lambda ds, idx, obj_id: ds.obj_registry.get_corners(obj_id).copy()),
+    "corners_3d": (("obj_id", "obj_transf"),
+                   lambda ds, idx, obj_id, transf: transf_points(ds.obj_registry.get_corners(obj_id), transf)),
+    "corners_2d": (("corners_3d", "cam_intr"), lambda ds, idx, corners_3d, intr: persp_project(corners_3d, intr)),
+    "sample_status": ((), lambda ds, idx: ds.get_sample_status(idx)),
+}
+
+
+def _resolve_fields(table, dataset, key, fields, resolved=None):
+    resolved = {} if resolved is None else resolved
+
+    def _resolve(field):
+        if field in resolved:
+            return resolved[field]
+        if field not in table:
+            raise KeyError(f"unknown field {field}, choose from {list(table)}")
+        deps, compute = table[field]
+        if callable(deps):
+            deps = deps(dataset)
+        resolved[field] = compute(dataset, key, *[_resolve(dep) for dep in deps])
+        return resolved[field]
+
+    return {field: _resolve(field) for field in fields}
+
+
+def resolve_sample_fields(dataset, idx, fields, resolved=None):
+    """Compute ``fields`` of sample ``idx``, each shared dependency (file read, projection) exactly once."""
+    return _resolve_fields(SAMPLE_FIELDS, dataset, idx, fields, resolved)
+
+
+def batch_transf_points(points3d, transf):
+    # points3d (B, N, 3), transf (B, 4, 4)
+    return np.einsum("bij,bnj->bni", transf[:, :3, :3], points3d) + transf[:, None, :3, 3]
+
+
+def packed_transf_points(points3d, offsets, transf):
+    # points3d (sum(N_b), 3) packed by offsets (B + 1,), transf (B, 4, 4): each transform repeated over its segment,
+    # then one einsum for the whole batch
+    transf = np.repeat(transf[:, :3], np.diff(offsets), axis=0)  # (sum(N_b), 3, 4)
+    return np.einsum("nij,nj->ni", transf[:, :, :3], points3d) + transf[:, :, 3]
+
+
+def packed_persp_project(points3d, offsets, cam_intr):
+    # points3d (sum(N_b), 3) packed by offsets (B + 1,), cam_intr (B, 3, 3): projected segment by segment into one
+    # float32 buffer
+    out = np.empty((len(points3d), 2), dtype=np.float32)
+    for b in range(len(offsets) - 1):
+        seg = slice(offsets[b], offsets[b + 1])
+        persp_project(points3d[seg], cam_intr[b], out=out[seg])
+    return out
+
+
+def pack_arrays(arrays):
+    offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(arr) for arr in arrays])
+    return np.concatenate(arrays, axis=0), offsets
+
+
+def progression_slice(positions):
+    # slice equivalent to positions if they form an increasing arithmetic progression, else None
+    if len(positions) == 0:
+        return None
+    if len(positions) == 1:
+        return slice(positions[0], positions[0] + 1)
+    step = positions[1] - positions[0]
+    if step <= 0 or not np.all(np.diff(positions) == step):
+        return None
+    return slice(positions[0], positions[-1] + 1, step)
+
+
+def gather_anno(dataset, field, getter, indices):
+    # one read from the columnar store (a strided slice when rows are evenly spaced, e.g. a clip), or stacked
+    # per-sample reads
+    if dataset._anno_store is not None and dataset._anno_store.has(field):
+        positions = dataset._anno_pos[indices]
+        rows = progression_slice(positions)
+        if rows is not None:
+            return np.array(dataset._anno_store.column(field)[rows])
+        return dataset._anno_store.column(field)[positions]
+    return np.stack([getter(idx) for idx in indices]).astype(np.float32)
+
+
+def _get_obj_meshes(ds, indices, obj_ids):
+    return [ds.obj_registry.get(obj_id) for obj_id in obj_ids]
+
+
+# field: (dependencies, compute(dataset, indices, *dependencies)), for OakInkImage.get_batch
+BATCH_FIELDS = {
+    "image": ((), lambda ds, idxs: np.stack([ds.get_image(idx) for idx in idxs])),
+    "cam_intr": ((), lambda ds, idxs: gather_anno(ds, "cam_intr", ds.get_cam_intr, idxs)),
+    "cam_extr": ((), lambda ds, idxs: gather_anno(ds, "cam_extr", ds.get_cam_extr, idxs)),
+    "joints_3d": ((), lambda ds, idxs: gather_anno(ds, "hand_j", ds.get_joints_3d, idxs)),
+    "verts_3d": ((), lambda ds, idxs: gather_anno(ds, "hand_v", ds.get_verts_3d, idxs)),
+    "joints_2d": (("joints_3d", "cam_intr"), lambda ds, idxs, joints_3d, intr: persp_project(joints_3d, intr)),
+    "verts_2d": (("verts_3d", "cam_intr"), lambda ds, idxs, verts_3d, intr: persp_project(verts_3d, intr)),
+    "mano_pose": ((), lambda ds, idxs: gather_anno(ds, "mano_pose", ds.get_mano_pose, idxs)),
+    "mano_shape": ((), lambda ds, idxs: gather_anno(ds, "mano_shape", ds.get_mano_shape, idxs)),
+    "obj_id": ((), lambda ds, idxs: [ds.get_obj_idx(idx) for idx in idxs]),
+    "obj_transf": ((), lambda ds, idxs: gather_anno(ds, "obj_transf", ds.get_obj_transf, idxs)),
+    "obj_meshes": (("obj_id",), _get_obj_meshes),
+    "obj_verts_can": (("obj_meshes",), lambda ds, idxs, meshes: pack_arrays([m[0] for m in meshes])[0]),
+    "obj_verts_offsets": (("obj_meshes",), lambda ds, idxs, meshes: pack_arrays([m[0] for m in meshes])[1]),
+    "obj_faces": (("obj_meshes",), lambda ds, idxs, meshes: pack_arrays([m[1] for m in meshes])[0]),
+    "obj_faces_offsets": (("obj_meshes",), lambda ds, idxs, meshes: pack_arrays([m[1] for m in meshes])[1]),
+    "obj_verts_3d": (("obj_verts_can", "obj_verts_offsets", "obj_transf"),
+                     lambda ds, idxs, verts, offsets, transf: packed_transf_points(verts, offsets, transf)),
+    "obj_verts_2d": (("obj_verts_3d", "obj_verts_offsets", "cam_intr"),
+                     lambda ds, idxs, verts_3d, offsets, intr: packed_persp_project(verts_3d, offsets, intr)),
+    "corners_can": (("obj_id",), lambda ds, idxs, obj_ids: ds.obj_registry.gather_corners(obj_ids)),
+    "corners_3d": (("corners_can", "obj_transf"), lambda ds, idxs, corners, T: batch_transf_points(corners, T)),
+    "corners_2d": (("corners_3d", "cam_intr"), lambda ds, idxs, corners_3d, K: persp_project(corners_3d, K)),
+    "sample_status": ((), lambda ds, idxs: [ds.get_sample_status(idx) for idx in idxs]),
+}
+
+
+def resolve_batch_fields(dataset, indices, fields, resolved=None):
+    """Batched counterpart of ``resolve_sample_fields``; see ``OakInkImage.get_batch``."""
+    return _resolve_fields(BATCH_FIELDS, dataset, indices, fields, resolved)
@@ -1,27 +1,37 @@
+import bisect
 import hashlib
 import os
 import re
+import shutil
 import json
+import warnings
 import numpy as np
-import torch
-import trimesh
-import pickle
-from manotorch.manolayer import ManoLayer, MANOOutput
+from concurrent.futures import ThreadPoolExecutor
 from oikit import __version__ as oikit_version
-from oikit.common import suppress_trimesh_logging
+from oikit.common import get_cache_dir, load_array_dir, save_array_dir, suppress_trimesh_logging
+from oikit.instrument import instrumented, record_file, timed
 from oikit.oi_shape.utils import (
     ALL_CAT,
     ALL_INTENT,
     ALL_SPLIT,
     CENTER_IDX,
+    GraspColumns,
+    category_fingerprint,
+    category_quick_key,
     check_valid,
     get_hand_parameter,
     get_obj_path,
+    get_peak_rss,
+    grasp_split,
     to_list,
 )
-from tqdm import tqdm
 
+CACHE_FORMAT = 2  # bump when the layout of the cached grasp list changes
+MANO_BYTES_PER_GRASP = 256 << 10  # rough peak of the MANO layer's intermediates for one grasp
+SEQ_CAT_MATCHER = re.compile(r"(.+)/(.{6})_(.{4})_([_0-9]+)/([\-0-9]+)")
 
+
+@instrumented
 class OakInkShape:
 
     def __init__(
@@ -31,13 +41,20 @@ class OakInkShape:
         category=ALL_CAT,
         mano_assets_root="assets/mano_v1_2",
         use_cache=True,
+        verify_cache=False,
         use_downsample_mesh=False,
         preload_obj=False,
+        scan_workers=8,
+        mano_mem_budget=1 << 30,
+        mano_threads=None,
     ):
         self.name = "OakInkShape"
         self.use_downsample_mesh = use_downsample_mesh
         self.use_cache = use_cache
+        # fingerprint every category file even when the category's quick key is unchanged, see _category_fingerprints
+        self.verify_cache = verify_cache
         self.preload_obj = preload_obj
+        self.scan_workers = scan_workers
 
         assert 'OAKINK_DIR' in os.environ, "environment variable 'OAKINK_DIR' is not set"
         data_dir = os.path.join(os.environ['OAKINK_DIR'], "shape")
@@ -63,57 +80,71 @@ class OakInkShape:
 
         self.intent_idx = [ALL_INTENT[i] for i in self.intent_mode]
 
-        self.mano_layer = ManoLayer(center_idx=0, mano_assets_root=mano_assets_root)
+        self.mano_assets_root = mano_assets_root
+        self._mano_layer = None
+        # MANO forward of _prepare_data: bytes of intermediates per chunk, torch intra-op threads (None: unchanged)
+        self.mano_mem_budget = mano_mem_budget
+        self.mano_threads = mano_threads
 
         if use_cache is True:
+            # the cache of a filter combination is keyed on the fingerprints of its categories' files, and assembled
+            # from per-category caches: only categories that are new or whose files changed are scanned again
+            fingerprints = self._category_fingerprints()
             cache_identifier_dict = {
+                "format": CACHE_FORMAT,
                 "version": oikit_version,
                 "data_split": self.data_split,
                 "categories": self.categories,
-                "intent_mode": self.intent_mode
+                "intent_mode": self.intent_mode,
+                "fingerprints": fingerprints,
             }
             cache_identifier_raw = json.dumps(cache_identifier_dict, sort_keys=True)
             cache_identifier = hashlib.md5(cache_identifier_raw.encode("ascii")).hexdigest()
-            cache_path = os.path.join(os.path.expanduser('~'), ".cache", self.name, oikit_version,
-                                      f"{cache_identifier}.pkl")
-            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
-            if os.path.exists(cache_path):
-                print(f"{self.name} loading cache from {cache_path}")
-                with open(cache_path, "rb") as p_f:
-                    cache = pickle.load(p_f)
-                self.grasp_list = cache["grasp_list"]
+            # columnar cache: one memory-mapped .npy per field, see GraspColumns
+            cache_dir = os.path.join(get_cache_dir(self.name), cache_identifier)
+            if not os.path.isdir(cache_dir):
+                os.makedirs(os.path.dirname(cache_dir), exist_ok=True)
+                save_array_dir(cache_dir, **GraspColumns.pack(self._assemble_data(fingerprints), oi_shape_dir))
+                print(f"{self.name} cache saved to {cache_dir}")
             else:
-                self.grasp_list = self._prepare_data()
-                cache = {"grasp_list": self.grasp_list}
-                with open(cache_path, "wb") as f:
-                    pickle.dump(cache, f)
-                print(f"{self.name} cache saved to {cache_path}")
+                print(f"{self.name} loading cache from {cache_dir}")
+            self.grasp_list = GraspColumns(load_array_dir(cache_dir), oi_shape_dir)
         else:
             self.grasp_list = self._prepare_data()
 
         # * >>>> create obj warehouse
         self.obj_warehouse = {}
-        self.obj_id_set = {g["obj_id"] for g in self.grasp_list}
+        if isinstance(self.grasp_list, GraspColumns):
+            self.obj_id_set = set(self.grasp_list.unique("obj_id"))
+        else:
+            self.obj_id_set = {g["obj_id"] for g in self.grasp_list}
         if preload_obj is True:
+            import trimesh
+            from tqdm import tqdm
             suppress_trimesh_logging()
             for oid in tqdm(self.obj_id_set, desc="oikit preLoad obj model"):
                 obj_path = get_obj_path(oid, data_dir, meta_dir, use_downsample=use_downsample_mesh)
+                record_file(obj_path)
                 obj_trimesh = trimesh.load(obj_path, process=False, force="mesh", skip_materials=True)
                 bbox_center = (obj_trimesh.vertices.min(0) + obj_trimesh.vertices.max(0)) / 2
                 obj_trimesh.vertices = obj_trimesh.vertices - bbox_center
                 self.obj_warehouse[oid] = obj_trimesh
 
-    def _prepare_data(self):
-        # region ===== filter with regex >>>>>
+    @property
+    def mano_layer(self):
+        # built on first use, so that loading from cache never imports torch / manotorch
+        if self._mano_layer is None:
+            from manotorch.manolayer import ManoLayer
+            self._mano_layer = ManoLayer(center_idx=0, mano_assets_root=self.mano_assets_root)
+        return self._mano_layer
+
+    def _scan_subtree(self, cat, obj_dir, filtered=True):
+        # grasps under one source object dir, in os.walk order, of the selected intents and splits if filtered
         grasp_list = []
-        category_begin_idx = []
-        seq_cat_matcher = re.compile(r"(.+)/(.{6})_(.{4})_([_0-9]+)/([\-0-9]+)")
-        for cat in tqdm(self.categories, desc="Process categories"):
-            real_matcher = re.compile(rf"({cat}/(.{{6}})/.{{10}})/hand_param\.pkl$")
-            virtual_matcher = re.compile(rf"({cat}/(.{{6}})/.{{10}})/(.{{6}})/hand_param\.pkl$")
-            path = os.path.join(self.oi_shape_dir, cat)
-            category_begin_idx.append(len(grasp_list))
-            for cur, dirs, files in os.walk(path, followlinks=False):
+        real_matcher = re.compile(rf"({cat}/(.{{6}})/.{{10}})/hand_param\.pkl$")
+        virtual_matcher = re.compile(rf"({cat}/(.{{6}})/.{{10}})/(.{{6}})/hand_param\.pkl$")
+        with timed(f"OakInkShape.scan[{cat}]"):
+            for cur, dirs, files in os.walk(obj_dir, followlinks=False):
                 dirs.sort()
                 for f in files:
                     re_match = virtual_matcher.findall(os.path.join(cur, f))
@@ -122,23 +153,18 @@ class OakInkShape:
                     if len(re_match) > 0:
                         # ? regex should return : [(path, raw_oid, tag, [oid])]
                         assert len(re_match) == 1, "regex should return only one match"
-                        source = open(os.path.join(self.oi_shape_dir, re_match[0][0], "source.txt")).read()
-                        grasp_cat_match = seq_cat_matcher.findall(source)[0]
+                        source_path = os.path.join(self.oi_shape_dir, re_match[0][0], "source.txt")
+                        record_file(source_path)
+                        source = open(source_path).read()
+                        grasp_cat_match = SEQ_CAT_MATCHER.findall(source)[0]
                         pass_stage, raw_obj_id, action_id, subject_id, seq_ts = (grasp_cat_match[0], grasp_cat_match[1],
                                                                                  grasp_cat_match[2], grasp_cat_match[3],
                                                                                  grasp_cat_match[4])
                         obj_id = re_match[0][2] if is_virtual else re_match[0][1]
                         assert (is_virtual and raw_obj_id == re_match[0][1]) or obj_id == raw_obj_id
-                        # * filter with intent mode
-                        if action_id not in self.intent_idx:
-                            continue
-                        # * filter with data split
-                        obj_id_hash = int(hashlib.md5(obj_id.encode("utf-8")).hexdigest(), 16)  # random select
-                        if obj_id_hash % 10 < 8 and "train" not in self.data_split:
-                            continue
-                        elif obj_id_hash % 10 == 8 and "val" not in self.data_split:
-                            continue
-                        elif obj_id_hash % 10 == 9 and "test" not in self.data_split:
+                        # * filter with intent mode and data split
+                        if filtered and (action_id not in self.intent_idx or
+                                         grasp_split(obj_id) not in self.data_split):
                             continue
 
                         if action_id == "0004":  # hand over
@@ -167,58 +193,214 @@ class OakInkShape:
                             "seq_ts": seq_ts,
                             "source": source,
                             "pass_stage": pass_stage,
-                            "alt_grasp_item": None,
+                            "alt_idx": None,
                             "file_path": os.path.join(cur, f),
                         }
                         grasp_list.append(grasp_item)
+        return grasp_list
+
+    def _scan_grasps(self, categories=None, filtered=True):
+        """Grasps of the selected categories, intents and splits, hand joints and verts are not computed yet.
+
+        Args:
+            categories (list, optional): categories to scan instead of ``self.categories``.
+            filtered (bool, optional): keep only the selected intents and splits. Defaults to True.
+
+        Returns:
+            tuple: grasp_list, and the index of the first grasp of each category in it.
+        """
+        from tqdm import tqdm
+
+        # region ===== filter with regex >>>>>
+        # every source object subtree is scanned by the pool, results are concatenated in os.walk order: sorted
+        # categories as given, then sorted object dirs
+        subtrees = []
+        for cat in self.categories if categories is None else categories:
+            path = os.path.join(self.oi_shape_dir, cat)
+            obj_dirs = []
+            if os.path.isdir(path):
+                obj_dirs = sorted(e.path for e in os.scandir(path) if e.is_dir(follow_symlinks=False))
+            subtrees.append((cat, obj_dirs))
+
+        grasp_list = []
+        category_begin_idx = []
+        with ThreadPoolExecutor(max_workers=self.scan_workers, thread_name_prefix="oikit_scan") as pool:
+            futures = [[pool.submit(self._scan_subtree, cat, d, filtered) for d in obj_dirs]
+                       for cat, obj_dirs in subtrees]
+            for (cat, _), cat_futures in zip(tqdm(subtrees, desc="Process categories"), futures):
+                category_begin_idx.append(len(grasp_list))
+                for future in cat_futures:
+                    grasp_list.extend(future.result())
         # endregion <<<<
+        return grasp_list, category_begin_idx
+
+    def _forward_mano(self, grasp_list):
+        import torch
+        from tqdm import tqdm
 
         # region ===== cal hand joints >>>>>
-        batch_hand_pose = []
-        batch_hand_shape = []
-        batch_hand_tsl = []
-        for _, g in enumerate(grasp_list):
-            batch_hand_pose.append(g["hand_pose"])
-            batch_hand_shape.append(g["hand_shape"])
-            batch_hand_tsl.append(g["hand_tsl"])
-        batch_hand_shape = torch.from_numpy(np.stack(batch_hand_shape))
-        batch_hand_pose = torch.from_numpy(np.stack(batch_hand_pose))
-        batch_hand_tsl = np.stack(batch_hand_tsl)
-        mano_output: MANOOutput = self.mano_layer(batch_hand_pose, batch_hand_shape)
-        batch_hand_joints = mano_output.joints.numpy() + batch_hand_tsl[:, None, :]
-        batch_hand_verts = mano_output.verts.numpy() + batch_hand_tsl[:, None, :]
+        # chunk by chunk within the memory budget, each chunk is written into the preallocated outputs
+        n_grasps = len(grasp_list)
+        batch_hand_pose = np.stack([g["hand_pose"] for g in grasp_list])
+        batch_hand_shape = np.stack([g["hand_shape"] for g in grasp_list])
+        batch_hand_tsl = np.stack([g["hand_tsl"] for g in grasp_list])
+        chunk_size = max(1, self.mano_mem_budget // MANO_BYTES_PER_GRASP)
+        batch_hand_joints, batch_hand_verts = None, None
+
+        n_threads = torch.get_num_threads()
+        if self.mano_threads is not None:
+            torch.set_num_threads(self.mano_threads)
+        try:
+            with torch.no_grad():
+                for begin in tqdm(range(0, n_grasps, chunk_size), desc="Process MANO"):
+                    end = min(begin + chunk_size, n_grasps)
+                    mano_output = self.mano_layer(torch.from_numpy(batch_hand_pose[begin:end]),
+                                                  torch.from_numpy(batch_hand_shape[begin:end]))
+                    joints, verts = mano_output.joints.numpy(), mano_output.verts.numpy()
+                    if batch_hand_joints is None:
+                        dtype = np.result_type(joints.dtype, batch_hand_tsl.dtype)
+                        batch_hand_joints = np.empty((n_grasps, *joints.shape[1:]), dtype=dtype)
+                        batch_hand_verts = np.empty((n_grasps, *verts.shape[1:]), dtype=dtype)
+                    np.add(joints, batch_hand_tsl[begin:end, None, :], out=batch_hand_joints[begin:end])
+                    np.add(verts, batch_hand_tsl[begin:end, None, :], out=batch_hand_verts[begin:end])
+                    del mano_output, joints, verts
+        finally:
+            torch.set_num_threads(n_threads)
+
         batch_hand_tsl = batch_hand_joints[:, CENTER_IDX]  # center idx from 0 to 9
-        for i in range(len(grasp_list)):
+        for i in range(n_grasps):
             grasp_list[i]["joints"] = batch_hand_joints[i]
             grasp_list[i]["verts"] = batch_hand_verts[i]
             grasp_list[i]["hand_tsl"] = batch_hand_tsl[i]
         # endregion <<<<<
 
-        # region ===== deal with handle handover >>>>>
+    def _pair_handover(self, grasp_list, category_begin_idx):
+        """Pair every handover grasp with the other subject's grasp of the same recording, drop unpaired ones.
+
+        The partner of a grasp is the first grasp, from the start of its category on, with the same
+        (seq_ts, obj_id, pass_stage) and another source. Grasps are looked up in a hash table on that key.
+
+        Returns:
+            list: the remaining grasps; ``alt_idx`` of a handover grasp is the index of its partner in this list.
+        """
+        # (seq_ts, obj_id, pass_stage) -> grasp indices, in list order
+        grasp_table = {}
+        for j, g in enumerate(grasp_list):
+            grasp_table.setdefault((g["seq_ts"], g["obj_id"], g["pass_stage"]), []).append(j)
+
+        partner_idx = np.full(len(grasp_list), -1, dtype=np.int64)
+        for i, g in enumerate(grasp_list):
+            if g["subject_alt_id"] is None:
+                continue
+            cat_begin_idx = category_begin_idx[bisect.bisect_right(category_begin_idx, i) - 1]
+            for j in grasp_table[(g["seq_ts"], g["obj_id"], g["pass_stage"])]:
+                alt_g = grasp_list[j]
+                if j >= cat_begin_idx and g["source"] != alt_g["source"]:
+                    assert g["subject_id"] == alt_g["subject_alt_id"] and g["subject_alt_id"] == alt_g["subject_id"]
+                    partner_idx[i] = j
+                    break
+
+        keep = [i for i, g in enumerate(grasp_list) if g["action_id"] != "0004" or partner_idx[i] >= 0]
+        new_idx = np.full(len(grasp_list), -1, dtype=np.int64)
+        new_idx[keep] = np.arange(len(keep))
+        for i in keep:
+            if partner_idx[i] >= 0:
+                alt_idx = int(new_idx[partner_idx[i]])
+                assert alt_idx >= 0, f"partner of {grasp_list[i]['file_path']} was dropped"
+                grasp_list[i]["alt_idx"] = alt_idx
+        return [grasp_list[i] for i in keep]
+
+    def _prepare_data(self):
+        grasp_list, category_begin_idx = self._scan_grasps()
+        self._forward_mano(grasp_list)
         if "handover" in self.intent_mode:
-            for i, g in tqdm(enumerate(grasp_list), total=len(grasp_list), desc="Process handover grasp"):
-                if g["subject_alt_id"] is None:
-                    continue
-                for bidx in category_begin_idx:
-                    if bidx <= i:
-                        cat_begin_idx = bidx
-                    else:
-                        break
-                for j, alt_g in enumerate(grasp_list[cat_begin_idx:]):
-                    if (g["seq_ts"] == alt_g["seq_ts"] and g["obj_id"] == alt_g["obj_id"] and
-                            g["pass_stage"] == alt_g["pass_stage"] and g["source"] != alt_g["source"]):
-                        assert g["subject_id"] == alt_g["subject_alt_id"] and g["subject_alt_id"] == alt_g["subject_id"]
-                        g["alt_grasp_item"] = {
-                            "alt_joints": alt_g["joints"],
-                            "alt_verts": alt_g["verts"],
-                            "alt_hand_pose": alt_g["hand_pose"],
-                            "alt_hand_shape": alt_g["hand_shape"],
-                            "alt_hand_tsl": alt_g["hand_tsl"],
-                        }
-                        break
-            grasp_list = list(filter(lambda x: x["action_id"] != "0004" or x["alt_grasp_item"] is not None, grasp_list))
-        # endregion <<<<<
+            grasp_list = self._pair_handover(grasp_list, category_begin_idx)
+        self._report_peak_rss(len(grasp_list))
+        return grasp_list
 
+    def _report_peak_rss(self, n_grasps):
+        peak_rss = get_peak_rss()
+        if peak_rss is not None:
+            print(f"{self.name} prepared {n_grasps} grasps, peak RSS {peak_rss / 2**20:.0f} MB")
+
+    def _category_cache_root(self):
+        # per-category caches of this data root, so that two roots never evict each other's caches
+        root_key = hashlib.md5(os.path.realpath(self.oi_shape_dir).encode("utf-8")).hexdigest()
+        return os.path.join(get_cache_dir(self.name), f"category_{CACHE_FORMAT}", root_key)
+
+    def _category_fingerprints(self):
+        """``category_fingerprint`` of each selected category.
+
+        A manifest of the cache root maps each category's ``category_quick_key`` to its last fingerprint: a category
+        whose quick key is unchanged is not walked, so a cached start costs one listing per category instead of one
+        stat per grasp file. Categories with a new quick key, or all of them with ``verify_cache``, are walked.
+        """
+        manifest_path = os.path.join(self._category_cache_root(), "manifest.json")
+        manifest = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r") as f:
+                manifest = json.load(f)
+        cat_dirs = [os.path.join(self.oi_shape_dir, c) for c in self.categories]
+        quick_keys = [category_quick_key(d) for d in cat_dirs]
+        fingerprints = [None if self.verify_cache or manifest.get(c, [None])[0] != k else manifest[c][1]
+                        for c, k in zip(self.categories, quick_keys)]
+        todo = [i for i, fp in enumerate(fingerprints) if fp is None]
+        if len(todo) == 0:
+            return fingerprints
+        with ThreadPoolExecutor(max_workers=self.scan_workers, thread_name_prefix="oikit_scan") as pool:
+            for i, fp in zip(todo, pool.map(category_fingerprint, [cat_dirs[i] for i in todo])):
+                fingerprints[i] = fp
+
+        # merge with what other processes may have written meanwhile, the last writer only adds entries
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r") as f:
+                manifest = json.load(f)
+        manifest.update({self.categories[i]: [quick_keys[i], fingerprints[i]] for i in todo})
+        try:
+            os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+            tmp_path = f"{manifest_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(manifest, f)
+            os.replace(tmp_path, manifest_path)
+        except OSError as e:
+            warnings.warn(f"{self.name} cache manifest not saved to {manifest_path}: {e}")
+        return fingerprints
+
+    def _load_category(self, cat, fingerprint):
+        """Every grasp of a category, with hand joints and verts, from its cache; built if missing or stale.
+
+        A category cache holds all intents and splits, it is keyed on the data root and on the category's
+        ``category_fingerprint``. Caches of older fingerprints of the same data root are removed once the new one is
+        written, so two data roots (e.g. a local and a network copy) never evict each other's caches.
+        """
+        cat_cache_root = os.path.join(self._category_cache_root(), cat)
+        cat_cache_dir = os.path.join(cat_cache_root, fingerprint)
+        if not os.path.isdir(cat_cache_dir):
+            print(f"{self.name} building cache of category {cat}")
+            grasp_list, _ = self._scan_grasps([cat], filtered=False)
+            if len(grasp_list) > 0:
+                self._forward_mano(grasp_list)
+            os.makedirs(cat_cache_root, exist_ok=True)
+            save_array_dir(cat_cache_dir, **GraspColumns.pack(grasp_list, self.oi_shape_dir))
+            for stale in os.listdir(cat_cache_root):
+                if stale != fingerprint and ".tmp" not in stale:
+                    shutil.rmtree(os.path.join(cat_cache_root, stale), ignore_errors=True)
+        return GraspColumns(load_array_dir(cat_cache_dir), self.oi_shape_dir)
+
+    def _assemble_data(self, fingerprints):
+        """Same grasps as ``_prepare_data``, selected from the per-category caches instead of a scan."""
+        grasp_list = []
+        category_begin_idx = []
+        for cat, fingerprint in zip(self.categories, fingerprints):
+            columns = self._load_category(cat, fingerprint)
+            keep_obj = np.array([grasp_split(o) in self.data_split for o in columns.unique("obj_id")], dtype=bool)
+            keep_action = np.array([a in self.intent_idx for a in columns.unique("action_id")], dtype=bool)
+            keep = (keep_obj[columns.columns["obj_id_codes"]] & keep_action[columns.columns["action_id_codes"]])
+            category_begin_idx.append(len(grasp_list))
+            grasp_list.extend(columns[i] for i in np.flatnonzero(keep))
+        if "handover" in self.intent_mode:
+            grasp_list = self._pair_handover(grasp_list, category_begin_idx)
+        self._report_peak_rss(len(grasp_list))
         return grasp_list
 
     def __len__(self):
@@ -227,7 +409,9 @@ class OakInkShape:
     def get_obj_mesh(self, idx):
         obj_id = self.grasp_list[idx]["obj_id"]
         if obj_id not in self.obj_warehouse:
+            import trimesh
             obj_path = get_obj_path(obj_id, self.data_dir, self.meta_dir, use_downsample=self.use_downsample_mesh)
+            record_file(obj_path)
             obj_trimesh = trimesh.load(obj_path, process=False, force="mesh", skip_materials=True)
             bbox_center = (obj_trimesh.vertices.min(0) + obj_trimesh.vertices.max(0)) / 2
             obj_trimesh.vertices = obj_trimesh.vertices - bbox_center
@@ -249,11 +433,11 @@ class OakInkShape:
         return grasp
 
     def get_hand_over(self, idx):
-        alt_grasp_item = self.grasp_list[idx]["alt_grasp_item"]
+        alt_grasp = self.grasp_list[self.grasp_list[idx]["alt_idx"]]
         return (
-            alt_grasp_item["alt_joints"],
-            alt_grasp_item["alt_verts"],
-            alt_grasp_item["alt_hand_pose"],
-            alt_grasp_item["alt_hand_shape"],
-            alt_grasp_item["alt_hand_tsl"],
+            alt_grasp["joints"],
+            alt_grasp["verts"],
+            alt_grasp["hand_pose"],
+            alt_grasp["hand_shape"],
+            alt_grasp["hand_tsl"],
         )
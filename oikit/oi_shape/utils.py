@@ -1,9 +1,13 @@
+import hashlib
 import pickle
 import os
 import json
 import glob
 import numpy as np
 import logging
+import sys
+
+from oikit.instrument import record_file
 
 ALL_CAT = [
     "apple",
@@ -58,6 +62,77 @@ ALL_INTENT = {
 CENTER_IDX = 9
 
 
+# keys of a grasp dict, in order
+GRASP_KEYS = ("cate_id", "seq_id", "obj_id", "joints", "verts", "hand_pose", "hand_shape", "hand_tsl", "is_virtual",
+              "raw_obj_id", "action_id", "subject_id", "subject_alt_id", "seq_ts", "source", "pass_stage", "alt_idx",
+              "file_path")
+# one .npy per array field, one (names, codes) string table per string field
+GRASP_ARRAY_FIELDS = ("joints", "verts", "hand_pose", "hand_shape", "hand_tsl")
+GRASP_ARRAY_SHAPES = {"joints": (21, 3), "verts": (778, 3), "hand_pose": (48,), "hand_shape": (10,), "hand_tsl": (3,)}
+GRASP_STR_FIELDS = ("cate_id", "seq_id", "obj_id", "raw_obj_id", "action_id", "subject_id", "subject_alt_id", "seq_ts",
+                    "source", "pass_stage")
+
+
+class GraspColumns:
+    """Column-backed, read-only ``grasp_list`` of OakInkShape.
+
+    Every array field is one memory-mapped ``(N, ...)`` array, string fields are interned as int codes into a table
+    of unique strings (code -1 stands for None) and ``file_path`` is kept relative to ``oi_shape_dir``. Loading is
+    O(1) and forked workers share the pages. ``grasp_list[idx]`` builds the grasp dict on access, its arrays are
+    read-only views.
+    """
+
+    def __init__(self, columns, oi_shape_dir):
+        self.columns = columns
+        self.oi_shape_dir = oi_shape_dir
+
+    @staticmethod
+    def pack(grasp_list, oi_shape_dir):
+        """Columns of a list of grasp dicts, see ``GraspColumns``."""
+        columns = {
+            field: np.stack([g[field] for g in grasp_list]) if grasp_list else np.zeros((0, *shape), np.float32)
+            for field, shape in GRASP_ARRAY_SHAPES.items()
+        }
+        for field in GRASP_STR_FIELDS:
+            code_of = {}
+            codes = [-1 if g[field] is None else code_of.setdefault(g[field], len(code_of)) for g in grasp_list]
+            columns[f"{field}_names"] = np.array(list(code_of), dtype=str)
+            columns[f"{field}_codes"] = np.array(codes, dtype=np.int32)
+        columns["is_virtual"] = np.array([g["is_virtual"] for g in grasp_list], dtype=bool)
+        columns["alt_idx"] = np.array([-1 if g["alt_idx"] is None else g["alt_idx"] for g in grasp_list],
+                                      dtype=np.int64)
+        columns["file_path"] = np.array([os.path.relpath(g["file_path"], oi_shape_dir) for g in grasp_list], dtype=str)
+        return columns
+
+    def __len__(self):
+        return len(self.columns["is_virtual"])
+
+    def _get_str(self, field, idx):
+        code = self.columns[f"{field}_codes"][idx]
+        return None if code < 0 else str(self.columns[f"{field}_names"][code])
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        values = {field: self.columns[field][idx] for field in GRASP_ARRAY_FIELDS}
+        values.update({field: self._get_str(field, idx) for field in GRASP_STR_FIELDS})
+        alt_idx = int(self.columns["alt_idx"][idx])
+        values["is_virtual"] = bool(self.columns["is_virtual"][idx])
+        values["alt_idx"] = None if alt_idx < 0 else alt_idx
+        values["file_path"] = os.path.join(self.oi_shape_dir, str(self.columns["file_path"][idx]))
+        return {key: values[key] for key in GRASP_KEYS}
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def unique(self, field):
+        """Distinct values of a string field, without building the grasp dicts."""
+        return self.columns[f"{field}_names"].tolist()
+
+
 def to_list(x):
     if isinstance(x, list):
         return x
@@ -71,11 +146,58 @@ def check_valid(list, valid_list):
     return True
 
 
+def grasp_split(obj_id):
+    """Data split of an object's grasps: the md5 of its id mod 10 is < 8 for train, 8 for val and 9 for test."""
+    obj_id_hash = int(hashlib.md5(obj_id.encode("utf-8")).hexdigest(), 16)  # random select
+    if obj_id_hash % 10 < 8:
+        return "train"
+    return "val" if obj_id_hash % 10 == 8 else "test"
+
+
+def category_fingerprint(cat_dir):
+    """Fingerprint of the files a category scan reads: their count, and an md5 over the relative path, size and
+    mtime of each one. Files are only stat'ed, not read."""
+    entries = []
+    for cur, dirs, files in os.walk(cat_dir, followlinks=False):
+        dirs.sort()
+        for f in sorted(files):
+            path = os.path.join(cur, f)
+            stat = os.stat(path)
+            entries.append(f"{os.path.relpath(path, cat_dir)}:{stat.st_size}:{stat.st_mtime_ns}")
+    digest = hashlib.md5("\n".join(entries).encode("utf-8")).hexdigest()
+    return f"{len(entries)}-{digest}"
+
+
+def category_quick_key(cat_dir):
+    """Cheap change detector of a category, from one listing: the mtimes of the category dir and of its object dirs.
+
+    Adding or removing an object, or a real grasp of an object, changes it. Changes further down (a virtual grasp,
+    a file rewritten in place) do not, ``category_fingerprint`` catches those.
+    """
+    if not os.path.isdir(cat_dir):
+        return "missing"
+    entries = [f"{os.stat(cat_dir).st_mtime_ns}"]
+    for entry in sorted(os.scandir(cat_dir), key=lambda e: e.name):
+        entries.append(f"{entry.name}:{entry.stat(follow_symlinks=False).st_mtime_ns}")
+    return hashlib.md5("\n".join(entries).encode("utf-8")).hexdigest()
+
+
 def get_hand_parameter(path):
+    record_file(path)
     pose = pickle.load(open(path, "rb"))
     return pose["pose"], pose["shape"], pose["tsl"]
 
 
+def get_peak_rss():
+    """Peak resident set size of this process in bytes, None where the resource module is unavailable."""
+    try:
+        import resource
+    except ImportError:  # windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # bytes on macOS, KiB on linux
+
+
 def get_obj_path(oid, data_path, meta_path, use_downsample=True, key="align"):
     obj_suffix_path = "align_ds" if use_downsample else "align"
     real_meta = json.load(open(os.path.join(meta_path, "object_id.json"), "r"))
@@ -0,0 +1,156 @@
+import numpy as np
+import torch
+from torch.utils.data import Dataset, get_worker_info
+
+# ragged field -> its offsets key in a collated batch, same names as OakInkImage.get_batch
+RAGGED_OFFSETS = {
+    "obj_verts_can": "obj_verts_offsets",
+    "obj_verts_3d": "obj_verts_offsets",
+    "obj_verts_2d": "obj_verts_offsets",
+    "obj_faces": "obj_faces_offsets",
+}
+
+
+class OakInkImageDataset(Dataset):
+    """``torch.utils.data.Dataset`` over an ``OakInkImage`` or ``OakInkImageMV``.
+
+    The wrapped dataset is built once in the main process and inherited by the DataLoader workers: its index is
+    made of numpy arrays and memory maps, which forked workers share without copying. Pass ``worker_init_fn`` to
+    the DataLoader so each worker reopens its own memory maps.
+
+    Args:
+        oi_image (OakInkImage | OakInkImageMV): the wrapped dataset.
+        fields (list, optional): sample fields, see ``oikit.oi_image.utils.SAMPLE_FIELDS``.
+        with_handover (bool, optional): add the partner hand of handover samples as ``alt_joints`` / ``alt_verts``,
+            requires ``enable_handover=True`` on ``oi_image``. Defaults to False.
+    """
+
+    def __init__(self, oi_image, fields=("image", "cam_intr", "joints_3d", "joints_2d"), with_handover=False):
+        self.oi_image = oi_image
+        self.fields = list(fields)
+        self.with_handover = with_handover
+
+    def __len__(self):
+        return len(self.oi_image)
+
+    def __getitem__(self, idx):
+        sample = self.oi_image.get_sample(idx, self.fields)
+        if self.with_handover:
+            hand_over = self.oi_image.get_hand_over(idx)
+            if hand_over is not None:
+                sample["alt_joints"] = hand_over["alt_joints"]
+                sample["alt_verts"] = hand_over["alt_verts"]
+        return sample
+
+    def reopen(self):
+        reopen_dataset(self.oi_image)
+
+
+class OakInkShapeDataset(Dataset):
+    """``torch.utils.data.Dataset`` over an ``OakInkShape``.
+
+    Args:
+        oi_shape (OakInkShape): the wrapped dataset.
+        fields (list, optional): keys of ``oi_shape[idx]`` to keep. Defaults to None (all of them). Partner hand
+            keys (``alt_*``) of handover grasps are always kept, the ``alt_idx`` bookkeeping key never is.
+    """
+
+    def __init__(self, oi_shape, fields=None):
+        self.oi_shape = oi_shape
+        self.fields = None if fields is None else list(fields)
+
+    def __len__(self):
+        return len(self.oi_shape)
+
+    def __getitem__(self, idx):
+        grasp = self.oi_shape[idx]
+        if self.fields is None:
+            return {k: v for k, v in grasp.items() if k != "alt_idx"}
+        return {k: v for k, v in grasp.items() if k in self.fields or (k.startswith("alt_") and k != "alt_idx")}
+
+    def reopen(self):
+        reopen_dataset(self.oi_shape)
+
+
+def reopen_dataset(dataset):
+    """Drop the per-process state a worker inherits from its parent.
+
+    Memory maps of the columnar store are reopened lazily by the worker, and the image prefetcher is dropped, as its
+    thread pool does not survive a fork. Read-only index arrays are left alone and stay shared.
+    """
+    anno_store = getattr(dataset, "_anno_store", None)
+    if anno_store is not None:
+        anno_store.reopen()
+    if getattr(dataset, "_prefetcher", None) is not None:
+        dataset._prefetcher = None
+    if hasattr(dataset, "n_file_open"):
+        dataset.n_file_open = 0
+
+
+def worker_init_fn(worker_id):
+    """``DataLoader(worker_init_fn=...)`` for the datasets of this module."""
+    worker_info = get_worker_info()
+    dataset = worker_info.dataset
+    if hasattr(dataset, "reopen"):
+        dataset.reopen()
+
+
+def _pack_values(values):
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(v) for v in values])
+    if isinstance(values[0], torch.Tensor):
+        return torch.cat(values, dim=0), torch.from_numpy(offsets)
+    return torch.from_numpy(np.concatenate(values, axis=0)), torch.from_numpy(offsets)
+
+
+def _collate_values(values):
+    first = values[0]
+    if isinstance(first, np.ndarray):
+        if all(v.shape == first.shape for v in values):
+            return torch.from_numpy(np.stack(values))
+        return None  # ragged
+    if isinstance(first, torch.Tensor):
+        if all(v.shape == first.shape for v in values):
+            return torch.stack(values)
+        return None
+    if isinstance(first, (bool, int, float, np.number)):
+        return torch.as_tensor(np.asarray(values))
+    return list(values)
+
+
+def collate_fn(batch):
+    """Collate a list of sample dicts.
+
+    Fixed-size arrays are stacked along a new batch dim and numbers become tensors; other values (strings, ids,
+    dicts) are kept as lists. Variable-size arrays are packed along dim 0 with an offsets tensor (B + 1,): sample b
+    owns rows ``offsets[b]:offsets[b + 1]``. Object mesh keys (``RAGGED_OFFSETS``) are always packed, even when every
+    sample has the same size, and come with ``obj_verts_offsets`` / ``obj_faces_offsets``; other arrays are packed
+    with a ``<key>_offsets`` only when their shapes differ.
+
+    Keys present in only part of the batch, e.g. the ``alt_*`` partner hand of handover samples, are stacked with
+    zeros for the missing samples and come with a boolean ``<key>_mask`` (B,).
+    """
+    keys = []
+    for sample in batch:
+        keys.extend(k for k in sample if k not in keys)
+
+    collated = {}
+    for key in keys:
+        present = [key in sample for sample in batch]
+        values = [sample[key] for sample in batch if key in sample]
+        if not all(present):
+            if not isinstance(values[0], np.ndarray):
+                collated[key] = [sample.get(key) for sample in batch]
+                continue
+            filler = np.zeros_like(values[0])
+            values = [sample[key] if key in sample else filler for sample in batch]
+            collated[f"{key}_mask"] = torch.as_tensor(present)
+        if values[0] is None:
+            collated[key] = list(values)
+            continue
+        value = None if key in RAGGED_OFFSETS else _collate_values(values)
+        if value is None:
+            value, offsets = _pack_values(values)
+            collated[RAGGED_OFFSETS.get(key, f"{key}_offsets")] = offsets
+        collated[key] = value
+    return collated
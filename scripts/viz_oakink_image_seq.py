@@ -1,5 +1,4 @@
 import argparse
-import json
 import os
 
 import cv2
@@ -7,7 +6,7 @@ import torch
 import numpy as np
 from oikit.oi_image.oi_image import OakInkImageSequence
 from oikit.oi_image.viz_tool import caption_view, draw_wireframe, draw_wireframe_hand, OpenDRRenderer
-from oikit.oi_image.utils import persp_project
+from oikit.oi_image.utils import persp_project, SeqViewIndex
 from termcolor import cprint
 from manotorch.manolayer import ManoLayer, MANOOutput
 
@@ -75,17 +74,16 @@ def viz_a_seq(oi_seq: OakInkImageSequence, draw_mode="wireframe", render=None, h
 
 
 def main(arg):
-    info_list_all = json.load(open(os.path.join(arg.data_dir, "image", "anno", "seq_all.json")))
-    seq_id_list = list(set([info[0] for info in info_list_all]))
-
     render = OpenDRRenderer()
     mano_layer = ManoLayer(mano_assets_root="assets/mano_v1_2", flat_hand_mean=True, center_idx=CENTER_IDX)
     hand_faces = mano_layer.get_mano_closed_faces()
 
     if arg.viz_all_seq:
-        for seq_id in seq_id_list:
-            view_id = np.random.randint(4)
-            oi_seq = OakInkImageSequence(seq_id=seq_id, view_id=view_id, enable_handover=True)
+        seq_index = SeqViewIndex.load(arg.data_dir)
+        seq_id_list = sorted({seq_id for seq_id, _ in seq_index.keys()})
+        seq_view_list = [(seq_id, np.random.randint(4)) for seq_id in seq_id_list]
+        # all sequences share one index, status table and object mesh registry
+        for oi_seq in OakInkImageSequence.create_many(seq_view_list, enable_handover=True):
             cprint(f"viz_all: {oi_seq._name}", "yellow")
             viz_a_seq(oi_seq, arg.draw_mode, render=render, hand_faces=hand_faces, mano_layer=mano_layer)
     else: